@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self):
+        # Registrar las señales y las verificaciones de la app
+        from . import checks, signals  # noqa: F401
+        from .numeracion import preparar_numeracion
+
+        # Contador y secuencia de números de pedido (ver core/numeracion.py)
+        post_migrate.connect(preparar_numeracion, sender=self)
@@ -0,0 +1,308 @@
+"""
+Búsqueda de productos con un índice invertido en memoria.
+
+Reemplaza los `nombre__icontains` / `descripcion__icontains`, que recorren
+la tabla completa, por un índice término -> productos que:
+
+- ignora mayúsculas y tildes ("pequeño" == "pequeno", "Café" == "cafe"),
+- descarta palabras vacías del español y normaliza plurales simples,
+- busca por prefijo ("hambur" encuentra "hamburguesa"),
+- ordena los resultados por relevancia (el nombre pesa más que la descripción).
+
+El mismo índice sirve para buscar clientes (username, nombre y apellido) en la
+lista de pedidos del admin.
+
+Cada proceso tiene su propio índice. Se mantiene al día con las señales de
+Producto y Usuario (core/signals.py) y, para enterarse de los cambios hechos en otros
+procesos, compara una versión compartida en el caché: si no coincide, el
+índice se reconstruye completo en la próxima búsqueda. Los cambios se aplican
+(y la versión se incrementa) al confirmarse la transacción: si se incrementara
+antes, otro proceso podría reconstruir con datos que todavía se pueden revertir.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+PESO_NOMBRE = 3.0
+PESO_DESCRIPCION = 1.0
+# Un término que coincide completo vale más que uno que solo coincide por prefijo
+BONO_EXACTO = 2.0
+# Máximo de ids que devuelve una búsqueda para usarlos en un pk__in: con un
+# prefijo corto ("a") pueden coincidir miles de filas y SQLite rechaza las
+# consultas con demasiados parámetros. Se quedan los más relevantes.
+LIMITE_RESULTADOS = 500
+
+PALABRAS_VACIAS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'o', 'para', 'por', 'sin', 'su', 'un', 'una', 'y',
+}
+
+_RE_PALABRA = re.compile(r'[a-z0-9]+')
+
+
+def normalizar(texto):
+    """Pasa a minúsculas y quita tildes y diéresis (la ñ queda como n)."""
+    descompuesto = unicodedata.normalize('NFKD', (texto or '').lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    """Lista de términos normalizados de un texto, sin palabras vacías."""
+    terminos = []
+    for palabra in _RE_PALABRA.findall(normalizar(texto)):
+        if palabra in PALABRAS_VACIAS:
+            continue
+        # Plural simple: "papas" -> "papa", "jugos" -> "jugo"
+        if len(palabra) > 3 and palabra.endswith('s'):
+            palabra = palabra[:-1]
+        terminos.append(palabra)
+    return terminos
+
+
+def _pesos(campos):
+    """Suma los pesos de cada término a partir de pares (texto, peso)."""
+    pesos = defaultdict(float)
+    for texto, peso in campos:
+        for termino in tokenizar(texto):
+            pesos[termino] += peso
+    return dict(pesos)
+
+
+def _version_inicial():
+    # Basada en la hora: si la clave se desaloja del caché, la nueva versión
+    # no puede coincidir con la de un índice viejo que siga en memoria.
+    return int(time.time() * 1000)
+
+
+def _version_compartida(clave):
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, _version_inicial(), timeout=None)
+        version = cache.get(clave)
+    return version
+
+
+def _incrementar_version_compartida(clave):
+    try:
+        return cache.incr(clave)
+    except ValueError:
+        cache.add(clave, _version_inicial(), timeout=None)
+        return cache.incr(clave)
+
+
+class IndiceInvertido:
+    """
+    Índice invertido término -> {pk: peso}.
+
+    Las subclases indican la clave de versión compartida, qué filas cargar
+    desde la BD y qué textos (con su peso) aporta cada objeto.
+    """
+    clave_version = None
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._terminos = []  # ordenados, para buscar prefijos con bisect
+        self._documentos = {}  # pk -> {termino: peso}
+        self._version = None
+
+    def filas(self):
+        """Iterable de (pk, [(texto, peso), ...]) con todo lo que hay que indexar."""
+        raise NotImplementedError
+
+    def campos(self, objeto):
+        """Lista de (texto, peso) de un objeto."""
+        raise NotImplementedError
+
+    # --- Construcción ---
+
+    def reconstruir(self, filas=None):
+        """Construye el índice desde cero; por defecto con todas las filas de la BD."""
+        # Se lee la versión antes de recorrer la tabla: si alguien cambia un
+        # objeto mientras tanto, la próxima búsqueda volverá a reconstruir.
+        version = _version_compartida(self.clave_version)
+        postings = defaultdict(dict)
+        documentos = {}
+        for pk, campos in (self.filas() if filas is None else filas):
+            pesos = _pesos(campos)
+            documentos[pk] = pesos
+            for termino, peso in pesos.items():
+                postings[termino][pk] = peso
+
+        with self._lock:
+            self._postings = dict(postings)
+            self._terminos = sorted(postings)
+            self._documentos = documentos
+            self._version = version
+
+    def _asegurar_vigente(self):
+        if self._version is None or self._version != _version_compartida(self.clave_version):
+            self.reconstruir()
+
+    def invalidar(self):
+        """Obliga a todos los procesos a reconstruir su índice (p. ej. tras un bulk_create)."""
+        _incrementar_version_compartida(self.clave_version)
+
+    # --- Mantenimiento incremental ---
+
+    def _quitar(self, pk):
+        for termino in self._documentos.pop(pk, {}):
+            objetos = self._postings.get(termino)
+            if objetos is None:
+                continue
+            objetos.pop(pk, None)
+            if not objetos:
+                del self._postings[termino]
+                posicion = bisect_left(self._terminos, termino)
+                if posicion < len(self._terminos) and self._terminos[posicion] == termino:
+                    del self._terminos[posicion]
+
+    def _publicar_cambio(self):
+        # Si nadie más cambió la versión desde la última vez, seguimos vigentes;
+        # si otro proceso también la cambió, hay que reconstruir.
+        nueva = _incrementar_version_compartida(self.clave_version)
+        self._version = nueva if self._version is not None and nueva == self._version + 1 else None
+
+    def actualizar(self, objeto):
+        """
+        Indexa (o reindexa) un objeto cuando se confirme la transacción en
+        curso, con sus textos de este momento. No hace nada si no cambiaron.
+        """
+        pk, pesos = objeto.pk, _pesos(self.campos(objeto))
+        transaction.on_commit(lambda: self._indexar(pk, pesos))
+
+    def eliminar(self, pk):
+        """Quita un objeto del índice cuando se confirme la transacción en curso."""
+        transaction.on_commit(lambda: self._eliminar(pk))
+
+    def _indexar(self, pk, pesos):
+        with self._lock:
+            if self._version is None:
+                # Este proceso aún no construyó su índice: basta con avisar a los demás
+                self.invalidar()
+                return
+            if self._documentos.get(pk) == pesos:
+                return
+            self._quitar(pk)
+            self._documentos[pk] = pesos
+            for termino, peso in pesos.items():
+                if termino not in self._postings:
+                    self._postings[termino] = {}
+                    self._terminos.insert(bisect_left(self._terminos, termino), termino)
+                self._postings[termino][pk] = peso
+            self._publicar_cambio()
+
+    def _eliminar(self, pk):
+        with self._lock:
+            if self._version is None:
+                self.invalidar()
+                return
+            self._quitar(pk)
+            self._publicar_cambio()
+
+    # --- Consulta ---
+
+    def _coincidencias(self, token):
+        """Objetos con algún término que empieza por `token`, con su mejor puntaje."""
+        puntajes = {}
+        posicion = bisect_left(self._terminos, token)
+        while posicion < len(self._terminos) and self._terminos[posicion].startswith(token):
+            termino = self._terminos[posicion]
+            bono = BONO_EXACTO if termino == token else 1.0
+            for pk, peso in self._postings[termino].items():
+                puntaje = peso * bono
+                if puntaje > puntajes.get(pk, 0):
+                    puntajes[pk] = puntaje
+            posicion += 1
+        return puntajes
+
+    def buscar(self, consulta, limite=None):
+        """
+        Pks de los objetos que contienen todos los términos de la consulta,
+        ordenados de mayor a menor relevancia.
+        """
+        tokens = tokenizar(consulta)
+        if not tokens:
+            return []
+
+        self._asegurar_vigente()
+        with self._lock:
+            resultado = None
+            for token in tokens:
+                puntajes = self._coincidencias(token)
+                if resultado is None:
+                    resultado = puntajes
+                else:
+                    resultado = {
+                        pk: puntaje + puntajes[pk]
+                        for pk, puntaje in resultado.items() if pk in puntajes
+                    }
+                if not resultado:
+                    return []
+
+        ordenados = sorted(resultado, key=lambda pk: (-resultado[pk], pk))
+        return ordenados[:limite] if limite else ordenados
+
+
+class IndiceProductos(IndiceInvertido):
+    """Productos por nombre y descripción (el nombre pesa más)."""
+    clave_version = 'busqueda:productos:version'
+
+    def filas(self):
+        from .models import Producto
+
+        for pk, nombre, descripcion in Producto.objects.values_list('pk', 'nombre', 'descripcion').iterator(chunk_size=5000):
+            yield pk, [(nombre, PESO_NOMBRE), (descripcion, PESO_DESCRIPCION)]
+
+    def campos(self, producto):
+        return [(producto.nombre, PESO_NOMBRE), (producto.descripcion, PESO_DESCRIPCION)]
+
+
+class IndiceClientes(IndiceInvertido):
+    """Usuarios por username, nombre y apellido (para buscar pedidos por cliente)."""
+    clave_version = 'busqueda:clientes:version'
+
+    def filas(self):
+        from .models import Usuario
+
+        for pk, username, nombre, apellido in Usuario.objects.values_list(
+            'pk', 'username', 'first_name', 'last_name'
+        ).iterator(chunk_size=5000):
+            yield pk, [(username, 1.0), (nombre, 1.0), (apellido, 1.0)]
+
+    def campos(self, usuario):
+        return [(usuario.username, 1.0), (usuario.first_name, 1.0), (usuario.last_name, 1.0)]
+
+
+indice_productos = IndiceProductos()
+indice_clientes = IndiceClientes()
+
+
+def buscar_productos(queryset, consulta, limite=LIMITE_RESULTADOS):
+    """
+    Filtra `queryset` (de Producto) por la consulta usando el índice.
+    Devuelve la lista de productos ordenada por relevancia (como mucho
+    los `limite` más relevantes).
+    """
+    ids = indice_productos.buscar(consulta, limite)
+    if not ids:
+        return []
+    posicion = {pk: i for i, pk in enumerate(ids)}
+    return sorted(queryset.filter(pk__in=ids), key=lambda producto: posicion[producto.pk])
+
+
+def ids_productos(consulta, limite=LIMITE_RESULTADOS):
+    """Ids más relevantes para la consulta (para combinar con otros filtros del ORM)."""
+    return indice_productos.buscar(consulta, limite)
+
+
+def ids_clientes(consulta, limite=LIMITE_RESULTADOS):
+    """Ids de usuarios cuyo username, nombre o apellido empieza por los términos buscados (los más relevantes)."""
+    return indice_clientes.buscar(consulta, limite)
@@ -0,0 +1,179 @@
+"""
+Caché del catálogo público (home y catálogo de productos).
+
+Todas las claves llevan un número de versión del catálogo. Las señales de
+Producto, Categoria y Slide (ver core/signals.py) incrementan esa versión, de
+modo que las entradas viejas dejan de usarse sin tener que borrarlas una a
+una; simplemente expiran. Funciona con cualquier backend de caché de Django
+(LocMemCache, FileBasedCache, Memcached, Redis).
+
+La versión se incrementa al confirmarse la transacción del cambio. Las ventas
+descuentan stock con un UPDATE que no dispara señales y solo invalidan cuando
+un producto se agota (core/ventas.py), así que lo cacheado sirve para saber
+qué productos se muestran, no cuánto stock les queda: las respuestas armadas
+con estas entradas no incluyen la cantidad (el detalle del producto la lee
+de la base).
+"""
+
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .busqueda import buscar_productos
+from .models import Categoria, Producto, Slide
+
+CLAVE_VERSION = 'catalogo:version'
+
+
+def _timeout():
+    return getattr(settings, 'CATALOGO_CACHE_TIMEOUT', 60 * 15)
+
+
+def obtener_version():
+    """Versión actual del catálogo (se crea si no existe)."""
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Partimos de un valor basado en la hora para no reutilizar una
+        # versión antigua si la clave fue desalojada del caché.
+        cache.add(CLAVE_VERSION, int(time.time() * 1000), timeout=None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def invalidar_catalogo():
+    """Incrementa la versión: todas las entradas del catálogo quedan obsoletas."""
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        # La clave no existía (primer uso o fue desalojada)
+        cache.set(CLAVE_VERSION, int(time.time() * 1000), timeout=None)
+
+
+def _clave(version, nombre, partes):
+    resumen = hashlib.md5('|'.join(str(parte) for parte in partes).encode('utf-8')).hexdigest()
+    return f'catalogo:v{version}:{nombre}:{resumen}'
+
+
+def clave(nombre, *partes):
+    """Clave versionada; las partes variables (búsquedas, ids) se resumen en un hash."""
+    return _clave(obtener_version(), nombre, partes)
+
+
+def obtener_o_calcular(nombre, partes, calcular):
+    """Devuelve el valor guardado en caché o lo calcula y lo guarda."""
+    k = clave(nombre, *partes)
+    valor = cache.get(k)
+    if valor is None:
+        valor = calcular()
+        cache.set(k, valor, _timeout())
+    return valor
+
+
+# Versiones para las vistas async (mismas claves: comparten las entradas con las síncronas)
+
+async def aobtener_version():
+    version = await cache.aget(CLAVE_VERSION)
+    if version is None:
+        await cache.aadd(CLAVE_VERSION, int(time.time() * 1000), timeout=None)
+        version = await cache.aget(CLAVE_VERSION)
+    return version
+
+
+async def aobtener_o_calcular(nombre, partes, calcular):
+    """Como obtener_o_calcular, pero `calcular` es una corrutina."""
+    k = _clave(await aobtener_version(), nombre, partes)
+    valor = await cache.aget(k)
+    if valor is None:
+        valor = await calcular()
+        await cache.aset(k, valor, _timeout())
+    return valor
+
+
+# ========== FRAGMENTOS ==========
+
+def categorias_activas():
+    return obtener_o_calcular('categorias', (), lambda: list(Categoria.objects.filter(activo=True)))
+
+
+def slides_activos():
+    return obtener_o_calcular(
+        'slides', (), lambda: list(Slide.objects.filter(activo=True).order_by('orden'))
+    )
+
+
+def productos_promocion():
+    """Productos en promoción para el carrusel de la home (máximo 6)."""
+    return obtener_o_calcular('promocion', (), lambda: list(
+        Producto.objects.filter(
+            activo=True,
+            en_promocion=True,
+            stock__gt=0
+        ).select_related('categoria').order_by('-fecha_actualizacion')[:6]
+    ))
+
+
+def _productos_visibles(categoria_id):
+    productos = Producto.objects.filter(activo=True, stock__gt=0).select_related('categoria').order_by('nombre')
+    if categoria_id:
+        productos = productos.filter(categoria_id=categoria_id)
+    return productos
+
+
+def productos_catalogo(busqueda='', categoria_id=None):
+    """Productos visibles en el catálogo, con una entrada por búsqueda y categoría."""
+    busqueda = (busqueda or '').strip()
+    categoria_id = categoria_id or ''
+
+    def calcular():
+        productos = _productos_visibles(categoria_id)
+        if busqueda:
+            # Resultados ordenados por relevancia (ver core/busqueda.py)
+            return buscar_productos(productos, busqueda)
+        return list(productos)
+
+    return obtener_o_calcular('productos', (busqueda.lower(), categoria_id), calcular)
+
+
+async def aproductos_catalogo(busqueda='', categoria_id=None):
+    """productos_catalogo para vistas async; usa la misma entrada de caché."""
+    busqueda = (busqueda or '').strip()
+    categoria_id = categoria_id or ''
+
+    async def calcular():
+        productos = _productos_visibles(categoria_id)
+        if busqueda:
+            # El índice de búsqueda es síncrono (caché en memoria del proceso)
+            return await sync_to_async(buscar_productos)(productos, busqueda)
+        return [producto async for producto in productos]
+
+    return await aobtener_o_calcular('productos', (busqueda.lower(), categoria_id), calcular)
+
+
+# ========== RESPUESTAS COMPLETAS ==========
+
+def respuesta_anonima_cacheada(request, nombre, partes, generar):
+    """
+    Sirve desde caché la página completa para visitantes anónimos.
+
+    `generar` es una función sin argumentos que devuelve la respuesta normal.
+    No se cachea nada si hay mensajes pendientes o si la página usó el token
+    CSRF, porque ese contenido es propio de cada visitante.
+    """
+    if request.method != 'GET' or request.user.is_authenticated or len(messages.get_messages(request)):
+        return generar()
+
+    k = clave(f'pagina:{nombre}', *partes)
+    contenido = cache.get(k)
+    if contenido is not None:
+        return HttpResponse(contenido)
+
+    respuesta = generar()
+    usa_csrf = request.META.get('CSRF_COOKIE_NEEDS_UPDATE') or request.META.get('CSRF_COOKIE_USED')
+    if respuesta.status_code == 200 and not respuesta.cookies and not usa_csrf:
+        cache.set(k, respuesta.content, _timeout())
+    return respuesta
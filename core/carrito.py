@@ -0,0 +1,221 @@
+"""
+Operaciones sobre el carrito de compras.
+
+Las vistas JSON del carrito (agregar, fijar cantidad, quitar y cambios en
+lote) usan estas funciones: cada una es una transacción corta que lee y
+bloquea el carrito y las líneas que toca con una sola consulta, escribe las
+líneas y suma la diferencia a los totales con un solo UPDATE, y devuelve el
+carrito y los items actualizados; los totales del carrito se leen de los
+campos desnormalizados de Carrito, sin recorrer sus items.
+
+El resumen del carrito (cantidad de items y monto) que se muestra en el
+header de todas las páginas se sirve desde el caché, con una clave por
+usuario. Carrito invalida esa clave cada vez que cambian sus totales (ver
+Carrito.sumar_a_totales / vaciar / recalcular_totales), una vez confirmada
+la transacción, así que navegar por el sitio no consulta el carrito.
+"""
+
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import FilteredRelation, Q
+
+from .models import Carrito, ItemCarrito, Producto
+from .ventas import StockInsuficiente
+
+TIMEOUT_RESUMEN = 60 * 60
+
+
+def clave_resumen(usuario_id):
+    return f'carrito:resumen:{usuario_id}'
+
+
+def resumen_carrito(usuario):
+    """{'total_items', 'total_precio'} del carrito del usuario (ceros si es anónimo o no tiene carrito)."""
+    if not usuario.is_authenticated:
+        return {'total_items': 0, 'total_precio': Decimal('0')}
+
+    k = clave_resumen(usuario.pk)
+    resumen = cache.get(k)
+    if resumen is None:
+        carrito = Carrito.objects.filter(usuario_id=usuario.pk).only(
+            'pk', 'usuario_id', 'cache_total_items', 'cache_total_precio'
+        ).first()
+        resumen = {
+            'total_items': carrito.total_items if carrito else 0,
+            'total_precio': carrito.total_precio if carrito else Decimal('0'),
+        }
+        cache.set(k, resumen, TIMEOUT_RESUMEN)
+    return resumen
+
+
+def invalidar_resumen(*usuarios_ids):
+    """Borra el resumen cacheado de esos usuarios cuando se confirme la transacción."""
+    claves = [clave_resumen(usuario_id) for usuario_id in usuarios_ids]
+    if claves:
+        transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+# ========== MODIFICACIONES ==========
+
+CAMPOS_CARRITO = ('id', 'usuario_id', 'cache_total_items', 'cache_total_precio')
+CAMPOS_ITEM = ('id', 'carrito_id', 'producto_id', 'cantidad')
+
+
+def _bloquear(usuario, condicion):
+    """
+    Lee y bloquea el carrito del usuario junto con sus líneas que cumplen
+    `condicion` (un Q sobre `items__...`) en una sola consulta: SELECT ...
+    FOR UPDATE del carrito con un LEFT JOIN a esas líneas. Crea el carrito si
+    el usuario todavía no tiene uno.
+
+    Solo se bloquea la fila del carrito (FOR UPDATE OF donde la BD lo
+    permite): las operaciones que modifican el carrito lo bloquean antes que
+    a sus líneas, así dos requests sobre el mismo carrito (un doble click) se
+    hacen en fila y el segundo ve las líneas que creó el primero.
+
+    Devuelve (carrito, {producto_id: item}).
+    """
+    bloqueo = {'of': ('self',)} if connection.features.has_select_for_update_of else {}
+    consulta = (Carrito.objects.select_for_update(**bloqueo).filter(usuario_id=usuario.pk)
+                .annotate(linea=FilteredRelation('items', condition=condicion))
+                .values_list(*CAMPOS_CARRITO, *(f'linea__{campo}' for campo in CAMPOS_ITEM)))
+    filas = list(consulta)
+    if not filas:
+        try:
+            with transaction.atomic():
+                # La fila recién insertada ya queda bloqueada y no tiene líneas
+                return Carrito.objects.create(usuario=usuario), {}
+        except IntegrityError:
+            # Otro request creó el carrito entre la consulta y el INSERT
+            filas = list(consulta)
+
+    carrito = Carrito.from_db(consulta.db, CAMPOS_CARRITO, filas[0][:len(CAMPOS_CARRITO)])
+    items = {}
+    for fila in filas:
+        valores = fila[len(CAMPOS_CARRITO):]
+        if valores[0] is not None:
+            item = ItemCarrito.from_db(consulta.db, CAMPOS_ITEM, valores)
+            item.carrito = carrito
+            items[item.producto_id] = item
+    return carrito, items
+
+
+def _validar(producto, cantidad):
+    if cantidad < 0:
+        raise ValueError('La cantidad no puede ser negativa.')
+    if cantidad == 0:
+        return
+    if not producto.activo:
+        raise ValueError(f'El producto "{producto.nombre}" no está disponible actualmente.')
+    if producto.stock < cantidad:
+        raise StockInsuficiente(
+            f'No hay suficiente stock de "{producto.nombre}". Stock disponible: {producto.stock}.'
+        )
+
+
+def _aplicar(carrito, items, cantidades):
+    """
+    Deja cada línea con su cantidad final (0 la elimina).
+
+    `items` son las líneas que devolvió _bloquear y `cantidades`
+    {producto_id: cantidad}. Valida todas las líneas antes de escribir y
+    después escribe con una consulta por tipo de cambio (un INSERT de las
+    líneas nuevas, un UPDATE de las que cambian y un DELETE de las que se
+    quitan), sin pasar por ItemCarrito.save()/delete(): la diferencia se
+    suma a los totales del carrito con un solo UPDATE al final.
+
+    Devuelve {producto_id: item o None}.
+    """
+    necesarios = [pk for pk, cantidad in cantidades.items() if cantidad > 0 or pk in items]
+    productos = Producto.objects.only('nombre', 'precio', 'stock', 'activo').in_bulk(necesarios) if necesarios else {}
+    if len(productos) != len(necesarios):
+        raise Producto.DoesNotExist('Uno de los productos seleccionados ya no existe.')
+
+    nuevos, cambiados, quitados = [], [], []
+    diferencia_items, diferencia_precio = 0, Decimal('0')
+    resultado = {}
+    for producto_id, cantidad in sorted(cantidades.items()):
+        item = items.get(producto_id)
+        producto = productos.get(producto_id)
+        _validar(producto, cantidad)
+        anterior = item.cantidad if item else 0
+        if cantidad == 0:
+            if item:
+                quitados.append(item.pk)
+            item = None
+        elif item is None:
+            item = ItemCarrito(carrito=carrito, producto=producto, cantidad=cantidad)
+            nuevos.append(item)
+        elif cantidad != anterior:
+            item.cantidad = cantidad
+            cambiados.append(item)
+        if item:
+            item.producto = producto
+        if cantidad != anterior:
+            diferencia_items += cantidad - anterior
+            diferencia_precio += producto.precio * (cantidad - anterior)
+        resultado[producto_id] = item
+
+    # Ya se validó cantidad y stock; la unicidad (carrito, producto) la
+    # garantiza el bloqueo del carrito o el unique_together.
+    if quitados:
+        ItemCarrito.objects.filter(pk__in=quitados).delete()
+    if cambiados:
+        ItemCarrito.objects.bulk_update(cambiados, ['cantidad'])
+    if nuevos:
+        ItemCarrito.objects.bulk_create(nuevos)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            ids = dict(ItemCarrito.objects.filter(carrito=carrito, producto_id__in=[i.producto_id for i in nuevos])
+                       .values_list('producto_id', 'pk'))
+            for item in nuevos:
+                item.pk = ids[item.producto_id]
+    for item in nuevos + cambiados:
+        item._cantidad_original = item.cantidad
+    if diferencia_items or diferencia_precio:
+        carrito.sumar_a_totales(diferencia_items, diferencia_precio)
+    return resultado
+
+
+def agregar(usuario, producto_id, cantidad=1):
+    """Suma `cantidad` unidades del producto al carrito. Devuelve (carrito, item)."""
+    if cantidad < 1:
+        raise ValueError('La cantidad debe ser al menos 1.')
+    with transaction.atomic():
+        carrito, items = _bloquear(usuario, Q(items__producto_id=producto_id))
+        actual = items[producto_id].cantidad if producto_id in items else 0
+        return carrito, _aplicar(carrito, items, {producto_id: actual + cantidad})[producto_id]
+
+
+def fijar_cantidad(usuario, item_id, cantidad):
+    """Cambia la cantidad de una línea del carrito (0 la elimina). Devuelve (carrito, item o None)."""
+    with transaction.atomic():
+        carrito, items = _bloquear(usuario, Q(items__pk=item_id))
+        if not items:
+            raise ItemCarrito.DoesNotExist('El item no pertenece a tu carrito.')
+        producto_id, = items
+        return carrito, _aplicar(carrito, items, {producto_id: cantidad})[producto_id]
+
+
+def quitar(usuario, item_id):
+    """Elimina una línea del carrito. Devuelve el carrito."""
+    carrito, _ = fijar_cantidad(usuario, item_id, 0)
+    return carrito
+
+
+def aplicar_cambios(usuario, cambios):
+    """
+    Aplica varias cantidades a la vez en una sola transacción.
+
+    `cambios` es una lista de {'producto_id': ..., 'cantidad': ...}; la
+    cantidad es la final de la línea (0 la elimina). Si alguna línea falla
+    no se aplica ninguna. Devuelve (carrito, {producto_id: item o None}).
+    """
+    cantidades = {}
+    for cambio in cambios:
+        cantidades[int(cambio['producto_id'])] = int(cambio['cantidad'])
+
+    with transaction.atomic():
+        carrito, items = _bloquear(usuario, Q(items__producto_id__in=list(cantidades)))
+        return carrito, (_aplicar(carrito, items, cantidades) if cantidades else {})
@@ -0,0 +1,39 @@
+"""
+Verificaciones de configuración (`manage.py check`, y al iniciar el servidor).
+"""
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from .eventos import BROKER_POR_DEFECTO
+
+CACHES_POR_PROCESO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def eventos_con_varios_workers(app_configs, **kwargs):
+    """
+    Con varios workers, los eventos en vivo (core/eventos.py) tienen que pasar
+    por un broker y un cache que compartan todos los procesos; si no, cada
+    pantalla ve solo los cambios hechos en su propio worker.
+    """
+    if getattr(settings, 'WEB_CONCURRENCY', 1) <= 1:
+        return []
+
+    broker = getattr(settings, 'BROKER_EVENTOS_PEDIDOS', BROKER_POR_DEFECTO)
+    if broker == 'core.eventos.BrokerLocal':
+        motivo = 'BROKER_EVENTOS_PEDIDOS es BrokerLocal, que vive en la memoria de cada proceso'
+    elif settings.CACHES['default']['BACKEND'] in CACHES_POR_PROCESO:
+        motivo = 'el cache por defecto no se comparte entre procesos'
+    else:
+        return []
+    return [Warning(
+        f'WEB_CONCURRENCY={settings.WEB_CONCURRENCY} pero {motivo}: las pantallas en vivo '
+        'y el tablero de cocina no verán los cambios hechos en los otros workers.',
+        hint="Usar BROKER_EVENTOS_PEDIDOS='core.eventos.BrokerCache' con un CACHE_BACKEND compartido "
+             '(Redis, Memcached o base de datos), o un solo worker.',
+        id='core.W001',
+    )]
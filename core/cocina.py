@@ -0,0 +1,168 @@
+"""
+Tablero de cocina: los pedidos activos (confirmado, en preparación, listo)
+con sus líneas, en memoria del proceso.
+
+Se carga una vez desde la base de datos y después se mantiene con los
+eventos de pedidos (core/eventos.py): cada refresco aplica solo los eventos
+nuevos, y si no hubo ninguno devuelve la misma foto ya armada sin consultar
+la base. Solo se consultan las líneas de los pedidos que entran al tablero.
+
+Además de la cola de pedidos se lleva el acumulado por producto de lo que
+falta cocinar ("12 hamburguesas en 7 pedidos").
+
+Cada worker arma su propio tablero; con varios workers el broker de eventos
+tiene que ser compartido (BrokerCache) para que todos vean los mismos
+cambios (ver core/eventos.py y el check core.W001).
+"""
+
+import threading
+
+from .eventos import obtener_broker
+
+ESTADOS_TABLERO = ('confirmado', 'en_preparacion', 'listo')
+ESTADOS_POR_COCINAR = ('confirmado', 'en_preparacion')
+
+
+class TableroCocina:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cargado = False
+        self._cursor = None
+        self._pedidos = {}  # pk -> pedido en el tablero (ver _agregar)
+        self._por_cocinar = {}  # producto_id -> {'nombre', 'cantidad', 'pedidos'}
+        self._foto = None
+
+    # --- Mantenimiento ---
+
+    def _agregar(self, pedidos):
+        """Trae de la base los pedidos (y sus líneas) que entran al tablero."""
+        from .models import DetallePedido, Pedido
+
+        if not pedidos:
+            return
+        filas = (Pedido.objects
+                 .filter(pk__in=pedidos, estado__in=ESTADOS_TABLERO)
+                 .values('pk', 'numero_pedido', 'estado', 'tipo_orden', 'fecha_creacion', 'notas_cocina'))
+        nuevos = {fila['pk']: {**fila, 'lineas': []} for fila in filas}
+        if not nuevos:
+            return
+        lineas = (DetallePedido.objects
+                  .filter(pedido_id__in=nuevos)
+                  .order_by('pk')
+                  .values_list('pedido_id', 'producto_id', 'producto__nombre', 'cantidad'))
+        for pedido_id, producto_id, nombre, cantidad in lineas:
+            nuevos[pedido_id]['lineas'].append({'producto': producto_id, 'nombre': nombre, 'cantidad': cantidad})
+
+        for pk, pedido in nuevos.items():
+            self._quitar(pk)
+            self._pedidos[pk] = pedido
+            self._sumar_por_cocinar(pedido, 1)
+
+    def _quitar(self, pk):
+        pedido = self._pedidos.pop(pk, None)
+        if pedido:
+            self._sumar_por_cocinar(pedido, -1)
+
+    def _cambiar_estado(self, pk, estado):
+        pedido = self._pedidos[pk]
+        self._sumar_por_cocinar(pedido, -1)
+        pedido['estado'] = estado
+        self._sumar_por_cocinar(pedido, 1)
+
+    def _sumar_por_cocinar(self, pedido, signo):
+        if pedido['estado'] not in ESTADOS_POR_COCINAR:
+            return
+        cantidades = {}
+        for linea in pedido['lineas']:
+            cantidades[linea['producto']] = cantidades.get(linea['producto'], 0) + linea['cantidad']
+        nombres = {linea['producto']: linea['nombre'] for linea in pedido['lineas']}
+        for producto_id, cantidad in cantidades.items():
+            acumulado = self._por_cocinar.setdefault(
+                producto_id, {'nombre': nombres[producto_id], 'cantidad': 0, 'pedidos': 0},
+            )
+            acumulado['cantidad'] += signo * cantidad
+            acumulado['pedidos'] += signo
+            if acumulado['pedidos'] <= 0:
+                del self._por_cocinar[producto_id]
+
+    def _cargar(self, broker):
+        from .models import Pedido
+
+        # El cursor se toma antes de leer la base: un cambio que ocurra entre
+        # medio llega como evento y se vuelve a aplicar (aplicarlo es idempotente).
+        self._cursor = broker.cursor_actual()
+        self._pedidos = {}
+        self._por_cocinar = {}
+        self._agregar(list(Pedido.objects.filter(estado__in=ESTADOS_TABLERO).values_list('pk', flat=True)))
+        self._cargado = True
+        self._foto = None
+
+    def _aplicar(self, eventos):
+        entran = []
+        for evento in eventos:
+            pk, estado = evento['pedido'], evento['estado']
+            if estado not in ESTADOS_TABLERO:
+                self._quitar(pk)
+            elif pk in self._pedidos:
+                self._cambiar_estado(pk, estado)
+            else:
+                entran.append(pk)
+        # Una sola ida a la base para todos los pedidos que entran
+        self._agregar(entran)
+        self._foto = None
+
+    def sincronizar(self):
+        """Aplica los eventos pendientes (sin esperar); recarga todo si se perdieron eventos."""
+        broker = obtener_broker()
+        with self._lock:
+            if not self._cargado:
+                self._cargar(broker)
+                return
+            eventos, self._cursor, perdidos = broker.leer(self._cursor, 0)
+            if perdidos:
+                self._cargar(broker)
+            elif eventos:
+                self._aplicar(eventos)
+
+    # --- Lectura ---
+
+    def _armar_foto(self):
+        orden = sorted(self._pedidos.values(), key=lambda pedido: (pedido['fecha_creacion'], pedido['pk']))
+        columnas = {estado: [] for estado in ESTADOS_TABLERO}
+        for pedido in orden:
+            columnas[pedido['estado']].append({
+                'pedido': pedido['pk'],
+                'numero': pedido['numero_pedido'],
+                'tipo_orden': pedido['tipo_orden'],
+                'fecha_creacion': pedido['fecha_creacion'].isoformat(),
+                'notas_cocina': pedido['notas_cocina'],
+                'lineas': pedido['lineas'],
+            })
+        por_cocinar = sorted(
+            ({'producto': producto_id, **acumulado} for producto_id, acumulado in self._por_cocinar.items()),
+            key=lambda fila: (-fila['cantidad'], fila['nombre']),
+        )
+        return {
+            'cursor': self._cursor,
+            # Lo próximo a cocinar: el pedido confirmado más antiguo
+            'siguiente': columnas['confirmado'][0] if columnas['confirmado'] else None,
+            'pedidos': columnas,
+            'por_cocinar': por_cocinar,
+        }
+
+    def foto(self):
+        """Estado actual del tablero; se arma de nuevo solo si hubo cambios desde la última vez."""
+        self.sincronizar()
+        with self._lock:
+            if self._foto is None:
+                self._foto = self._armar_foto()
+            return self._foto
+
+    def reiniciar(self):
+        with self._lock:
+            self._cargado = False
+            self._foto = None
+
+
+tablero = TableroCocina()
@@ -0,0 +1,95 @@
+"""
+Contadores de carga por repartidor (Repartidor.pedidos_activos,
+pedidos_en_camino, entregas_hoy).
+
+Cada cambio de pedido que afecta la carga (asignar o quitar repartidor,
+cambiar de estado) se traduce en deltas por repartidor que se aplican con
+un UPDATE ... SET campo = campo + delta, dentro de la misma transacción que
+el cambio del pedido. Así la lista de repartidores y el despacho leen la
+carga directo de la fila, sin contar pedidos.
+
+Lo que no pasa por aquí (bulk_create, borrados, ediciones a mano en la base)
+se corrige con `reconciliar()` / comando `reconciliar_repartidores`.
+"""
+
+from collections import defaultdict
+
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .fechas import rango_dia
+
+ESTADOS_ACTIVOS = ('confirmado', 'en_preparacion', 'listo', 'en_camino')
+
+
+def _aporte(estado):
+    """(activos, en_camino) con que un pedido en ese estado suma a su repartidor."""
+    return int(estado in ESTADOS_ACTIVOS), int(estado == 'en_camino')
+
+
+def registrar_cambios(cambios):
+    """
+    Aplica los cambios de carga. `cambios`: iterable de
+    (repartidor_anterior, estado_anterior, repartidor, estado); los
+    repartidores pueden ser None y estado_anterior None para un pedido nuevo.
+    """
+    from .models import Repartidor
+
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for repartidor_anterior, estado_anterior, repartidor, estado in cambios:
+        if repartidor_anterior:
+            activos, en_camino = _aporte(estado_anterior)
+            deltas[repartidor_anterior][0] -= activos
+            deltas[repartidor_anterior][1] -= en_camino
+        if repartidor:
+            activos, en_camino = _aporte(estado)
+            deltas[repartidor][0] += activos
+            deltas[repartidor][1] += en_camino
+            if estado == 'entregado' and estado_anterior != 'entregado':
+                deltas[repartidor][2] += 1
+
+    hoy = timezone.localdate()
+    # Orden fijo para no generar deadlocks entre procesos
+    for repartidor_id, (activos, en_camino, entregas) in sorted(deltas.items()):
+        cambios_fila = {}
+        # Nunca bajo cero, aunque el contador se haya desfasado
+        if activos:
+            cambios_fila['pedidos_activos'] = Greatest(F('pedidos_activos') + activos, Value(0))
+        if en_camino:
+            cambios_fila['pedidos_en_camino'] = Greatest(F('pedidos_en_camino') + en_camino, Value(0))
+        if entregas:
+            # El contador de entregas se reinicia solo al cambiar de día
+            cambios_fila['entregas_hoy'] = Case(
+                When(fecha_entregas=hoy, then=F('entregas_hoy') + entregas),
+                default=Value(entregas),
+            )
+            cambios_fila['fecha_entregas'] = Value(hoy)
+        if cambios_fila:
+            Repartidor.objects.filter(pk=repartidor_id).update(**cambios_fila)
+
+
+def reconciliar():
+    """Recalcula los contadores de todos los repartidores desde los pedidos; devuelve cuántos estaban mal."""
+    from .models import Repartidor
+
+    hoy = timezone.localdate()
+    inicio, fin = rango_dia(hoy)
+    repartidores = Repartidor.objects.annotate(
+        real_activos=Count('pedido', filter=Q(pedido__estado__in=ESTADOS_ACTIVOS)),
+        real_en_camino=Count('pedido', filter=Q(pedido__estado='en_camino')),
+        real_entregas=Count('pedido', filter=Q(pedido__estado='entregado',
+                                               pedido__fecha_entrega__gte=inicio,
+                                               pedido__fecha_entrega__lt=fin)),
+    )
+    corregidos = []
+    for repartidor in repartidores:
+        reales = (repartidor.real_activos, repartidor.real_en_camino, repartidor.real_entregas)
+        if (repartidor.pedidos_activos, repartidor.pedidos_en_camino, repartidor.entregas_de_hoy) != reales:
+            repartidor.pedidos_activos, repartidor.pedidos_en_camino, repartidor.entregas_hoy = reales
+            repartidor.fecha_entregas = hoy
+            corregidos.append(repartidor)
+    Repartidor.objects.bulk_update(
+        corregidos, ['pedidos_activos', 'pedidos_en_camino', 'entregas_hoy', 'fecha_entregas'], batch_size=500,
+    )
+    return len(corregidos)
@@ -0,0 +1,12 @@
+from django.utils.functional import SimpleLazyObject
+
+from .carrito import resumen_carrito
+
+
+def carrito(request):
+    """
+    Agrega `carrito_resumen` ({'total_items', 'total_precio'}) al contexto.
+
+    Es perezoso: solo se calcula (desde el caché) si la plantilla lo usa.
+    """
+    return {'carrito_resumen': SimpleLazyObject(lambda: resumen_carrito(request.user))}
@@ -0,0 +1,199 @@
+"""
+Despacho automático de pedidos delivery a repartidores.
+
+En cada pasada (comando `despachar` o el botón del admin) se toma la cola de
+pedidos delivery confirmados o listos sin repartidor y los repartidores
+disponibles, y se asigna en memoria con un puntaje por par (repartidor,
+pedido):
+
+    costo = PESO_CARGA * carga + PESO_DISTANCIA * km - PESO_CALIFICACION * calificacion
+
+donde `km` es la distancia desde el último destino que se le asignó al
+repartidor en esta pasada (o desde el local si todavía no tiene), así los
+pedidos cercanos tienden a agruparse en un mismo repartidor. Un pedido a
+menos de RADIO_LOTE_KM del anterior del mismo lote se puntúa con una unidad
+menos de carga (aunque sí cuenta para CAPACIDAD_REPARTIDOR).
+
+Las direcciones se ubican con una tabla local de comunas y calles (ZONAS);
+las que no se reconocen se tratan como si estuvieran en el local. Todo el
+cálculo es en memoria: con cientos de pedidos y decenas de repartidores toma
+milisegundos, y la base de datos solo ve dos lecturas y, por cada repartidor
+con pedidos nuevos, el UPDATE de los pedidos y el de su contador de carga (en
+bases sin SELECT ... FOR UPDATE, un UPDATE por pedido; ver `_asignar`).
+"""
+
+import math
+import unicodedata
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .contadores import registrar_cambios
+from .eventos import publicar_cambio_pedido
+from .models import Pedido, Repartidor
+from .seguimiento import invalidar as invalidar_seguimiento
+
+ESTADOS_DESPACHABLES = ('confirmado', 'listo')
+
+PESO_CARGA = 4.0
+PESO_DISTANCIA = 1.0
+PESO_CALIFICACION = 1.5
+RADIO_LOTE_KM = 1.5
+
+# Comunas y calles conocidas -> (latitud, longitud) aproximadas. Se busca la
+# primera que aparezca en la dirección, de la más específica a la más general.
+ZONAS = {
+    'av. providencia': (-33.4262, -70.6170),
+    'pedro de valdivia': (-33.4290, -70.6045),
+    'manuel montt': (-33.4310, -70.6190),
+    'los leones': (-33.4220, -70.6040),
+    'av. apoquindo': (-33.4140, -70.5830),
+    'irarrazaval': (-33.4540, -70.6000),
+    'av. grecia': (-33.4680, -70.5950),
+    'av. ossa': (-33.4580, -70.5700),
+    'vicuna mackenna': (-33.4750, -70.6200),
+    'av. matta': (-33.4600, -70.6450),
+    'san diego': (-33.4650, -70.6500),
+    'bilbao': (-33.4350, -70.5900),
+    'providencia': (-33.4314, -70.6093),
+    'las condes': (-33.4080, -70.5670),
+    'vitacura': (-33.3900, -70.5800),
+    'nunoa': (-33.4560, -70.5970),
+    'la reina': (-33.4430, -70.5400),
+    'penalolen': (-33.4850, -70.5400),
+    'macul': (-33.4870, -70.5980),
+    'san miguel': (-33.4970, -70.6510),
+    'estacion central': (-33.4580, -70.6900),
+    'independencia': (-33.4160, -70.6660),
+    'recoleta': (-33.4060, -70.6400),
+    'maipu': (-33.5100, -70.7570),
+    'la florida': (-33.5220, -70.5980),
+    'puente alto': (-33.6110, -70.5750),
+    'santiago': (-33.4489, -70.6693),
+}
+
+
+def _normalizar(texto):
+    sin_tildes = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(sin_tildes.lower().split())
+
+
+@lru_cache(maxsize=4096)
+def ubicar(direccion):
+    """(lat, lon) aproximada de una dirección según ZONAS, o None si no se reconoce."""
+    if not direccion:
+        return None
+    texto = _normalizar(direccion)
+    for zona, coordenadas in ZONAS.items():
+        if zona in texto:
+            return coordenadas
+    return None
+
+
+def distancia_km(a, b):
+    """Aproximación equirectangular; sobra para distancias dentro de una ciudad."""
+    lat = math.radians((a[0] + b[0]) / 2)
+    dx = math.radians(b[1] - a[1]) * math.cos(lat)
+    dy = math.radians(b[0] - a[0])
+    return 6371 * math.hypot(dx, dy)
+
+
+def ubicacion_local():
+    return tuple(getattr(settings, 'UBICACION_LOCAL', ZONAS['santiago']))
+
+
+def planificar(pedidos, repartidores, capacidad):
+    """
+    Asigna en memoria. `pedidos`: [(pk, direccion)] en orden de llegada;
+    `repartidores`: [(pk, carga actual, calificacion)]. Devuelve {repartidor_pk: [pedido_pk, ...]}.
+    """
+    origen = ubicacion_local()
+    estado = {
+        pk: {'carga': carga, 'calificacion': float(calificacion or 0), 'ultimo': origen, 'lote': False}
+        for pk, carga, calificacion in repartidores
+        if carga < capacidad
+    }
+    plan = {}
+    for pedido_pk, direccion in pedidos:
+        if not estado:
+            break
+        destino = ubicar(direccion) or origen
+        mejor, mejor_costo = None, None
+        for repartidor_pk, datos in estado.items():
+            km = distancia_km(datos['ultimo'], destino)
+            carga = datos['carga']
+            if datos['lote'] and km <= RADIO_LOTE_KM:
+                carga -= 1  # va para allá de todas formas: el pedido casi no le suma trabajo
+            costo = PESO_CARGA * carga + PESO_DISTANCIA * km - PESO_CALIFICACION * datos['calificacion']
+            if mejor_costo is None or costo < mejor_costo:
+                mejor, mejor_costo = repartidor_pk, costo
+        datos = estado[mejor]
+        plan.setdefault(mejor, []).append(pedido_pk)
+        datos['carga'] += 1
+        datos['ultimo'], datos['lote'] = destino, True
+        if datos['carga'] >= capacidad:
+            del estado[mejor]
+    return plan
+
+
+def _asignar(repartidor_pk, pedido_pks):
+    """
+    Asigna al repartidor los pedidos que sigan sin repartidor y devuelve los
+    que efectivamente quedaron asignados en esta pasada.
+    """
+    pendientes = Pedido.objects.filter(repartidor__isnull=True, estado__in=ESTADOS_DESPACHABLES)
+    cambios = {'repartidor_id': repartidor_pk, 'version': F('version') + 1}
+    if connection.features.has_select_for_update:
+        # La cola quedó bloqueada en el SELECT: nadie más pudo asignar estos pedidos
+        actualizados = pendientes.filter(pk__in=pedido_pks).update(**cambios)
+        if actualizados == len(pedido_pks):
+            return pedido_pks
+        # No debería pasar; se vuelve a leer qué quedó con este repartidor
+        return list(Pedido.objects.filter(pk__in=pedido_pks, repartidor_id=repartidor_pk).values_list('pk', flat=True))
+    # Sin bloqueo de filas otro despacho o una asignación manual pudo ganar
+    # algún pedido entre medio: un UPDATE condicional por pedido dice cuáles son nuestros
+    return [pk for pk in pedido_pks if pendientes.filter(pk=pk).update(**cambios)]
+
+
+def despachar(limite=500):
+    """
+    Una pasada del despacho. Devuelve {repartidor_pk: [pedido_pk, ...]} con
+    lo que efectivamente se asignó.
+    """
+    capacidad = getattr(settings, 'CAPACIDAD_REPARTIDOR', 3)
+    with transaction.atomic():
+        cola = (Pedido.objects
+                .filter(tipo_orden='delivery', estado__in=ESTADOS_DESPACHABLES, repartidor__isnull=True)
+                .order_by('fecha_creacion', 'pk')
+                .only('numero_pedido', 'estado', 'repartidor', 'cliente', 'tipo_orden', 'total', 'direccion_entrega'))
+        if connection.features.has_select_for_update:
+            # Con skip_locked dos despachos a la vez se reparten la cola en vez de esperarse
+            cola = cola.select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+        cola = list(cola[:limite])
+        if not cola:
+            return {}
+
+        # La carga sale del contador del repartidor (ver core/contadores.py)
+        repartidores = (Repartidor.objects
+                        .filter(disponible=True)
+                        .values_list('pk', 'pedidos_activos', 'calificacion_promedio'))
+        plan = planificar([(pedido.pk, pedido.direccion_entrega) for pedido in cola], repartidores, capacidad)
+
+        por_pk = {pedido.pk: pedido for pedido in cola}
+        asignados = {}
+        for repartidor_pk, pedido_pks in plan.items():
+            # Contadores, eventos y el resultado solo con lo que se asignó de verdad
+            pedido_pks = _asignar(repartidor_pk, pedido_pks)
+            if not pedido_pks:
+                continue
+            invalidar_seguimiento(por_pk[pk].numero_pedido for pk in pedido_pks)
+            asignados[repartidor_pk] = pedido_pks
+            registrar_cambios((None, por_pk[pk].estado, repartidor_pk, por_pk[pk].estado) for pk in pedido_pks)
+            for pk in pedido_pks:
+                pedido = por_pk[pk]
+                pedido.repartidor_id = repartidor_pk
+                publicar_cambio_pedido(pedido, pedido.estado, None)
+                pedido._repartidor_original = repartidor_pk
+    return asignados
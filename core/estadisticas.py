@@ -0,0 +1,110 @@
+"""Cálculo de métricas (KPI) para el dashboard del administrador."""
+
+from datetime import timedelta
+
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import Pedido, Producto, ResumenProductoDiario, ResumenVentaDiaria, Usuario
+
+# Estados que cuentan como venta efectiva
+ESTADOS_VENTA = ['confirmado', 'en_preparacion', 'listo', 'en_camino', 'entregado']
+
+# Ventanas (en días) que se pueden pedir para el gráfico de ventas
+VENTANAS_DIAS = (7, 30, 90)
+VENTANA_POR_DEFECTO = 7
+
+DIAS_ESPANOL = {
+    'Mon': 'Lun', 'Tue': 'Mar', 'Wed': 'Mié',
+    'Thu': 'Jue', 'Fri': 'Vie', 'Sat': 'Sáb', 'Sun': 'Dom'
+}
+
+
+def normalizar_ventana(dias):
+    """Devuelve una ventana válida (7/30/90) a partir de lo que venga en la URL."""
+    try:
+        dias = int(dias)
+    except (TypeError, ValueError):
+        return VENTANA_POR_DEFECTO
+    return dias if dias in VENTANAS_DIAS else VENTANA_POR_DEFECTO
+
+
+def _etiqueta_dia(dia, ventana):
+    # Para la semana mostramos el nombre del día, para ventanas largas la fecha
+    if ventana == 7:
+        dia_ingles = dia.strftime('%a')
+        return DIAS_ESPANOL.get(dia_ingles, dia_ingles)
+    return dia.strftime('%d/%m')
+
+
+def calcular_metricas_dashboard(dias=VENTANA_POR_DEFECTO):
+    """
+    Calcula todas las tarjetas KPI y el gráfico de ventas del dashboard.
+
+    La cantidad de consultas es fija sin importar el tamaño de la ventana, y
+    las ventas salen de los resúmenes diarios (ver core/resumenes.py), así que
+    el costo depende de la cantidad de días y no de la cantidad de pedidos.
+    """
+    ventana = normalizar_ventana(dias)
+    hoy = timezone.localdate()
+    primer_dia = hoy - timedelta(days=ventana - 1)
+
+    # 1. Ventas y cantidad de pedidos por día (una consulta para toda la ventana)
+    filas = (
+        ResumenVentaDiaria.objects.filter(fecha__gte=primer_dia, fecha__lte=hoy)
+        .values('fecha')
+        .annotate(
+            total_ventas=Sum('total', filter=Q(estado__in=ESTADOS_VENTA)),
+            cantidad=Sum('cantidad_pedidos'),
+        )
+        .order_by('fecha')
+    )
+    por_dia = {fila['fecha']: fila for fila in filas}
+
+    etiquetas = []
+    ventas_por_dia = []
+    for i in range(ventana):
+        dia = primer_dia + timedelta(days=i)
+        fila = por_dia.get(dia)
+        etiquetas.append(_etiqueta_dia(dia, ventana))
+        ventas_por_dia.append(float(fila['total_ventas'] or 0) if fila else 0.0)
+
+    fila_hoy = por_dia.get(hoy) or {}
+
+    # 2. Clientes totales
+    total_clientes = Usuario.objects.filter(rol='cliente').count()
+
+    # 3. Productos activos
+    total_productos_activos = Producto.objects.filter(activo=True).count()
+
+    # 4. Pedidos pendientes para la lista (los 5 más recientes)
+    pedidos_recientes = Pedido.objects.filter(
+        estado__in=['confirmado', 'en_preparacion']
+    ).order_by('-fecha_creacion')[:5]
+
+    # 5. Productos más vendidos hoy
+    productos_populares = (
+        ResumenProductoDiario.objects.filter(fecha=hoy, estado__in=ESTADOS_VENTA)
+        .values('producto__nombre')
+        .annotate(cantidad_vendida=Sum('cantidad'))
+        .order_by('-cantidad_vendida')[:5]
+    )
+
+    # 6. Los 10 productos activos con menos stock
+    productos_bajo_stock = Producto.objects.filter(
+        activo=True,
+        stock__lte=10
+    ).select_related('categoria').order_by('stock', 'nombre')[:10]
+
+    return {
+        'ventana_dias': ventana,
+        'ventas_hoy': fila_hoy.get('total_ventas') or 0,
+        'pedidos_hoy': fila_hoy.get('cantidad') or 0,
+        'total_clientes': total_clientes,
+        'total_productos_activos': total_productos_activos,
+        'pedidos_recientes': pedidos_recientes,
+        'chart_labels': etiquetas,
+        'chart_data': ventas_por_dia,
+        'productos_populares': productos_populares,
+        'productos_bajo_stock': productos_bajo_stock,
+    }
@@ -0,0 +1,139 @@
+"""
+Máquina de estados de los pedidos.
+
+La tabla TRANSICIONES dice a qué estados puede pasar un pedido desde cada
+estado; FECHAS, qué campo fecha_* se marca al llegar a cada uno (solo la
+primera vez). Todas las vistas cambian estados por aquí:
+
+- cambiar_estado(pedido, estado): un pedido, con Pedido.save() (que se
+  encarga de los resúmenes y de publicar el evento).
+- transicionar(pedidos, estado): N pedidos con un solo UPDATE condicional
+  (WHERE estado IN <estados de origen válidos>). Los pedidos que no pueden
+  pasar a ese estado se dejan como están. Los resúmenes, los eventos y los
+  contadores de los repartidores se actualizan por lote.
+"""
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .contadores import registrar_cambios
+from .eventos import publicar_cambio_pedido
+from .models import Pedido
+from .resumenes import registrar_cambios_estado
+from .seguimiento import invalidar as invalidar_seguimiento
+
+TRANSICIONES = {
+    'pendiente': {'confirmado', 'cancelado'},
+    'confirmado': {'en_preparacion', 'cancelado'},
+    'en_preparacion': {'listo', 'cancelado'},
+    # Los pedidos para retiro o local se entregan directo desde 'listo'
+    'listo': {'en_camino', 'entregado', 'cancelado'},
+    'en_camino': {'entregado'},
+    'entregado': set(),
+    'cancelado': set(),
+}
+
+FECHAS = {
+    'confirmado': 'fecha_confirmacion',
+    'en_preparacion': 'fecha_preparacion',
+    'listo': 'fecha_listo',
+    'entregado': 'fecha_entrega',
+}
+
+# Estados a los que puede mover un pedido cada rol (el administrador, a todos)
+DESTINOS_POR_ROL = {
+    'cocina': {'en_preparacion', 'listo'},
+    'repartidor': {'en_preparacion', 'listo', 'en_camino', 'entregado'},
+}
+
+
+class TransicionInvalida(ValueError):
+    """El pedido no puede pasar de su estado actual al estado solicitado."""
+
+
+def origenes(estado):
+    """Estados desde los que se puede llegar a `estado`."""
+    return [origen for origen, destinos in TRANSICIONES.items() if estado in destinos]
+
+
+def destinos_permitidos(usuario):
+    if usuario.rol == 'administrador':
+        return set(TRANSICIONES)
+    return DESTINOS_POR_ROL.get(usuario.rol, set())
+
+
+def opciones_estado(usuario, estado_actual=None):
+    """
+    (valor, etiqueta) de los estados a los que `usuario` puede mover un pedido
+    que está en `estado_actual` (o cualquier pedido, si es None), en el orden
+    de Pedido.ESTADO_CHOICES. Es lo que ofrecen los selectores de estado.
+    """
+    destinos = destinos_permitidos(usuario)
+    if estado_actual is not None:
+        destinos = destinos & TRANSICIONES.get(estado_actual, set())
+    return [(valor, etiqueta) for valor, etiqueta in Pedido.ESTADO_CHOICES if valor in destinos]
+
+
+def validar_transicion(estado_actual, estado):
+    if estado not in TRANSICIONES:
+        raise TransicionInvalida(f'Estado no válido: {estado}.')
+    if estado not in TRANSICIONES[estado_actual]:
+        etiquetas = dict(Pedido.ESTADO_CHOICES)
+        raise TransicionInvalida(
+            f'Un pedido "{etiquetas[estado_actual]}" no puede pasar a "{etiquetas[estado]}".'
+        )
+
+
+def cambiar_estado(pedido, estado):
+    """Valida y aplica la transición de un pedido, marcando su fecha_* si corresponde."""
+    validar_transicion(pedido.estado, estado)
+    pedido.estado = estado
+    campo = FECHAS.get(estado)
+    if campo and getattr(pedido, campo) is None:
+        setattr(pedido, campo, timezone.now())
+    pedido.save()
+    return pedido
+
+
+def transicionar(pedidos, estado):
+    """
+    Pasa a `estado` todos los pedidos del queryset que puedan hacerlo, con un
+    solo UPDATE. Devuelve la lista de pedidos movidos (con el estado nuevo).
+
+    Los pedidos candidatos se leen con select_for_update para saber cuáles
+    cambian (y desde qué estado) sin que otro proceso los mueva entre medio.
+    """
+    if estado not in TRANSICIONES:
+        raise TransicionInvalida(f'Estado no válido: {estado}.')
+
+    campos = ['numero_pedido', 'estado', 'repartidor', 'cliente', 'tipo_orden', 'total', 'fecha_creacion']
+    with transaction.atomic():
+        movidos = list(
+            pedidos.filter(estado__in=origenes(estado))
+            .select_related(None)
+            .prefetch_related(None)
+            .select_for_update()
+            .only(*campos)
+            .order_by('pk')
+        )
+        if not movidos:
+            return []
+
+        ahora = timezone.now()
+        cambios = {'estado': estado, 'version': F('version') + 1}
+        campo = FECHAS.get(estado)
+        if campo:
+            cambios[campo] = Coalesce(F(campo), ahora)
+        Pedido.objects.filter(pk__in=[pedido.pk for pedido in movidos], estado__in=origenes(estado)).update(**cambios)
+
+        registrar_cambios_estado(movidos, estado)
+        invalidar_seguimiento(pedido.numero_pedido for pedido in movidos)
+        registrar_cambios((pedido.repartidor_id, pedido.estado, pedido.repartidor_id, estado) for pedido in movidos)
+        for pedido in movidos:
+            estado_anterior = pedido.estado
+            pedido.estado = estado
+            publicar_cambio_pedido(pedido, estado_anterior, pedido.repartidor_id)
+            pedido._estado_original = estado
+    return movidos
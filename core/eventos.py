@@ -0,0 +1,255 @@
+"""
+Eventos de cambios de pedidos para las pantallas en vivo (repartidor, admin).
+
+Pedido.save() publica un evento pequeño cada vez que se crea un pedido o
+cambia su estado o su repartidor, una vez confirmada la transacción. Las
+pantallas se suscriben a `pedidos_eventos_view` (server-sent events o long
+poll) y reciben solo esos cambios, en vez de recargar la lista completa.
+
+El broker se elige con el setting BROKER_EVENTOS_PEDIDOS:
+
+- BrokerLocal (por defecto con un solo proceso): en memoria del proceso.
+  Sirve solo con un proceso (runserver, un worker con hilos o un worker
+  ASGI): un evento publicado en otro worker no le llega.
+- BrokerCache (por defecto con WEB_CONCURRENCY > 1): guarda los eventos en
+  el cache de Django, así lo comparten varios workers si el cache es
+  compartido (Redis, Memcached, base de datos). El check core.W001 (ver
+  core/checks.py) avisa si hay varios workers con un broker o un cache que
+  viven en cada proceso.
+
+El tablero de cocina (core/cocina.py) también vive en cada proceso, pero se
+mantiene con estos eventos: con BrokerCache cada worker ve los cambios
+hechos en los demás.
+
+Los lectores tienen dos formas de esperar: `leer()` bloquea el hilo (WSGI,
+tablero de cocina) y `aleer()` espera sin bloquear el event loop (el stream
+SSE y el long poll bajo ASGI).
+
+Cada evento lleva un id creciente que el cliente devuelve al reconectarse
+(Last-Event-ID o `desde`). Si los eventos intermedios ya no están (reinicio
+del proceso, eventos vencidos) se avisa con `perdidos` para que la pantalla
+recargue la lista completa una vez.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+BROKER_POR_DEFECTO = 'core.eventos.BrokerLocal'
+ROLES_PERSONAL = ('administrador', 'cajero', 'cocina')
+
+
+def _id_inicial():
+    # Basado en el reloj: tras un reinicio los ids no vuelven a empezar, así
+    # un cliente con un id viejo se da cuenta de que perdió eventos.
+    return int(time.time() * 1000)
+
+
+def evento_pedido(pedido, estado_anterior=None, repartidor_anterior=None, nuevo=False):
+    """Lo mínimo que necesita una pantalla para actualizar la fila del pedido."""
+    return {
+        'pedido': pedido.pk,
+        'numero': pedido.numero_pedido,
+        'nuevo': nuevo,
+        'estado': pedido.estado,
+        'estado_anterior': estado_anterior,
+        'repartidor': pedido.repartidor_id,
+        'repartidor_anterior': repartidor_anterior,
+        'cliente': pedido.cliente_id,
+        'tipo_orden': pedido.tipo_orden,
+        'total': f'{Decimal(str(pedido.total or 0)):.2f}',
+    }
+
+
+class BrokerLocal:
+    """Buffer circular en memoria; los lectores esperan en una Condition."""
+
+    def __init__(self, capacidad=1000):
+        self._eventos = deque(maxlen=capacidad)
+        self._ultimo = _id_inicial()
+        self._condicion = threading.Condition()
+        self._avisos = set()  # (loop, asyncio.Event) de los lectores async
+
+    def publicar(self, evento):
+        with self._condicion:
+            self._ultimo += 1
+            self._eventos.append({**evento, 'id': self._ultimo})
+            self._condicion.notify_all()
+            avisos = list(self._avisos)
+        # Se publica desde hilos sync: el aviso se agenda en el loop de cada lector
+        for loop, aviso in avisos:
+            loop.call_soon_threadsafe(aviso.set)
+
+    def cursor_actual(self):
+        return self._ultimo
+
+    def leer(self, desde, espera):
+        """
+        Eventos con id > desde, esperando hasta `espera` segundos si no hay.
+        Devuelve (eventos, nuevo cursor, perdidos).
+        """
+        limite = time.monotonic() + espera
+        with self._condicion:
+            while self._ultimo <= desde:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                self._condicion.wait(restante)
+
+            if desde > self._ultimo:
+                # El cursor es de otro proceso o de antes de un reinicio
+                return [], self._ultimo, True
+            primero = self._eventos[0]['id'] if self._eventos else self._ultimo + 1
+            perdidos = desde < primero - 1
+            eventos = [evento for evento in self._eventos if evento['id'] > desde]
+            return eventos, self._ultimo, perdidos
+
+    async def aleer(self, desde, espera):
+        """Como leer(), pero espera en el event loop en vez de bloquear el hilo."""
+        loop = asyncio.get_running_loop()
+        limite = loop.time() + espera
+        while True:
+            aviso = (loop, asyncio.Event())
+            with self._condicion:
+                self._avisos.add(aviso)
+            try:
+                eventos, cursor, perdidos = self.leer(desde, 0)
+                restante = limite - loop.time()
+                if eventos or perdidos or restante <= 0:
+                    return eventos, cursor, perdidos
+                try:
+                    await asyncio.wait_for(aviso[1].wait(), restante)
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                with self._condicion:
+                    self._avisos.discard(aviso)
+
+
+class BrokerCache:
+    """
+    Eventos en el cache de Django: un contador y una clave por evento.
+
+    Los lectores consultan el contador cada `intervalo` segundos y traen los
+    eventos nuevos con un get_many; cada evento vive `timeout` segundos.
+    """
+
+    CLAVE_ULTIMO = 'eventos:pedidos:ultimo'
+
+    def __init__(self, capacidad=1000, timeout=300, intervalo=0.5):
+        self.capacidad = capacidad
+        self.timeout = timeout
+        self.intervalo = intervalo
+
+    def _clave(self, evento_id):
+        return f'eventos:pedidos:{evento_id}'
+
+    def publicar(self, evento):
+        cache.add(self.CLAVE_ULTIMO, _id_inicial(), None)
+        try:
+            evento_id = cache.incr(self.CLAVE_ULTIMO)
+        except ValueError:
+            # El contador se perdió entre add() e incr()
+            cache.add(self.CLAVE_ULTIMO, _id_inicial(), None)
+            evento_id = cache.incr(self.CLAVE_ULTIMO)
+        cache.set(self._clave(evento_id), {**evento, 'id': evento_id}, self.timeout)
+
+    def cursor_actual(self):
+        ultimo = cache.get(self.CLAVE_ULTIMO)
+        if ultimo is None:
+            cache.add(self.CLAVE_ULTIMO, _id_inicial(), None)
+            ultimo = cache.get(self.CLAVE_ULTIMO)
+        return ultimo
+
+    def _intentar(self, desde, vencido):
+        """
+        Una pasada por el cache: (eventos, cursor, perdidos), o None si todavía
+        no hay nada y queda tiempo de espera.
+        """
+        ultimo = self.cursor_actual()
+        if desde > ultimo:
+            return [], ultimo, True
+        perdidos = False
+        if ultimo - desde > self.capacidad:
+            perdidos = True
+            desde = ultimo - self.capacidad
+
+        if ultimo > desde:
+            ids = range(desde + 1, ultimo + 1)
+            encontrados = cache.get_many([self._clave(evento_id) for evento_id in ids])
+            eventos = []
+            for evento_id in ids:
+                evento = encontrados.get(self._clave(evento_id))
+                if evento is None:
+                    break
+                eventos.append(evento)
+            if eventos:
+                return eventos, eventos[-1]['id'], perdidos
+            if vencido:
+                # El siguiente evento no aparece (venció o su publicación falló)
+                return [], ultimo, True
+        if vencido:
+            return [], desde, perdidos
+        return None
+
+    def leer(self, desde, espera):
+        limite = time.monotonic() + espera
+        while True:
+            resultado = self._intentar(desde, time.monotonic() >= limite)
+            if resultado is not None:
+                return resultado
+            time.sleep(max(min(self.intervalo, limite - time.monotonic()), 0))
+
+    async def aleer(self, desde, espera):
+        """Como leer(): cada pasada por el cache va a un hilo y la pausa es un asyncio.sleep."""
+        limite = time.monotonic() + espera
+        intentar = sync_to_async(self._intentar, thread_sensitive=False)
+        while True:
+            resultado = await intentar(desde, time.monotonic() >= limite)
+            if resultado is not None:
+                return resultado
+            await asyncio.sleep(max(min(self.intervalo, limite - time.monotonic()), 0))
+
+
+_broker = None
+
+
+def obtener_broker():
+    """Instancia (única por proceso) del broker configurado."""
+    global _broker
+    if _broker is None:
+        ruta = getattr(settings, 'BROKER_EVENTOS_PEDIDOS', BROKER_POR_DEFECTO)
+        _broker = import_string(ruta)()
+    return _broker
+
+
+def publicar_cambio_pedido(pedido, estado_anterior=None, repartidor_anterior=None, nuevo=False):
+    """Publica el cambio cuando se confirme la transacción (si se revierte, no se publica)."""
+    evento = evento_pedido(pedido, estado_anterior, repartidor_anterior, nuevo)
+    transaction.on_commit(lambda: obtener_broker().publicar(evento))
+
+
+def filtro_para(usuario):
+    """
+    Función evento -> bool con lo que puede ver el usuario: el personal ve
+    todos los pedidos, el repartidor los suyos (también los que le quitaron)
+    y el cliente los propios. None si el usuario no debe suscribirse.
+    """
+    if usuario.rol in ROLES_PERSONAL or usuario.is_superuser:
+        return lambda evento: True
+    if usuario.rol == 'repartidor':
+        perfil_id = getattr(getattr(usuario, 'perfil_repartidor', None), 'pk', None)
+        if perfil_id is None:
+            return None
+        return lambda evento: perfil_id in (evento['repartidor'], evento['repartidor_anterior'])
+    if usuario.rol == 'cliente':
+        return lambda evento: evento['cliente'] == usuario.pk
+    return None
@@ -0,0 +1,22 @@
+"""Utilidades para filtrar por fecha usando rangos en vez de `__date`."""
+
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def inicio_del_dia(fecha):
+    """Datetime (con zona horaria) de las 00:00 de `fecha`."""
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def rango_dia(fecha=None):
+    """
+    Devuelve (inicio, fin) del día para filtrar con `campo__gte` / `campo__lt`.
+
+    Filtrar con `fecha_creacion__date=hoy` obliga a la BD a convertir cada fila
+    y no puede usar los índices sobre la columna; un rango sí los usa.
+    """
+    fecha = fecha or timezone.localdate()
+    inicio = inicio_del_dia(fecha)
+    return inicio, inicio_del_dia(fecha + timedelta(days=1))
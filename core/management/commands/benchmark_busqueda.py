@@ -0,0 +1,93 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from core.busqueda import IndiceProductos, indice_productos
+from core.models import Categoria, Producto
+
+PREFIJO = 'Bench'
+
+PLATOS = ['Hamburguesa', 'Pizza', 'Empanada', 'Completo', 'Sándwich', 'Ensalada', 'Papas', 'Jugo', 'Café', 'Té',
+          'Churrasco', 'Barros Luco', 'Sopaipilla', 'Pastel', 'Torta', 'Helado', 'Nuggets', 'Wrap', 'Taco', 'Burrito']
+VARIANTES = ['clásica', 'doble', 'pequeño', 'grande', 'vegana', 'italiana', 'picante', 'con queso', 'al pil pil',
+             'de pollo', 'de carne', 'de atún', 'napolitana', 'especial', 'familiar', 'mediano', 'light', 'artesanal']
+INGREDIENTES = ['tomate', 'palta', 'mayonesa', 'queso', 'jamón', 'champiñón', 'cebolla', 'ají', 'pepinillo',
+                'lechuga', 'tocino', 'huevo', 'aceituna', 'choclo', 'porotos verdes', 'piña', 'pimentón']
+
+CONSULTAS = ['hamburguesa', 'pequeno', 'pequeño', 'hambur doble', 'cafe', 'queso palta', 'pizza italiana',
+             'jugo', 'champinon', 'xyz inexistente']
+
+
+class Command(BaseCommand):
+    help = 'Compara la búsqueda de productos por icontains contra el índice de core/busqueda.py.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=100_000, help='Cantidad de productos a sembrar.')
+        parser.add_argument('--lote', type=int, default=5000)
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        self._sembrar(options['productos'], options['lote'], random.Random(options['semilla']))
+
+        indice = IndiceProductos()
+        inicio = time.perf_counter()
+        indice.reconstruir()
+        self.stdout.write(f'Índice construido en {(time.perf_counter() - inicio) * 1000:.0f} ms '
+                          f'({Producto.objects.count()} productos)')
+
+        self.stdout.write(f"\n{'Consulta':<24}{'icontains (ms)':>16}{'índice (ms)':>14}{'res. icontains':>16}{'res. índice':>13}")
+        for consulta in CONSULTAS:
+            def por_icontains():
+                filtro = models.Q()
+                for palabra in consulta.split():
+                    filtro &= models.Q(nombre__icontains=palabra) | models.Q(descripcion__icontains=palabra)
+                return list(Producto.objects.filter(filtro).values_list('pk', flat=True))
+
+            def por_indice():
+                return indice.buscar(consulta)
+
+            tiempo_icontains, resultados_icontains = self._medir(por_icontains, options['repeticiones'])
+            tiempo_indice, resultados_indice = self._medir(por_indice, options['repeticiones'])
+            self.stdout.write(
+                f'{consulta:<24}{tiempo_icontains:>16.2f}{tiempo_indice:>14.2f}'
+                f'{len(resultados_icontains):>16}{len(resultados_indice):>13}'
+            )
+
+    def _medir(self, funcion, repeticiones):
+        resultado = funcion()
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return statistics.median(tiempos), resultado
+
+    def _sembrar(self, cantidad, lote, rng):
+        existentes = Producto.objects.filter(nombre__startswith=PREFIJO).count()
+        if existentes >= cantidad:
+            return
+
+        categoria, _ = Categoria.objects.get_or_create(nombre=f'{PREFIJO} categoría')
+        self.stdout.write(f'Sembrando {cantidad - existentes} productos...')
+        for desde in range(existentes, cantidad, lote):
+            productos = []
+            for i in range(desde, min(desde + lote, cantidad)):
+                plato = rng.choice(PLATOS)
+                nombre = f'{PREFIJO} {plato} {rng.choice(VARIANTES)} {i}'
+                descripcion = f'{plato} con {", ".join(rng.sample(INGREDIENTES, 3))}'
+                productos.append(Producto(
+                    nombre=nombre,
+                    descripcion=descripcion,
+                    precio=Decimal(rng.randrange(1000, 15000)),
+                    stock=rng.randrange(0, 100),
+                    categoria=categoria,
+                ))
+            with transaction.atomic():
+                Producto.objects.bulk_create(productos)
+        # bulk_create no dispara señales
+        indice_productos.invalidar()
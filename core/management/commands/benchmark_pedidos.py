@@ -0,0 +1,184 @@
+import json
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.fechas import rango_dia
+from core.models import MetodoPago, Pedido, Repartidor, Usuario
+from core.semillas import sin_auto_now_add
+
+PREFIJO = 'BENCH'
+ESTADOS = ['pendiente', 'confirmado', 'en_preparacion', 'listo', 'en_camino', 'entregado', 'cancelado']
+PESOS_ESTADOS = [3, 3, 3, 3, 3, 80, 5]
+
+
+class Command(BaseCommand):
+    help = (
+        'Siembra pedidos de prueba y mide las consultas de las vistas más usadas '
+        '(repartidor, lista de pedidos admin, mis pedidos, dashboard) con y sin los índices de Pedido.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pedidos', type=int, default=1_000_000, help='Cantidad de pedidos a sembrar.')
+        parser.add_argument('--dias', type=int, default=180, help='Días de historial sobre los que repartir los pedidos.')
+        parser.add_argument('--clientes', type=int, default=5000)
+        parser.add_argument('--repartidores', type=int, default=50)
+        parser.add_argument('--lote', type=int, default=5000, help='Tamaño de lote para bulk_create.')
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['semilla'])
+        self._sembrar(options)
+
+        repartidor = Repartidor.objects.filter(usuario__username__startswith=PREFIJO).order_by('pk').first()
+        cliente = Usuario.objects.filter(username__startswith=f'{PREFIJO}_cliente').order_by('pk').first()
+        consultas = self._consultas(repartidor, cliente)
+
+        resultados = {'pedidos': Pedido.objects.count(), 'motor': connection.vendor, 'consultas': {}}
+        with self._indices_quitados():
+            self.stdout.write('Midiendo sin índices...')
+            for nombre, consulta in consultas.items():
+                resultados['consultas'][nombre] = {'sin_indices_ms': self._medir(consulta, options['repeticiones'])}
+        self.stdout.write('Midiendo con índices...')
+        for nombre, consulta in consultas.items():
+            resultados['consultas'][nombre]['con_indices_ms'] = self._medir(consulta, options['repeticiones'])
+
+        self.stdout.write(f"\n{'Consulta':<48}{'Sin índices (ms)':>18}{'Con índices (ms)':>18}")
+        for nombre, tiempos in resultados['consultas'].items():
+            self.stdout.write(f"{nombre:<48}{tiempos['sin_indices_ms']:>18.2f}{tiempos['con_indices_ms']:>18.2f}")
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['salida']}"))
+
+    # --- Datos de prueba ---
+
+    def _sembrar(self, options):
+        existentes = Pedido.objects.filter(numero_pedido__startswith=PREFIJO).count()
+        faltantes = options['pedidos'] - existentes
+        if faltantes <= 0:
+            self.stdout.write(f'Ya existen {existentes} pedidos de benchmark, no se siembran más.')
+            return
+
+        metodo_pago, _ = MetodoPago.objects.get_or_create(nombre='Efectivo', defaults={'tipo': 'efectivo'})
+
+        Usuario.objects.bulk_create([
+            Usuario(username=f'{PREFIJO}_cliente{i}', rol='cliente')
+            for i in range(options['clientes'])
+        ], ignore_conflicts=True)
+        Usuario.objects.bulk_create([
+            Usuario(username=f'{PREFIJO}_repartidor{i}', rol='repartidor')
+            for i in range(options['repartidores'])
+        ], ignore_conflicts=True)
+        sin_perfil = Usuario.objects.filter(
+            username__startswith=f'{PREFIJO}_repartidor', perfil_repartidor__isnull=True
+        )
+        Repartidor.objects.bulk_create([Repartidor(usuario=usuario) for usuario in sin_perfil])
+
+        clientes = list(Usuario.objects.filter(username__startswith=f'{PREFIJO}_cliente').values_list('pk', flat=True))
+        repartidores = list(Repartidor.objects.filter(usuario__username__startswith=PREFIJO).values_list('pk', flat=True))
+        ahora = timezone.now()
+        segundos_historial = options['dias'] * 24 * 3600
+
+        self.stdout.write(f'Sembrando {faltantes} pedidos...')
+        inicio = time.perf_counter()
+        with sin_auto_now_add(Pedido, 'fecha_creacion'):
+            for desde in range(existentes, options['pedidos'], options['lote']):
+                hasta = min(desde + options['lote'], options['pedidos'])
+                lote = []
+                for i in range(desde, hasta):
+                    creado = ahora - timedelta(seconds=self.rng.randrange(segundos_historial))
+                    estado = self.rng.choices(ESTADOS, PESOS_ESTADOS)[0]
+                    total = Decimal(self.rng.randrange(3000, 40000)) / 100
+                    lote.append(Pedido(
+                        numero_pedido=f'{PREFIJO}{i:010d}',
+                        cliente_id=self.rng.choice(clientes),
+                        repartidor_id=self.rng.choice(repartidores),
+                        metodo_pago=metodo_pago,
+                        tipo_orden='delivery',
+                        estado=estado,
+                        subtotal=total,
+                        total=total,
+                        fecha_creacion=creado,
+                        fecha_entrega=creado + timedelta(minutes=40) if estado == 'entregado' else None,
+                    ))
+                with transaction.atomic():
+                    Pedido.objects.bulk_create(lote)
+                self.stdout.write(f'  {hasta}/{options["pedidos"]}', ending='\r')
+        self.stdout.write(f'\nSiembra terminada en {time.perf_counter() - inicio:.1f}s')
+        self.stdout.write('Los pedidos se insertaron con bulk_create: ejecuta `reconstruir_resumenes` para el dashboard.')
+
+    # --- Consultas medidas ---
+
+    def _consultas(self, repartidor, cliente):
+        inicio_hoy, fin_hoy = rango_dia()
+        hoy = timezone.localdate()
+        activos = ['confirmado', 'en_preparacion', 'listo', 'en_camino']
+
+        return {
+            'repartidor: pedidos asignados': lambda: list(
+                Pedido.objects.filter(repartidor=repartidor, estado__in=activos).order_by('estado', 'fecha_creacion')
+            ),
+            'repartidor: entregados hoy (__date)': lambda: Pedido.objects.filter(
+                repartidor=repartidor, estado='entregado', fecha_entrega__date=hoy
+            ).count(),
+            'repartidor: entregados hoy (rango)': lambda: Pedido.objects.filter(
+                repartidor=repartidor, estado='entregado', fecha_entrega__gte=inicio_hoy, fecha_entrega__lt=fin_hoy
+            ).count(),
+            'admin lista: filtro por estado': lambda: list(
+                Pedido.objects.filter(estado='pendiente').select_related('cliente').order_by('-fecha_creacion')[:50]
+            ),
+            'admin lista: sin filtro': lambda: list(
+                Pedido.objects.select_related('cliente').order_by('-fecha_creacion')[:50]
+            ),
+            'mis pedidos': lambda: list(
+                Pedido.objects.filter(cliente=cliente).order_by('-fecha_creacion')
+            ),
+            'dashboard: ventas hoy (__date)': lambda: Pedido.objects.filter(
+                fecha_creacion__date=hoy, estado__in=activos + ['entregado']
+            ).aggregate(total=Sum('total')),
+            'dashboard: ventas hoy (rango)': lambda: Pedido.objects.filter(
+                fecha_creacion__gte=inicio_hoy, fecha_creacion__lt=fin_hoy, estado__in=activos + ['entregado']
+            ).aggregate(total=Sum('total')),
+        }
+
+    def _medir(self, consulta, repeticiones):
+        consulta()  # calentar caché de la BD
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            consulta()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return statistics.median(tiempos)
+
+    @contextmanager
+    def _indices_quitados(self):
+        """Quita temporalmente los índices de Pedido.Meta.indexes que existan en la BD."""
+        with connection.cursor() as cursor:
+            existentes = connection.introspection.get_constraints(cursor, Pedido._meta.db_table)
+        indices = [indice for indice in Pedido._meta.indexes if indice.name in existentes]
+        if not indices:
+            self.stdout.write(self.style.WARNING(
+                'Los índices de Pedido no existen en la BD (¿faltan migraciones?); ambas mediciones serán sin índices.'
+            ))
+
+        with connection.schema_editor() as editor:
+            for indice in indices:
+                editor.remove_index(Pedido, indice)
+        try:
+            yield
+        finally:
+            with connection.schema_editor() as editor:
+                for indice in indices:
+                    editor.add_index(Pedido, indice)
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.despacho import despachar
+
+
+class Command(BaseCommand):
+    help = (
+        'Asigna repartidores a los pedidos delivery confirmados o listos que no tienen, según carga, '
+        'distancia y calificación (ver core/despacho.py).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cada', type=float, default=0,
+                            help='Repetir cada N segundos (por defecto, una sola pasada).')
+        parser.add_argument('--limite', type=int, default=500, help='Máximo de pedidos por pasada.')
+
+    def handle(self, *args, **options):
+        while True:
+            inicio = time.perf_counter()
+            asignados = despachar(options['limite'])
+            total = sum(len(pedidos) for pedidos in asignados.values())
+            self.stdout.write(
+                f'{total} pedidos asignados a {len(asignados)} repartidores '
+                f'en {(time.perf_counter() - inicio) * 1000:.1f} ms'
+            )
+            if not options['cada']:
+                break
+            time.sleep(options['cada'])
@@ -0,0 +1,316 @@
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from decimal import Decimal
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from core import views
+from core.models import (
+    Carrito, Categoria, DetallePedido, MetodoPago, Pedido, Producto, Repartidor, Usuario,
+)
+from core.numeracion import asignar_numeros
+
+PREFIJO = 'CARGA'
+ESTADOS_REPARTO = ['en_preparacion', 'listo', 'en_camino']
+BUSQUEDAS = ['', 'hamburguesa', 'pizza', 'papas', 'bebida', 'completo', 'queso']
+
+
+class SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    """Mide cada request por separado: un 302 cuenta como respuesta, no se sigue."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class UsuarioVirtual:
+    """Un usuario simulado con su propia sesión y token CSRF."""
+
+    def __init__(self, base, usuario, csrf, registrar):
+        self.base = base.rstrip('/')
+        self.usuario = usuario
+        self.csrf = csrf
+        self.registrar = registrar
+        # Solo hacen falta la sesión y el CSRF, que no cambian durante la prueba
+        self.cookies = f'{settings.SESSION_COOKIE_NAME}={usuario["sesion"]}; {settings.CSRF_COOKIE_NAME}={csrf}'
+        self.abridor = urllib.request.build_opener(SinRedirecciones)
+
+    def pedir(self, endpoint, ruta, datos=None):
+        """Hace el request, registra su latencia y devuelve el cuerpo (o None si falló)."""
+        cabeceras = {'Cookie': self.cookies, 'X-CSRFToken': self.csrf, 'Referer': self.base + '/'}
+        cuerpo = urllib.parse.urlencode(datos).encode() if datos is not None else None
+        request = urllib.request.Request(self.base + ruta, data=cuerpo, headers=cabeceras)
+
+        inicio = time.perf_counter()
+        try:
+            with self.abridor.open(request, timeout=30) as respuesta:
+                contenido = respuesta.read()
+                status = respuesta.status
+        except urllib.error.HTTPError as e:
+            contenido, status = e.read(), e.code
+        except (urllib.error.URLError, OSError) as e:
+            self.registrar(endpoint, (time.perf_counter() - inicio) * 1000, f'error: {e}')
+            return None
+        self.registrar(endpoint, (time.perf_counter() - inicio) * 1000, status)
+        return contenido if status < 400 else None
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga tipo "hora de almuerzo" contra un servidor local (p. ej. runserver): '
+        'clientes navegan y arman el carrito, cajeros venden en el POS, repartidores actualizan '
+        'pedidos y el admin refresca el dashboard. Reporta throughput, p50/p95/p99 y errores por '
+        'endpoint, y puede guardar o comparar contra una línea base. Usa la misma BD que el servidor.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='URL base del servidor.')
+        parser.add_argument('--duracion', type=int, default=60, help='Segundos de carga.')
+        parser.add_argument('--clientes', type=int, default=20)
+        parser.add_argument('--cajeros', type=int, default=3)
+        parser.add_argument('--repartidores', type=int, default=5)
+        parser.add_argument('--admins', type=int, default=1)
+        parser.add_argument('--pausa', type=int, default=500,
+                            help='Pausa media entre acciones de un usuario, en ms (tiempo de "pensar").')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--guardar-base', help='Guardar los resultados como línea base en este JSON.')
+        parser.add_argument('--comparar', help='Comparar contra una línea base guardada antes.')
+        parser.add_argument('--limpiar', action='store_true', help='Borrar los datos de la prueba al terminar.')
+
+    def handle(self, *args, **options):
+        self.rutas = self._rutas()
+        cuentas = self._preparar(options)
+        csrf = get_random_string(32)
+
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(int)
+        self.ejemplos_error = {}
+        self._lock = threading.Lock()
+        fin = time.monotonic() + options['duracion']
+
+        guiones = {
+            'cliente': self._guion_cliente,
+            'cajero': self._guion_cajero,
+            'repartidor': self._guion_repartidor,
+            'administrador': self._guion_admin,
+        }
+        hilos = []
+        for i, cuenta in enumerate(cuentas):
+            virtual = UsuarioVirtual(options['url'], cuenta, csrf, self._registrar)
+            rng = random.Random(options['semilla'] + i)
+            hilos.append(threading.Thread(
+                target=self._correr, args=(guiones[cuenta['rol']], virtual, rng, fin, options['pausa']), daemon=True,
+            ))
+
+        self.stdout.write(f'{len(hilos)} usuarios virtuales durante {options["duracion"]}s contra {options["url"]}...')
+        inicio = time.monotonic()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.monotonic() - inicio
+
+        resultados = self._resultados(duracion)
+        self._reportar(resultados, options.get('comparar'))
+        if options.get('guardar_base'):
+            with open(options['guardar_base'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f'Línea base guardada en {options["guardar_base"]}')
+        if options['limpiar']:
+            self._limpiar()
+
+    # --- Preparación ---
+
+    def _rutas(self):
+        nombres = [
+            'home', 'catalogo_productos_view', 'ver_carrito_view', 'carrito_agregar_json_view',
+            'carrito_cantidad_json_view', 'pos_view', 'repartidor_pedidos_view', 'admin_dashboard_view',
+            'admin_pedidos_lista_view',
+        ]
+        try:
+            return {nombre: reverse(getattr(views, nombre)) for nombre in nombres}
+        except Exception as e:
+            raise CommandError(f'No se pudieron resolver las URLs de las vistas: {e}')
+
+    def _sesion(self, usuario):
+        """Crea una sesión autenticada en la BD (como Client.force_login) y devuelve su clave."""
+        sesion = import_module(settings.SESSION_ENGINE).SessionStore()
+        sesion[SESSION_KEY] = str(usuario.pk)
+        sesion[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        sesion[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        sesion.create()
+        return sesion.session_key
+
+    def _preparar(self, options):
+        """Usuarios de carga por rol, productos con stock de sobra y pedidos asignados a los repartidores."""
+        categoria, _ = Categoria.objects.get_or_create(nombre=f'{PREFIJO} categoría')
+        existentes = set(Producto.objects.filter(nombre__startswith=PREFIJO).values_list('nombre', flat=True))
+        Producto.objects.bulk_create([
+            Producto(nombre=nombre, precio=Decimal(1000 + i * 250), stock=1_000_000, categoria=categoria)
+            for i, nombre in enumerate(f'{PREFIJO} producto {i}' for i in range(20)) if nombre not in existentes
+        ])
+        Producto.objects.filter(nombre__startswith=PREFIJO).update(stock=1_000_000, activo=True)
+        self.productos = list(Producto.objects.filter(nombre__startswith=PREFIJO).values('id', 'precio'))
+        MetodoPago.objects.get_or_create(nombre='Efectivo', defaults={'tipo': 'efectivo'})
+
+        cuentas = []
+        for rol, cantidad in (('cliente', options['clientes']), ('cajero', options['cajeros']),
+                              ('repartidor', options['repartidores']), ('administrador', options['admins'])):
+            for i in range(cantidad):
+                usuario, creado = Usuario.objects.get_or_create(
+                    username=f'{PREFIJO}_{rol}_{i}', defaults={'rol': rol, 'direccion': 'Av. Carga 123'}
+                )
+                cuenta = {'rol': rol, 'sesion': self._sesion(usuario), 'pedidos': []}
+                if rol == 'cliente':
+                    carrito, _ = Carrito.objects.get_or_create(usuario=usuario)
+                    carrito.vaciar()
+                elif rol == 'repartidor':
+                    perfil, _ = Repartidor.objects.get_or_create(usuario=usuario)
+                    cuenta['pedidos'] = self._pedidos_repartidor(usuario, perfil)
+                cuentas.append(cuenta)
+        return cuentas
+
+    def _pedidos_repartidor(self, usuario, perfil, cantidad=10):
+        pedidos = list(Pedido.objects.filter(repartidor=perfil, estado__in=ESTADOS_REPARTO).values_list('pk', flat=True))
+        faltantes = cantidad - len(pedidos)
+        if faltantes > 0:
+            pago = MetodoPago.objects.get(nombre='Efectivo')
+            nuevos = Pedido.objects.bulk_create(asignar_numeros([
+                Pedido(cliente=usuario, repartidor=perfil, metodo_pago=pago, tipo_orden='delivery',
+                       estado='en_preparacion', subtotal=Decimal('1000'), total=Decimal('1000'),
+                       direccion_entrega='Av. Carga 123')
+                for _ in range(faltantes)
+            ]))
+            DetallePedido.objects.bulk_create([
+                DetallePedido(pedido=pedido, producto_id=self.productos[0]['id'], cantidad=1,
+                              precio_unitario=self.productos[0]['precio'], subtotal=self.productos[0]['precio'])
+                for pedido in nuevos
+            ])
+            pedidos += [pedido.pk for pedido in nuevos]
+        return pedidos
+
+    def _limpiar(self):
+        # Pedidos de los usuarios de carga y ventas del POS (llevan PREFIJO como referencia)
+        pedidos = Pedido.objects.filter(
+            models.Q(cliente__username__startswith=f'{PREFIJO}_') | models.Q(nombre_referencia_cliente=PREFIJO)
+        )
+        DetallePedido.objects.filter(pedido__in=pedidos).delete()
+        pedidos.delete()
+        Usuario.objects.filter(username__startswith=f'{PREFIJO}_').delete()
+        Producto.objects.filter(nombre__startswith=PREFIJO).delete()
+        Categoria.objects.filter(nombre__startswith=PREFIJO).delete()
+        # Los pedidos borrados seguían sumados en el resumen del día
+        call_command('reconstruir_resumenes', desde=timezone.localdate().isoformat(), stdout=self.stdout)
+
+    # --- Guiones por rol ---
+
+    def _correr(self, guion, virtual, rng, fin, pausa):
+        while time.monotonic() < fin:
+            guion(virtual, rng)
+            time.sleep(rng.expovariate(1000 / pausa) if pausa else 0)
+
+    def _guion_cliente(self, virtual, rng):
+        """Navega el catálogo, agrega al carrito, lo revisa y a veces quita una línea."""
+        busqueda = rng.choice(BUSQUEDAS)
+        parametros = '?' + urllib.parse.urlencode({'q': busqueda} if busqueda else {'ver_todo': 1})
+        virtual.pedir('catálogo', self.rutas['catalogo_productos_view'] + parametros)
+        if rng.random() < 0.3:
+            virtual.pedir('home', self.rutas['home'])
+
+        producto = rng.choice(self.productos)
+        cuerpo = virtual.pedir('carrito: agregar', self.rutas['carrito_agregar_json_view'],
+                               datos={'product_id': producto['id'], 'cantidad': rng.randint(1, 2)})
+        if rng.random() < 0.5:
+            virtual.pedir('carrito: ver', self.rutas['ver_carrito_view'])
+        if cuerpo and rng.random() < 0.4:
+            item = json.loads(cuerpo).get('item') or {}
+            if item.get('id'):
+                virtual.pedir('carrito: cantidad', self.rutas['carrito_cantidad_json_view'],
+                              datos={'item_id': item['id'], 'cantidad': 0})
+
+    def _guion_cajero(self, virtual, rng):
+        """Abre el POS y registra una venta de 1 a 4 productos."""
+        virtual.pedir('pos: ver', self.rutas['pos_view'])
+        lineas = rng.sample(self.productos, rng.randint(1, 4))
+        items = [{'id': p['id'], 'cantidad': rng.randint(1, 3)} for p in lineas]
+        total = sum(Decimal(p['precio']) * item['cantidad'] for p, item in zip(lineas, items))
+        virtual.pedir('pos: venta', self.rutas['pos_view'], datos={
+            'items': json.dumps(items), 'total': str(total), 'metodo_pago': 'Efectivo',
+            'nombre_referencia': PREFIJO,
+        })
+
+    def _guion_repartidor(self, virtual, rng):
+        """Revisa sus pedidos y avanza el estado de uno."""
+        virtual.pedir('repartidor: ver', self.rutas['repartidor_pedidos_view'])
+        if virtual.usuario['pedidos']:
+            virtual.pedir('repartidor: estado', self.rutas['repartidor_pedidos_view'], datos={
+                'pedido_id': rng.choice(virtual.usuario['pedidos']),
+                'nuevo_estado': rng.choice(ESTADOS_REPARTO),
+            })
+
+    def _guion_admin(self, virtual, rng):
+        """Refresca el dashboard y la lista de pedidos."""
+        virtual.pedir('admin: dashboard', self.rutas['admin_dashboard_view'] + '?dias=' + str(rng.choice([7, 30])))
+        virtual.pedir('admin: pedidos', self.rutas['admin_pedidos_lista_view'])
+
+    # --- Resultados ---
+
+    def _registrar(self, endpoint, milisegundos, status):
+        with self._lock:
+            self.latencias[endpoint].append(milisegundos)
+            if not isinstance(status, int) or status >= 400:
+                self.errores[endpoint] += 1
+                self.ejemplos_error.setdefault(endpoint, str(status))
+
+    def _resultados(self, duracion):
+        resultados = {'duracion_s': round(duracion, 1), 'endpoints': {}}
+        total = 0
+        for endpoint, tiempos in sorted(self.latencias.items()):
+            total += len(tiempos)
+            cortes = statistics.quantiles(tiempos, n=100, method='inclusive') if len(tiempos) > 1 else tiempos * 99
+            resultados['endpoints'][endpoint] = {
+                'requests': len(tiempos),
+                'rps': round(len(tiempos) / duracion, 2),
+                'p50_ms': round(cortes[49], 1),
+                'p95_ms': round(cortes[94], 1),
+                'p99_ms': round(cortes[98], 1),
+                'errores': self.errores[endpoint],
+                'tasa_error': round(self.errores[endpoint] / len(tiempos), 4),
+            }
+        resultados['rps_total'] = round(total / duracion, 2)
+        return resultados
+
+    def _reportar(self, resultados, comparar=None):
+        base = {}
+        if comparar:
+            with open(comparar, encoding='utf-8') as archivo:
+                base = json.load(archivo).get('endpoints', {})
+
+        self.stdout.write(f"\n{'Endpoint':<22}{'req':>7}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'errores':>9}"
+                          + (f"{'Δp95 vs base':>15}" if base else ''))
+        for endpoint, datos in resultados['endpoints'].items():
+            linea = (f"{endpoint:<22}{datos['requests']:>7}{datos['rps']:>8}{datos['p50_ms']:>9}"
+                     f"{datos['p95_ms']:>9}{datos['p99_ms']:>9}{datos['errores']:>9}")
+            if endpoint in base and base[endpoint]['p95_ms']:
+                cambio = (datos['p95_ms'] - base[endpoint]['p95_ms']) / base[endpoint]['p95_ms'] * 100
+                texto = f'{cambio:+.0f}%'
+                estilo = self.style.ERROR if cambio > 20 else self.style.SUCCESS if cambio < -5 else str
+                linea += estilo(f'{texto:>15}')
+            self.stdout.write(linea)
+        self.stdout.write(f"\nTotal: {resultados['rps_total']} req/s en {resultados['duracion_s']}s (latencias en ms)")
+        for endpoint, ejemplo in sorted(self.ejemplos_error.items()):
+            self.stdout.write(self.style.WARNING(f'  {endpoint}: primer error {ejemplo}'))
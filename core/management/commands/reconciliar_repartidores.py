@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.contadores import reconciliar
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula los contadores de carga de los repartidores (pedidos activos, en camino y '
+        'entregas de hoy) desde los pedidos y corrige los que estén desfasados.'
+    )
+
+    def handle(self, *args, **options):
+        corregidos = reconciliar()
+        self.stdout.write(self.style.SUCCESS(f'Repartidores corregidos: {corregidos}.'))
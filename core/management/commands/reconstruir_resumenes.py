@@ -0,0 +1,96 @@
+from datetime import datetime
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from core.fechas import inicio_del_dia
+from core.models import DetallePedido, Pedido, ResumenProductoDiario, ResumenVentaDiaria
+
+
+def _en_lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while True:
+        lote = list(islice(iterador, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los resúmenes diarios de ventas a partir de Pedido y DetallePedido.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Reconstruir solo desde esta fecha (AAAA-MM-DD). Por defecto, todo el historial.')
+        parser.add_argument('--lote', type=int, default=1000, help='Tamaño de lote para bulk_create.')
+
+    def handle(self, *args, **options):
+        desde = options['desde']
+        lote = options['lote']
+
+        pedidos = Pedido.objects.all()
+        detalles = DetallePedido.objects.all()
+        resumenes_venta = ResumenVentaDiaria.objects.all()
+        resumenes_producto = ResumenProductoDiario.objects.all()
+
+        if desde:
+            try:
+                fecha_desde = datetime.strptime(desde, '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('La fecha --desde debe tener el formato AAAA-MM-DD.')
+            inicio = inicio_del_dia(fecha_desde)
+            pedidos = pedidos.filter(fecha_creacion__gte=inicio)
+            detalles = detalles.filter(pedido__fecha_creacion__gte=inicio)
+            resumenes_venta = resumenes_venta.filter(fecha__gte=fecha_desde)
+            resumenes_producto = resumenes_producto.filter(fecha__gte=fecha_desde)
+
+        # La agregación se hace en la BD: solo viajan filas (día, estado[, producto])
+        filas_venta = (
+            pedidos.annotate(dia=TruncDate('fecha_creacion'))
+            .values('dia', 'estado')
+            .annotate(cantidad=Count('id'), monto=Sum('total'))
+            .order_by()
+        )
+        filas_producto = (
+            detalles.annotate(dia=TruncDate('pedido__fecha_creacion'))
+            .values('dia', 'producto_id', 'pedido__estado')
+            .annotate(cantidad_total=Sum('cantidad'), monto=Sum('subtotal'))
+            .order_by()
+        )
+
+        with transaction.atomic():
+            resumenes_venta.delete()
+            resumenes_producto.delete()
+
+            total_venta = 0
+            for grupo in _en_lotes(filas_venta.iterator(), lote):
+                ResumenVentaDiaria.objects.bulk_create([
+                    ResumenVentaDiaria(
+                        fecha=fila['dia'],
+                        estado=fila['estado'],
+                        cantidad_pedidos=fila['cantidad'],
+                        total=fila['monto'] or 0,
+                    )
+                    for fila in grupo
+                ])
+                total_venta += len(grupo)
+
+            total_producto = 0
+            for grupo in _en_lotes(filas_producto.iterator(), lote):
+                ResumenProductoDiario.objects.bulk_create([
+                    ResumenProductoDiario(
+                        fecha=fila['dia'],
+                        producto_id=fila['producto_id'],
+                        estado=fila['pedido__estado'],
+                        cantidad=fila['cantidad_total'],
+                        total=fila['monto'] or 0,
+                    )
+                    for fila in grupo
+                ])
+                total_producto += len(grupo)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Resúmenes reconstruidos: {total_venta} filas por día/estado, {total_producto} filas por producto.'
+        ))
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from core.busqueda import indice_clientes, indice_productos
+from core.cache_catalogo import invalidar_catalogo
+from core.models import Usuario
+from core.semillas import PREFIJO, Sembrador, borrar_datos_sembrados
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera datos realistas en volumen (usuarios de cada rol, catálogo, pedidos con sus líneas y '
+        'reclamos) con bulk_create por lotes. Con la misma semilla se generan los mismos datos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=5000)
+        parser.add_argument('--cajeros', type=int, default=5)
+        parser.add_argument('--administradores', type=int, default=2)
+        parser.add_argument('--repartidores', type=int, default=50)
+        parser.add_argument('--productos', type=int, default=200)
+        parser.add_argument('--pedidos', type=int, default=100_000)
+        parser.add_argument('--dias', type=int, default=180, help='Días de historial de pedidos.')
+        parser.add_argument('--tasa-reclamos', type=float, default=0.01,
+                            help='Fracción de pedidos entregados con reclamo.')
+        parser.add_argument('--lote', type=int, default=5000, help='Tamaño de lote para bulk_create.')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--password', default='cosmofood123', help='Contraseña de todos los usuarios generados.')
+        parser.add_argument('--borrar', action='store_true', help='Borrar antes los datos sembrados previamente.')
+
+    def handle(self, *args, **options):
+        if options['borrar']:
+            self.stdout.write('Borrando datos sembrados anteriormente...')
+            borrar_datos_sembrados()
+        elif Usuario.objects.filter(username__startswith=f'{PREFIJO}_').exists():
+            raise CommandError('Ya hay datos sembrados; usa --borrar para regenerarlos.')
+        if options['clientes'] < 1 or options['productos'] < 1:
+            raise CommandError('Se necesita al menos un cliente y un producto.')
+
+        sembrador = Sembrador(options['semilla'], options['lote'], options['password'], stdout=self.stdout)
+        inicio = time.perf_counter()
+
+        clientes = sembrador.usuarios('cliente', options['clientes'])
+        sembrador.usuarios('cajero', options['cajeros'])
+        sembrador.usuarios('administrador', options['administradores'])
+        repartidores = sembrador.usuarios('repartidor', options['repartidores'])
+        productos = sembrador.catalogo(options['productos'])
+        self.stdout.write(f'Usuarios y catálogo listos en {time.perf_counter() - inicio:.1f}s')
+
+        sembrador.pedidos(
+            options['pedidos'], options['dias'], clientes, repartidores, productos, options['tasa_reclamos'],
+        )
+        self.stdout.write(f'Pedidos listos en {time.perf_counter() - inicio:.1f}s')
+
+        # bulk_create no pasa por save() ni por las señales
+        call_command('reconstruir_resumenes', stdout=self.stdout)
+        call_command('reconciliar_repartidores', stdout=self.stdout)
+        invalidar_catalogo()
+        indice_productos.invalidar()
+        indice_clientes.invalidar()
+        self.stdout.write(self.style.SUCCESS(
+            f'Siembra terminada en {time.perf_counter() - inicio:.1f}s. '
+            f'Usuarios {PREFIJO}_<rol>_<n>, contraseña "{options["password"]}".'
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Repartidor
+from core.semillas import sembrar_pedidos_demo
+
+
+class Command(BaseCommand):
+    help = (
+        'Crea pedidos de ejemplo para los repartidores que no tienen ninguno, para que su panel '
+        'muestre datos en desarrollo. Es idempotente: se puede correr varias veces.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Repartidores a sembrar (por defecto, todos).')
+
+    def handle(self, *args, **options):
+        repartidores = Repartidor.objects.all()
+        if options['usernames']:
+            repartidores = repartidores.filter(usuario__username__in=options['usernames'])
+            encontrados = set(repartidores.values_list('usuario__username', flat=True))
+            faltantes = sorted(set(options['usernames']) - encontrados)
+            if faltantes:
+                raise CommandError(f'No son repartidores: {", ".join(faltantes)}')
+
+        creados = sembrar_pedidos_demo(repartidores)
+        self.stdout.write(self.style.SUCCESS(f'Pedidos de ejemplo creados: {creados}.'))
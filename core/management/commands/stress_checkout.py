@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.models import Carrito, Categoria, DetallePedido, ItemCarrito, MetodoPago, Pedido, Producto, Usuario
+from core.ventas import StockInsuficiente, confirmar_carrito
+
+PREFIJO = 'STRESS'
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de estrés del checkout: muchos hilos confirman a la vez carritos con el mismo '
+        'producto y se verifica que no se venda más stock del que hay. Requiere una BD en '
+        'archivo (SQLite) o un Postgres local, no una BD en memoria.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=20, help='Checkouts concurrentes.')
+        parser.add_argument('--stock', type=int, default=50, help='Stock inicial del producto disputado.')
+        parser.add_argument('--cantidad', type=int, default=3, help='Unidades del producto en cada carrito.')
+        parser.add_argument('--conservar', action='store_true', help='No borrar los datos de la prueba al terminar.')
+
+    def handle(self, *args, **options):
+        nombre_bd = str(connection.settings_dict.get('NAME') or '')
+        if connection.vendor == 'sqlite' and (not nombre_bd or ':memory:' in nombre_bd or 'mode=memory' in nombre_bd):
+            raise CommandError('La prueba necesita una BD en archivo o un servidor; una BD en memoria no se comparte entre hilos.')
+
+        hilos, stock, cantidad = options['hilos'], options['stock'], options['cantidad']
+        self._limpiar()
+        producto, carritos, metodo_pago = self._preparar(hilos, stock, cantidad)
+
+        resultados = Counter()
+        errores = []
+        lock = threading.Lock()
+        barrera = threading.Barrier(hilos)
+
+        def anotar(clave, error=None):
+            with lock:
+                resultados[clave] += 1
+                if error:
+                    errores.append(error)
+
+        def comprar(carrito_id):
+            try:
+                carrito = Carrito.objects.select_related('usuario').get(pk=carrito_id)
+                barrera.wait()  # todos los hilos parten a la vez
+                confirmar_carrito(carrito, metodo_pago, tipo_orden='retiro')
+                anotar('exitosos')
+            except StockInsuficiente:
+                anotar('sin_stock')
+            except OperationalError as e:
+                # En SQLite, una escritura concurrente puede fallar con "database is locked"
+                anotar('bloqueo_bd', str(e))
+            except Exception as e:  # noqa: BLE001 - se reporta cualquier otro error
+                anotar('otros_errores', repr(e))
+            finally:
+                connections.close_all()
+
+        inicio = time.perf_counter()
+        trabajadores = [threading.Thread(target=comprar, args=(carrito.pk,)) for carrito in carritos]
+        for hilo in trabajadores:
+            hilo.start()
+        for hilo in trabajadores:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        producto.refresh_from_db()
+        pedidos = Pedido.objects.filter(cliente__username__startswith=PREFIJO)
+        vendido = DetallePedido.objects.filter(pedido__in=pedidos, producto=producto).aggregate(total=Sum('cantidad'))['total'] or 0
+        carritos_vaciados = Carrito.objects.filter(pk__in=[c.pk for c in carritos], items__isnull=True).count()
+
+        self.stdout.write(f'Motor: {connection.vendor}  Hilos: {hilos}  Stock inicial: {stock}  Unidades por carrito: {cantidad}')
+        self.stdout.write(f'Duración: {duracion:.2f}s')
+        for clave in ('exitosos', 'sin_stock', 'bloqueo_bd', 'otros_errores'):
+            self.stdout.write(f'  {clave}: {resultados[clave]}')
+        self.stdout.write(f'Pedidos creados: {pedidos.count()}  Unidades vendidas: {vendido}  Stock final: {producto.stock}')
+        self.stdout.write(f'Carritos vaciados: {carritos_vaciados}')
+        for error in errores[:5]:
+            self.stdout.write(f'  error: {error}')
+
+        problemas = []
+        if producto.stock < 0:
+            problemas.append('el stock quedó negativo')
+        if producto.stock + vendido != stock:
+            problemas.append('el stock final no cuadra con las unidades vendidas')
+        if vendido != resultados['exitosos'] * cantidad:
+            problemas.append('las unidades vendidas no cuadran con los checkouts exitosos')
+        if carritos_vaciados != resultados['exitosos']:
+            problemas.append('hay carritos de checkouts exitosos que no se vaciaron')
+
+        if not options['conservar']:
+            self._limpiar()
+
+        if problemas:
+            raise CommandError('Inconsistencias: ' + '; '.join(problemas))
+        self.stdout.write(self.style.SUCCESS('Sin sobreventa: stock y pedidos son consistentes.'))
+
+    def _preparar(self, hilos, stock, cantidad):
+        categoria, _ = Categoria.objects.get_or_create(nombre=f'{PREFIJO} categoría')
+        producto = Producto.objects.create(
+            nombre=f'{PREFIJO} producto disputado', precio=Decimal('1000'), stock=stock, categoria=categoria
+        )
+        metodo_pago, _ = MetodoPago.objects.get_or_create(nombre='Efectivo', defaults={'tipo': 'efectivo'})
+
+        Usuario.objects.bulk_create([Usuario(username=f'{PREFIJO}_{i}', rol='cliente') for i in range(hilos)])
+        usuarios = Usuario.objects.filter(username__startswith=f'{PREFIJO}_')
+        Carrito.objects.bulk_create([Carrito(usuario=usuario) for usuario in usuarios])
+        carritos = list(Carrito.objects.filter(usuario__username__startswith=f'{PREFIJO}_'))
+        ItemCarrito.objects.bulk_create([
+            ItemCarrito(carrito=carrito, producto=producto, cantidad=cantidad) for carrito in carritos
+        ])
+        return producto, carritos, metodo_pago
+
+    def _limpiar(self):
+        pedidos = Pedido.objects.filter(cliente__username__startswith=PREFIJO)
+        habia_pedidos = pedidos.exists()
+        DetallePedido.objects.filter(pedido__in=pedidos).delete()
+        pedidos.delete()
+        Usuario.objects.filter(username__startswith=PREFIJO).delete()
+        Producto.objects.filter(nombre__startswith=PREFIJO).delete()
+        Categoria.objects.filter(nombre__startswith=PREFIJO).delete()
+        if habia_pedidos:
+            # Los pedidos borrados seguían sumados en el resumen del día
+            call_command('reconstruir_resumenes', desde=timezone.localdate().isoformat(), stdout=self.stdout)
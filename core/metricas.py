@@ -0,0 +1,109 @@
+"""
+Métricas de rendimiento por vista, acumuladas en memoria del proceso.
+
+InstrumentacionMiddleware (core/middleware.py) registra por cada request la
+cantidad de consultas SQL, el tiempo en SQL, el tiempo de render de
+plantillas y el tiempo total de la vista. Aquí se agregan en histogramas de
+cubetas fijas (memoria constante por vista) que se consultan en
+`metricas_json_view`. Cada proceso tiene sus propias métricas; se pierden al
+reiniciar.
+"""
+
+import math
+import threading
+
+# Límites superiores de las cubetas
+CUBETAS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, math.inf)
+CUBETAS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, math.inf)
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.cubetas = [0] * len(limites)
+        self.cantidad = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, valor):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.cubetas[i] += 1
+                break
+        self.cantidad += 1
+        self.suma += valor
+        self.maximo = max(self.maximo, valor)
+
+    def percentil(self, p):
+        """Cota superior del percentil `p` (el límite de la cubeta donde cae)."""
+        if not self.cantidad:
+            return None
+        objetivo = math.ceil(self.cantidad * p / 100)
+        acumulado = 0
+        for limite, cantidad in zip(self.limites, self.cubetas):
+            acumulado += cantidad
+            if acumulado >= objetivo:
+                return round(self.maximo if math.isinf(limite) else min(limite, self.maximo), 2)
+        return round(self.maximo, 2)
+
+    def resumen(self):
+        return {
+            'cantidad': self.cantidad,
+            'promedio': round(self.suma / self.cantidad, 2) if self.cantidad else None,
+            'maximo': round(self.maximo, 2),
+            'p50': self.percentil(50),
+            'p95': self.percentil(95),
+            'p99': self.percentil(99),
+            'cubetas': {
+                ('inf' if math.isinf(limite) else str(limite)): cantidad
+                for limite, cantidad in zip(self.limites, self.cubetas)
+            },
+        }
+
+
+class MetricasVista:
+    def __init__(self):
+        self.consultas = Histograma(CUBETAS_CONSULTAS)
+        self.tiempo_sql = Histograma(CUBETAS_MS)
+        self.tiempo_plantillas = Histograma(CUBETAS_MS)
+        self.tiempo_total = Histograma(CUBETAS_MS)
+        self.presupuesto_excedido = 0
+
+    def resumen(self):
+        return {
+            'consultas': self.consultas.resumen(),
+            'tiempo_sql_ms': self.tiempo_sql.resumen(),
+            'tiempo_plantillas_ms': self.tiempo_plantillas.resumen(),
+            'tiempo_total_ms': self.tiempo_total.resumen(),
+            'presupuesto_excedido': self.presupuesto_excedido,
+        }
+
+
+_lock = threading.Lock()
+_por_vista = {}
+
+
+def registrar(vista, consultas, tiempo_sql, tiempo_plantillas, tiempo_total, excedido=False):
+    """Suma una medición (tiempos en ms) a los histogramas de la vista."""
+    with _lock:
+        metricas = _por_vista.get(vista)
+        if metricas is None:
+            metricas = _por_vista[vista] = MetricasVista()
+        metricas.consultas.registrar(consultas)
+        metricas.tiempo_sql.registrar(tiempo_sql)
+        metricas.tiempo_plantillas.registrar(tiempo_plantillas)
+        metricas.tiempo_total.registrar(tiempo_total)
+        if excedido:
+            metricas.presupuesto_excedido += 1
+
+
+def resumen():
+    """{vista: métricas}, ordenado de mayor a menor tiempo total acumulado."""
+    with _lock:
+        vistas = sorted(_por_vista.items(), key=lambda par: -par[1].tiempo_total.suma)
+        return {vista: metricas.resumen() for vista, metricas in vistas}
+
+
+def reiniciar():
+    with _lock:
+        _por_vista.clear()
@@ -0,0 +1,173 @@
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from . import metricas
+
+logger = logging.getLogger(__name__)
+
+# Milisegundos de render de plantillas acumulados en el request en curso
+_tiempo_plantillas = contextvars.ContextVar('tiempo_plantillas', default=None)
+
+# Template.render se envuelve solo mientras hay requests medidos en curso
+# (ver _plantillas_medidas); fuera de ellos queda el método original.
+_cerrojo_plantillas = threading.Lock()
+_requests_midiendo = 0
+_render_original = None
+
+# Medición del request async en curso. El ORM async corre las consultas en el
+# hilo de sync_to_async, que tiene su propia conexión, así que en vez de un
+# execute_wrapper por request cada conexión lleva uno fijo que suma aquí.
+_medicion_async = contextvars.ContextVar('medicion_async', default=None)
+
+
+class PresupuestoConsultasExcedido(Exception):
+    """Una vista hizo más consultas SQL que las permitidas en PRESUPUESTO_CONSULTAS."""
+
+
+def _render_medido(self, *args, **kwargs):
+    acumulado = _tiempo_plantillas.get()
+    if acumulado is None:
+        # Render de otro hilo o tarea que no se está midiendo
+        return _render_original(self, *args, **kwargs)
+    inicio = time.perf_counter()
+    try:
+        return _render_original(self, *args, **kwargs)
+    finally:
+        acumulado[0] += (time.perf_counter() - inicio) * 1000
+
+
+@contextmanager
+def _plantillas_medidas(acumulado):
+    """
+    Suma a `acumulado[0]` los milisegundos de render de plantillas del bloque.
+
+    Template.render del backend de Django se envuelve cuando empieza el primer
+    request medido y se restaura cuando termina el último, así fuera de los
+    requests (comandos, tests, otros procesos que importan el módulo) no
+    queda ningún método reemplazado.
+    """
+    global _requests_midiendo, _render_original
+    from django.template.backends.django import Template
+
+    with _cerrojo_plantillas:
+        if _requests_midiendo == 0:
+            _render_original = Template.render
+            Template.render = _render_medido
+        _requests_midiendo += 1
+    token = _tiempo_plantillas.set(acumulado)
+    try:
+        yield
+    finally:
+        _tiempo_plantillas.reset(token)
+        with _cerrojo_plantillas:
+            _requests_midiendo -= 1
+            if _requests_midiendo == 0:
+                Template.render = _render_original
+
+
+def _medir(medicion, execute, sql, params, many, context):
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion['consultas'] += 1
+        medicion['tiempo_sql'] += (time.perf_counter() - inicio) * 1000
+
+
+def _contar_consulta_async(execute, sql, params, many, context):
+    medicion = _medicion_async.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    return _medir(medicion, execute, sql, params, many, context)
+
+
+def _instrumentar_conexion(sender, connection, **kwargs):
+    if _contar_consulta_async not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_contar_consulta_async)
+
+
+class InstrumentacionMiddleware:
+    """
+    Mide cada request que llega a una vista: consultas SQL, tiempo en SQL,
+    render de plantillas y tiempo total. Lo acumula en core/metricas.py.
+
+    Con el setting PRESUPUESTO_CONSULTAS = {'nombre_vista': máximo} se avisa
+    en el log cuando una vista se pasa de su presupuesto; con
+    PRESUPUESTO_CONSULTAS_ESTRICTO = True se lanza PresupuestoConsultasExcedido
+    (útil en tests). Las consultas se cuentan desde este middleware hacia
+    adentro, así que incluyen la sesión y el usuario si la vista los usa.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.activa = getattr(settings, 'INSTRUMENTACION_ACTIVA', True)
+        # Con ASGI las vistas async no pasan por un hilo por culpa de este middleware
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+            if self.activa:
+                connection_created.connect(_instrumentar_conexion, dispatch_uid='instrumentacion_async')
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.activa:
+            return self.get_response(request)
+
+        medicion = {'consultas': 0, 'tiempo_sql': 0.0}
+        plantillas = [0.0]
+        inicio = time.perf_counter()
+        with _plantillas_medidas(plantillas), connection.execute_wrapper(partial(_medir, medicion)):
+            response = self.get_response(request)
+        self._registrar(request, medicion, plantillas[0], (time.perf_counter() - inicio) * 1000)
+        return response
+
+    async def __acall__(self, request):
+        if not self.activa:
+            return await self.get_response(request)
+
+        medicion = {'consultas': 0, 'tiempo_sql': 0.0}
+        plantillas = [0.0]
+        token = _medicion_async.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with _plantillas_medidas(plantillas):
+                response = await self.get_response(request)
+        finally:
+            _medicion_async.reset(token)
+        self._registrar(request, medicion, plantillas[0], (time.perf_counter() - inicio) * 1000)
+        return response
+
+    def _registrar(self, request, medicion, tiempo_plantillas, tiempo_total):
+        vista = self._nombre_vista(request)
+        if vista is None:
+            # 404 sin vista resuelta, archivos estáticos, etc.
+            return
+
+        presupuesto = getattr(settings, 'PRESUPUESTO_CONSULTAS', {}).get(vista)
+        excedido = presupuesto is not None and medicion['consultas'] > presupuesto
+        metricas.registrar(vista, medicion['consultas'], medicion['tiempo_sql'], tiempo_plantillas, tiempo_total, excedido)
+
+        if excedido:
+            mensaje = (f'{vista} hizo {medicion["consultas"]} consultas '
+                       f'(presupuesto: {presupuesto}) en {request.method} {request.path}')
+            if getattr(settings, 'PRESUPUESTO_CONSULTAS_ESTRICTO', False):
+                raise PresupuestoConsultasExcedido(mensaje)
+            logger.warning(mensaje)
+
+    def _nombre_vista(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return None
+        return getattr(match.func, '__name__', None) or match.view_name
@@ -1,5 +1,11 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 
 class Usuario(AbstractUser):
       ROLES = [
@@ -26,6 +32,18 @@ class Usuario(AbstractUser):
       def __str__(self):
             return f"{self.username} - {self.get_rol_display()}"
 
+      @classmethod
+      def from_db(cls, db, field_names, values):
+            instance = super().from_db(db, field_names, values)
+            # Textos leídos de la BD, para saber si hay que reindexar la búsqueda de clientes
+            if all(campo in field_names for campo in ('username', 'first_name', 'last_name')):
+                  instance._textos_originales = (instance.username, instance.first_name, instance.last_name)
+            return instance
+
+      def textos_cambiaron(self):
+            """True si el username, nombre o apellido cambiaron desde que se leyó de la BD."""
+            return getattr(self, '_textos_originales', None) != (self.username, self.first_name, self.last_name)
+
 class Categoria(models.Model):
       nombre = models.CharField(max_length=100, unique=True)
       descripcion = models.CharField(max_length=500, blank=True, null=True)
@@ -62,6 +80,25 @@ class Producto(models.Model):
             """Verifica si el producto está disponible para la venta"""
             return self.activo and self.stock > 0
 
+      @classmethod
+      def from_db(cls, db, field_names, values):
+            instance = super().from_db(db, field_names, values)
+            # Textos leídos de la BD, para saber si hay que reindexar la búsqueda
+            if 'nombre' in field_names and 'descripcion' in field_names:
+                  instance._textos_originales = (instance.nombre, instance.descripcion)
+            # Precio leído de la BD, para recalcular los carritos si cambia
+            if 'precio' in field_names:
+                  instance._precio_original = instance.precio
+            return instance
+
+      def textos_cambiaron(self):
+            """True si el nombre o la descripción cambiaron desde que se leyó de la BD."""
+            return getattr(self, '_textos_originales', None) != (self.nombre, self.descripcion)
+
+      def precio_cambio(self):
+            """True si el precio cambió desde que se leyó de la BD."""
+            return hasattr(self, '_precio_original') and self._precio_original != self.precio
+
 class Repartidor(models.Model):
     usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, related_name='perfil_repartidor')
     vehiculo = models.CharField(max_length=100, blank=True, null=True)
@@ -69,6 +106,14 @@ class Repartidor(models.Model):
     disponible = models.BooleanField(default=True)
     calificacion_promedio = models.DecimalField(max_digits=3, decimal_places=2, default=5.0)
 
+    # Carga del repartidor, mantenida con UPDATE atómicos al asignar pedidos y
+    # al cambiar su estado (ver core/contadores.py); el comando
+    # `reconciliar_repartidores` la recalcula desde los pedidos.
+    pedidos_activos = models.PositiveIntegerField(default=0, editable=False)
+    pedidos_en_camino = models.PositiveIntegerField(default=0, editable=False)
+    entregas_hoy = models.PositiveIntegerField(default=0, editable=False)
+    fecha_entregas = models.DateField(null=True, blank=True, editable=False)  # día al que corresponde entregas_hoy
+
     class Meta:
         verbose_name = 'Repartidor'
         verbose_name_plural = 'Repartidores'
@@ -76,10 +121,20 @@ class Repartidor(models.Model):
     def __str__(self):
         return f"{self.usuario.get_full_name()} - {'Disponible' if self.disponible else 'No disponible'}"
 
+    @property
+    def entregas_de_hoy(self):
+        """entregas_hoy, o 0 si el contador quedó de un día anterior."""
+        return self.entregas_hoy if self.fecha_entregas == timezone.localdate() else 0
+
 class Carrito(models.Model):
       usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, related_name="carrito")
       fecha_creacion = models.DateTimeField(auto_now_add=True)
       fecha_actualizacion = models.DateTimeField(auto_now=True)
+      # Totales desnormalizados: los mantiene ItemCarrito.save()/delete() con
+      # UPDATEs atómicos. NULL significa "sin calcular" (se calculan al leerlos).
+      cache_total_items = models.PositiveIntegerField(null=True, blank=True, editable=False)
+      cache_total_precio = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, editable=False)
+
       class Meta:
             verbose_name = 'Carrito'
             verbose_name_plural = 'Carritos'
@@ -87,13 +142,92 @@ class Carrito(models.Model):
       def __str__(self):
             return f"Carrito de {self.usuario.username}"
 
+      def save(self, *args, **kwargs):
+            # Un carrito nuevo parte vacío: sus totales ya se conocen
+            if self._state.adding and self.cache_total_items is None:
+                  self.cache_total_items, self.cache_total_precio = 0, Decimal('0')
+            super().save(*args, **kwargs)
+
       @property
       def total_items(self):
-            return sum(item.cantidad for item in self.items.all())
+            if self.cache_total_items is None:
+                  self.recalcular_totales()
+            return self.cache_total_items
 
       @property
       def total_precio(self):
-            return sum(item.subtotal for item in self.items.all())
+            if self.cache_total_precio is None:
+                  self.recalcular_totales()
+            return self.cache_total_precio
+
+      def calcular_totales(self):
+            """(cantidad de items, monto) calculados en la BD con un solo aggregate."""
+            totales = self.items.aggregate(
+                  items=Sum('cantidad'),
+                  precio=Sum(F('cantidad') * F('producto__precio'), output_field=models.DecimalField()),
+            )
+            return totales['items'] or 0, totales['precio'] or Decimal('0')
+
+      def recalcular_totales(self):
+            """Recalcula y guarda los totales (p. ej. si quedaron sin calcular)."""
+            from .carrito import invalidar_resumen
+
+            self.cache_total_items, self.cache_total_precio = self.calcular_totales()
+            Carrito.objects.filter(pk=self.pk).update(
+                  cache_total_items=self.cache_total_items,
+                  cache_total_precio=self.cache_total_precio,
+            )
+            invalidar_resumen(self.usuario_id)
+
+      @classmethod
+      def recalcular_totales_de(cls, carritos):
+            """Recalcula los totales de varios carritos con un solo UPDATE (p. ej. tras cambiar un precio)."""
+            from .carrito import invalidar_resumen
+
+            afectados = dict(carritos.values_list('pk', 'usuario_id'))
+            invalidar_resumen(*afectados.values())
+            items = ItemCarrito.objects.filter(carrito=OuterRef('pk')).values('carrito')
+            cls.objects.filter(pk__in=afectados).update(
+                  cache_total_items=Coalesce(Subquery(items.annotate(t=Sum('cantidad')).values('t')), 0),
+                  cache_total_precio=Coalesce(
+                        Subquery(items.annotate(
+                              t=Sum(F('cantidad') * F('producto__precio'), output_field=models.DecimalField())
+                        ).values('t')),
+                        Decimal('0'),
+                        output_field=models.DecimalField(),
+                  ),
+            )
+
+      def sumar_a_totales(self, items, precio):
+            """Suma (o resta) a los totales guardados con un UPDATE atómico."""
+            from .carrito import invalidar_resumen
+
+            Carrito.objects.filter(pk=self.pk).update(
+                  cache_total_items=F('cache_total_items') + items,
+                  cache_total_precio=F('cache_total_precio') + precio,
+            )
+            invalidar_resumen(self.usuario_id)
+            if self.cache_total_items is not None:
+                  self.cache_total_items += items
+                  self.cache_total_precio += precio
+
+      def bloquear(self):
+            """
+            SELECT ... FOR UPDATE de la fila del carrito. Las operaciones que
+            modifican el carrito lo bloquean antes que a sus líneas, así dos
+            requests sobre el mismo carrito se hacen en fila (incluso cuando
+            todavía no hay una línea que bloquear) y siempre en el mismo orden.
+            """
+            Carrito.objects.select_for_update().filter(pk=self.pk).values_list('pk', flat=True).get()
+
+      def vaciar(self):
+            """Borra todos los items con un solo DELETE y deja los totales en cero."""
+            from .carrito import invalidar_resumen
+
+            self.items.all().delete()
+            self.cache_total_items, self.cache_total_precio = 0, Decimal('0')
+            Carrito.objects.filter(pk=self.pk).update(cache_total_items=0, cache_total_precio=Decimal('0'))
+            invalidar_resumen(self.usuario_id)
 
 class ItemCarrito(models.Model):
       carrito = models. ForeignKey(Carrito, on_delete=models.CASCADE, related_name="items")
@@ -109,10 +243,16 @@ class ItemCarrito(models.Model):
       def __str__(self):
             return f"{self.cantidad} x {self.producto.nombre}"
 
+      @classmethod
+      def from_db(cls, db, field_names, values):
+            instance = super().from_db(db, field_names, values)
+            # Cantidad guardada en la BD, para sumar solo la diferencia al carrito
+            if 'cantidad' in field_names:
+                  instance._cantidad_original = instance.cantidad
+            return instance
+
       def clean(self):
             """Validación personalizada del modelo"""
-            from django.core.exceptions import ValidationError
-            
             # Validar cantidad mínima
             if self.cantidad < 1:
                   raise ValidationError({'cantidad': 'La cantidad debe ser al menos 1.'})
@@ -122,11 +262,25 @@ class ItemCarrito(models.Model):
                   raise ValidationError({
                         'cantidad': f'No hay suficiente stock. Disponible: {self.producto.stock}'
                   })
-      
-      def save(self, *args, **kwargs):
-            # Ejecutar validaciones antes de guardar
-            self.full_clean()
-            super().save(*args, **kwargs)
+
+      def save(self, *args, validar=True, **kwargs):
+            # Ejecutar validaciones antes de guardar (core/carrito.py ya valida
+            # con las filas bloqueadas y se ahorra estas consultas)
+            if validar:
+                  self.full_clean()
+            diferencia = self.cantidad - getattr(self, '_cantidad_original', 0)
+            with transaction.atomic():
+                  super().save(*args, **kwargs)
+                  if diferencia:
+                        self.carrito.sumar_a_totales(diferencia, self.producto.precio * diferencia)
+            self._cantidad_original = self.cantidad
+
+      def delete(self, *args, **kwargs):
+            cantidad = getattr(self, '_cantidad_original', self.cantidad)
+            with transaction.atomic():
+                  resultado = super().delete(*args, **kwargs)
+                  self.carrito.sumar_a_totales(-cantidad, -self.producto.precio * cantidad)
+            return resultado
 
       @property
       def subtotal(self):
@@ -206,6 +360,9 @@ class Pedido(models.Model):
       fecha_listo = models.DateTimeField(null=True, blank=True)
       fecha_entrega = models.DateTimeField(null=True, blank=True)
 
+      # Sube con cada cambio del pedido; da el ETag del seguimiento (ver core/seguimiento.py)
+      version = models.PositiveIntegerField(default=0, editable=False)
+
 
     #   verbose_name: nombre legible singular (para el panel admin).
 
@@ -217,6 +374,18 @@ class Pedido(models.Model):
             verbose_name = 'Pedido'
             verbose_name_plural = 'Pedidos'
             ordering = ['-fecha_creacion']
+            # Índices para los filtros más usados en las vistas:
+            # - repartidor_pedidos_view: (repartidor, estado[, fecha_entrega]);
+            #   el prefijo (repartidor, estado) también sirve a los conteos por estado.
+            # - admin_pedidos_lista_view / dashboard: (estado, fecha_creacion) y fecha_creacion;
+            #   se incluye el id porque la lista del admin pagina por (fecha_creacion, id).
+            # - mis_pedidos_view: (cliente, fecha_creacion).
+            indexes = [
+                  models.Index(fields=['repartidor', 'estado', 'fecha_entrega'], name='pedido_rep_estado_entrega'),
+                  models.Index(fields=['estado', '-fecha_creacion', '-id'], name='pedido_estado_creacion'),
+                  models.Index(fields=['cliente', '-fecha_creacion'], name='pedido_cliente_creacion'),
+                  models.Index(fields=['-fecha_creacion', '-id'], name='pedido_creacion'),
+            ]
 
       def __str__(self):
            # Muestra nombre de referencia si existe, si no, username (si existe cliente)
@@ -225,28 +394,77 @@ class Pedido(models.Model):
 
       def save(self, *args, **kwargs):
             if not self.numero_pedido:
-                  from django.utils import timezone
-                  import random
-                  import string
-
-                  # Generar número basado en timestamp + random para mejor unicidad
-                  timestamp = int(timezone.now().timestamp() * 1000) % 1000000  # últimos 6 dígitos del timestamp
-                  random_suffix = ''.join(random.choices(string.digits, k=4))
-                  self.numero_pedido = f"{timestamp}{random_suffix}"
-                  
-                  # Asegurar unicidad con un límite de intentos
-                  max_intentos = 10
-                  intentos = 0
-                  while Pedido.objects.filter(numero_pedido=self.numero_pedido).exists() and intentos < max_intentos:
-                      random_suffix = ''.join(random.choices(string.digits, k=4))
-                      self.numero_pedido = f"{timestamp}{random_suffix}"
-                      intentos += 1
-                  
-                  # Si después de 10 intentos sigue duplicado, agregar timestamp completo
-                  if intentos >= max_intentos:
-                      self.numero_pedido = f"{int(timezone.now().timestamp() * 1000000)}"
-            
-            super().save(*args, **kwargs)
+                  # Número correlativo sin consultas previas ni reintentos (ver core/numeracion.py)
+                  from .numeracion import siguiente_numero_pedido
+                  self.numero_pedido = siguiente_numero_pedido()
+
+            from .resumenes import registrar_pedido_nuevo, registrar_cambio_estado
+            from .eventos import publicar_cambio_pedido
+            from .contadores import registrar_cambios
+            from .seguimiento import invalidar as invalidar_seguimiento
+
+            es_nuevo = self._state.adding
+            estado_anterior = getattr(self, '_estado_original', None)
+            conoce_repartidor = hasattr(self, '_repartidor_original')
+            repartidor_anterior = getattr(self, '_repartidor_original', None)
+            # El guardado y lo que arrastra (versión, resúmenes, contadores) van
+            # juntos: si algo falla, la fila no queda guardada con los totales desfasados
+            with transaction.atomic():
+                  if not es_nuevo:
+                        # En la BD: dos guardados a la vez no pueden quedar con la misma versión
+                        self.version = F('version') + 1
+                  super().save(*args, **kwargs)
+                  if not es_nuevo:
+                        # El valor nuevo se vuelve a leer de la BD solo si alguien lo usa
+                        del self.version
+                        invalidar_seguimiento([self.numero_pedido])
+
+                  # Mantener al día el resumen diario de ventas
+                  if es_nuevo:
+                        registrar_pedido_nuevo(self)
+                  elif estado_anterior and estado_anterior != self.estado:
+                        registrar_cambio_estado(self, estado_anterior)
+
+                  # Avisar a las pantallas en vivo (ver core/eventos.py)
+                  cambio_estado = estado_anterior is not None and estado_anterior != self.estado
+                  cambio_repartidor = conoce_repartidor and repartidor_anterior != self.repartidor_id
+                  if es_nuevo or cambio_estado or cambio_repartidor:
+                        publicar_cambio_pedido(self, estado_anterior, repartidor_anterior, nuevo=es_nuevo)
+
+                  # Carga de los repartidores involucrados (ver core/contadores.py)
+                  if es_nuevo:
+                        registrar_cambios([(None, None, self.repartidor_id, self.estado)])
+                  elif cambio_estado or cambio_repartidor:
+                        registrar_cambios([(
+                              repartidor_anterior if conoce_repartidor else self.repartidor_id,
+                              estado_anterior or self.estado,
+                              self.repartidor_id,
+                              self.estado,
+                        )])
+            self._estado_original = self.estado
+            self._repartidor_original = self.repartidor_id
+
+      @classmethod
+      def from_db(cls, db, field_names, values):
+            instance = super().from_db(db, field_names, values)
+            # Guardamos el estado leído de la BD para detectar cambios en save()
+            if 'estado' in field_names:
+                  instance._estado_original = instance.estado
+            if 'repartidor_id' in field_names:
+                  instance._repartidor_original = instance.repartidor_id
+            return instance
+
+class SecuenciaPedido(models.Model):
+      """Contador que reparte bloques de números de pedido entre procesos."""
+      nombre = models.CharField(max_length=50, unique=True)
+      ultimo = models.BigIntegerField(default=0)
+
+      class Meta:
+            verbose_name = 'Secuencia de Pedidos'
+            verbose_name_plural = 'Secuencias de Pedidos'
+
+      def __str__(self):
+            return f"{self.nombre}: {self.ultimo}"
 
 class DetallePedido(models.Model):
       pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='detalles')
@@ -263,8 +481,13 @@ class DetallePedido(models.Model):
             return f"{self.cantidad}x {self.producto.nombre} - {self.pedido.numero_pedido}"
 
       def save(self, *args, **kwargs):
+            from .resumenes import registrar_detalles
+
+            es_nuevo = self._state.adding
             self.subtotal = self.precio_unitario * self.cantidad
             super().save(*args, **kwargs)
+            if es_nuevo:
+                  registrar_detalles(self.pedido, [self])
 
 class Reclamo(models.Model):
       MOTIVO_CHOICES = [
@@ -320,4 +543,43 @@ class Slide(models.Model):
             ordering = ['orden']
 
       def __str__(self):
-            return self.titulo or f"Slide {self.id}"
\ No newline at end of file
+            return self.titulo or f"Slide {self.id}"
+
+class ResumenVentaDiaria(models.Model):
+      """Totales de pedidos por día y estado (se mantiene incrementalmente)."""
+      fecha = models.DateField()
+      estado = models.CharField(max_length=20, choices=Pedido.ESTADO_CHOICES)
+      # Puede quedar negativo hasta reconstruir_resumenes (ver core/resumenes.py)
+      cantidad_pedidos = models.IntegerField(default=0)
+      total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+      class Meta:
+            verbose_name = 'Resumen de Venta Diaria'
+            verbose_name_plural = 'Resúmenes de Ventas Diarias'
+            ordering = ['-fecha']
+            constraints = [
+                  models.UniqueConstraint(fields=['fecha', 'estado'], name='resumen_venta_fecha_estado'),
+            ]
+
+      def __str__(self):
+            return f"{self.fecha} - {self.estado}: {self.cantidad_pedidos} pedidos (${self.total})"
+
+class ResumenProductoDiario(models.Model):
+      """Unidades y montos vendidos por día, producto y estado del pedido."""
+      fecha = models.DateField()
+      producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='resumenes_diarios')
+      estado = models.CharField(max_length=20, choices=Pedido.ESTADO_CHOICES)
+      # Puede quedar negativo hasta reconstruir_resumenes (ver core/resumenes.py)
+      cantidad = models.IntegerField(default=0)
+      total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+      class Meta:
+            verbose_name = 'Resumen de Producto Diario'
+            verbose_name_plural = 'Resúmenes de Productos Diarios'
+            ordering = ['-fecha']
+            constraints = [
+                  models.UniqueConstraint(fields=['fecha', 'producto', 'estado'], name='resumen_producto_fecha_estado'),
+            ]
+
+      def __str__(self):
+            return f"{self.fecha} - {self.producto_id} ({self.estado}): {self.cantidad}"
@@ -0,0 +1,231 @@
+"""
+Generación de números de pedido.
+
+Antes `Pedido.save()` armaba el número con la hora y 4 dígitos al azar y
+consultaba la BD hasta 10 veces para descartar colisiones. Ahora el número
+sale de un contador: cada hilo reserva un bloque de números con un único
+UPDATE (o un `nextval` en PostgreSQL) y los entrega desde memoria, sin
+consultar antes de insertar y sin reintentos. Los números quedan como
+`00001234`: cortos, legibles y siempre únicos (pueden quedar huecos cuando
+un proceso termina sin usar todo su bloque).
+
+El generador se elige con el setting `GENERADOR_NUMERO_PEDIDO` (ruta a una
+clase con los métodos `siguiente()` y `reservar(cantidad)`), y el tamaño del
+bloque con `BLOQUE_NUMEROS_PEDIDO`. La fila del contador y, si se usa
+GeneradorSecuenciaPostgres, la secuencia se crean al correr `migrate` (ver
+`preparar_numeracion`), no durante los requests.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+GENERADOR_POR_DEFECTO = 'core.numeracion.GeneradorPorBloques'
+SECUENCIA_PEDIDOS = 'pedidos'
+
+
+def formatear(numero):
+    return f'{numero:08d}'
+
+
+# Un hilo con su propia conexión (en autocommit) para reservar bloques desde
+# dentro de una transacción sin quedar atados a ella (ver GeneradorPorBloques)
+_hilo_reservas = ThreadPoolExecutor(max_workers=1, thread_name_prefix='numeracion')
+
+
+def _en_otra_conexion(funcion, *args):
+    """Corre `funcion` en el hilo de reservas: lo que escribe se confirma al terminar."""
+    def correr():
+        close_old_connections()
+        return funcion(*args)
+    return _hilo_reservas.submit(correr).result()
+
+
+class GeneradorNumeroPedido:
+    """
+    Base de los generadores: reparte números desde un bloque en memoria y
+    pide uno nuevo (con `_reservar_bloque`) cuando se agota.
+
+    Cada hilo tiene su propio bloque, porque cada hilo usa su propia conexión
+    y transacción.
+    """
+
+    # Si es True, los bloques son siempre de `tamano_bloque` (p. ej. una
+    # secuencia con INCREMENT fijo) y un bulk grande pide varios.
+    bloque_fijo = False
+
+    def __init__(self, tamano_bloque=None):
+        self.tamano_bloque = tamano_bloque or getattr(settings, 'BLOQUE_NUMEROS_PEDIDO', 100)
+        self._local = threading.local()
+
+    def _reservar_bloque(self, cantidad):
+        """Reserva `cantidad` números consecutivos y devuelve el primero."""
+        raise NotImplementedError
+
+    def _tamano_bloque(self):
+        return self.tamano_bloque
+
+    def _reserva_definitiva(self):
+        """True si una reserva hecha ahora no se deshace con un rollback de la transacción en curso."""
+        return True
+
+    def _tomar(self, cantidad):
+        """Lista de `cantidad` números, usando lo que queda del bloque actual."""
+        local = self._local
+        numeros = []
+        while len(numeros) < cantidad:
+            faltan = cantidad - len(numeros)
+            if getattr(local, 'siguiente', None) is None or local.siguiente > local.fin:
+                if not self._reserva_definitiva():
+                    # La reserva se revierte junto con la transacción en curso
+                    # (y otro proceso podría recibir el mismo rango): se
+                    # reserva justo lo necesario y no queda bloque en memoria.
+                    inicio = self._reservar_bloque(faltan)
+                    numeros.extend(range(inicio, inicio + faltan))
+                    continue
+                tamano = self._tamano_bloque() if self.bloque_fijo else max(self._tamano_bloque(), faltan)
+                inicio = self._reservar_bloque(tamano)
+                local.siguiente, local.fin = inicio, inicio + tamano - 1
+            hasta = min(local.fin, local.siguiente + faltan - 1)
+            numeros.extend(range(local.siguiente, hasta + 1))
+            local.siguiente = hasta + 1
+        return numeros
+
+    def siguiente(self):
+        return formatear(self._tomar(1)[0])
+
+    def reservar(self, cantidad):
+        """Números para `cantidad` pedidos (p. ej. antes de un bulk_create)."""
+        return [formatear(numero) for numero in self._tomar(cantidad)]
+
+
+class GeneradorPorBloques(GeneradorNumeroPedido):
+    """
+    Contador en la tabla SecuenciaPedido; funciona con cualquier motor.
+
+    Dentro de una transacción el UPDATE del contador no puede ir en ella: el
+    bloqueo de la fila duraría hasta su commit (todos los checkouts
+    concurrentes esperarían a ese) y un rollback devolvería el rango ya
+    entregado. Por eso se hace en el hilo de reservas, con otra conexión que
+    confirma enseguida, y el bloque se usa completo en esta transacción y en
+    las siguientes.
+
+    SQLite es la excepción: la transacción en curso ya tiene el lock de
+    escritura de toda la base, así que otra conexión esperaría a que termine.
+    Ahí se reserva dentro de la transacción, pero solo los números que se
+    usan en esa llamada (un rollback los devuelve sin dejar huecos).
+    """
+
+    def _reservar_bloque(self, cantidad):
+        if connection.in_atomic_block and connection.vendor != 'sqlite':
+            return _en_otra_conexion(self._incrementar, cantidad)
+        return self._incrementar(cantidad)
+
+    def _incrementar(self, cantidad):
+        from .models import SecuenciaPedido
+
+        filtro = SecuenciaPedido.objects.filter(nombre=SECUENCIA_PEDIDOS)
+        with transaction.atomic():
+            if not filtro.update(ultimo=F('ultimo') + cantidad):
+                # La fila la crea preparar_numeracion; esto cubre una base sin migrar
+                try:
+                    with transaction.atomic():
+                        SecuenciaPedido.objects.create(nombre=SECUENCIA_PEDIDOS, ultimo=cantidad)
+                except IntegrityError:
+                    # Otro proceso creó la fila entre medio
+                    filtro.update(ultimo=F('ultimo') + cantidad)
+            ultimo = filtro.values_list('ultimo', flat=True).get()
+        return ultimo - cantidad + 1
+
+    def _reserva_definitiva(self):
+        # Fuera de una transacción el atomic() de _incrementar hace commit;
+        # dentro, la reserva va por otra conexión salvo en SQLite
+        return not connection.in_atomic_block or connection.vendor != 'sqlite'
+
+
+class GeneradorSecuenciaPostgres(GeneradorNumeroPedido):
+    """
+    Secuencia nativa de PostgreSQL que avanza de a un bloque por `nextval`.
+
+    `nextval` no se deshace con un rollback ni deja bloqueada ninguna fila,
+    así que el bloque sirve siempre. La secuencia la crea `migrate` (ver
+    preparar_numeracion) partiendo después del último número repartido por
+    GeneradorPorBloques. El tamaño del bloque es el INCREMENT de la secuencia,
+    que se lee una vez por proceso: si cambia BLOQUE_NUMEROS_PEDIDO hay que
+    correr `migrate` y reiniciar los procesos.
+    """
+    secuencia = 'core_pedido_numero_seq'
+    bloque_fijo = True
+
+    def __init__(self, tamano_bloque=None):
+        super().__init__(tamano_bloque)
+        self._incremento = None
+
+    def _tamano_bloque(self):
+        if self._incremento is None:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT increment_by FROM pg_sequences WHERE sequencename = %s', [self.secuencia])
+                fila = cursor.fetchone()
+            if fila is None:
+                raise RuntimeError(f'No existe la secuencia {self.secuencia}: corre `python manage.py migrate`.')
+            self._incremento = fila[0]
+        return self._incremento
+
+    def _reservar_bloque(self, cantidad):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [self.secuencia])
+            return cursor.fetchone()[0]
+
+
+def preparar_numeracion(sender, using, **kwargs):
+    """
+    Receptor de post_migrate: crea la fila del contador y, si el generador
+    configurado es GeneradorSecuenciaPostgres, crea la secuencia (partiendo
+    después del último número repartido) y ajusta su INCREMENT al tamaño de
+    bloque configurado.
+    """
+    from django.db import connections
+
+    from .models import SecuenciaPedido
+
+    SecuenciaPedido.objects.using(using).get_or_create(nombre=SECUENCIA_PEDIDOS)
+
+    ruta = getattr(settings, 'GENERADOR_NUMERO_PEDIDO', GENERADOR_POR_DEFECTO)
+    generador = import_string(ruta)
+    conexion = connections[using]
+    if not issubclass(generador, GeneradorSecuenciaPostgres) or conexion.vendor != 'postgresql':
+        return
+    inicio = SecuenciaPedido.objects.using(using).get(nombre=SECUENCIA_PEDIDOS).ultimo + 1
+    tamano = int(getattr(settings, 'BLOQUE_NUMEROS_PEDIDO', 100))
+    secuencia = GeneradorSecuenciaPostgres.secuencia
+    with conexion.cursor() as cursor:
+        cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {secuencia} START WITH {inicio}')
+        cursor.execute(f'ALTER SEQUENCE {secuencia} INCREMENT BY {tamano}')
+
+
+_generador = None
+
+
+def obtener_generador():
+    """Instancia (única por proceso) del generador configurado."""
+    global _generador
+    if _generador is None:
+        ruta = getattr(settings, 'GENERADOR_NUMERO_PEDIDO', GENERADOR_POR_DEFECTO)
+        _generador = import_string(ruta)()
+    return _generador
+
+
+def siguiente_numero_pedido():
+    return obtener_generador().siguiente()
+
+
+def asignar_numeros(pedidos):
+    """Asigna número a los pedidos que no lo tienen, antes de un bulk_create."""
+    sin_numero = [pedido for pedido in pedidos if not pedido.numero_pedido]
+    for pedido, numero in zip(sin_numero, obtener_generador().reservar(len(sin_numero))):
+        pedido.numero_pedido = numero
+    return pedidos
@@ -0,0 +1,55 @@
+"""
+Paginación por cursor (keyset) sobre (fecha_creacion, id).
+
+A diferencia de OFFSET, cada página se obtiene con un
+`WHERE (fecha_creacion, id) < (cursor)` que recorre el índice desde el punto
+exacto, así el tiempo por página no crece con la profundidad del scroll.
+"""
+
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+TAMANO_PAGINA = 50
+
+
+def codificar_cursor(objeto):
+    """Cursor opaco (apto para URL) que apunta a `objeto`."""
+    datos = json.dumps([objeto.fecha_creacion.isoformat(), objeto.pk])
+    return base64.urlsafe_b64encode(datos.encode('utf-8')).decode('ascii')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (fecha_creacion, id) o None si el cursor no es válido."""
+    if not cursor:
+        return None
+    try:
+        fecha, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        fecha = parse_datetime(fecha)
+        pk = int(pk)
+    except (ValueError, TypeError):
+        return None
+    if fecha is None:
+        return None
+    return fecha, pk
+
+
+def pagina_keyset(queryset, cursor=None, tamano=TAMANO_PAGINA):
+    """
+    Devuelve (objetos, siguiente_cursor) ordenando de más nuevo a más antiguo.
+    `siguiente_cursor` es None cuando no quedan más resultados.
+    """
+    queryset = queryset.order_by('-fecha_creacion', '-id')
+    posicion = decodificar_cursor(cursor)
+    if posicion:
+        fecha, pk = posicion
+        queryset = queryset.filter(Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, id__lt=pk))
+
+    # Pedimos uno de más para saber si existe una página siguiente
+    objetos = list(queryset[:tamano + 1])
+    if len(objetos) > tamano:
+        objetos = objetos[:tamano]
+        return objetos, codificar_cursor(objetos[-1])
+    return objetos, None
@@ -0,0 +1,167 @@
+"""
+Mantenimiento incremental de los resúmenes diarios de ventas.
+
+Los modelos ResumenVentaDiaria y ResumenProductoDiario guardan totales ya
+agregados por día, así el dashboard lee O(días) filas en vez de recorrer
+todos los pedidos. Se actualizan desde Pedido.save() y DetallePedido.save()
+(o desde core/ventas.py cuando las líneas se insertan con bulk_create, y
+core/estados.py en los cambios de estado por lotes), una vez confirmada la
+transacción; el comando `reconstruir_resumenes` los regenera completos desde
+cero.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+
+def _fecha_pedido(pedido):
+    return timezone.localdate(pedido.fecha_creacion) if pedido.fecha_creacion else timezone.localdate()
+
+
+def _incrementar(modelo, claves, **incrementos):
+    """
+    Suma los incrementos a la fila `claves` con un UPDATE atómico; si no
+    existe, la crea con los incrementos como valores.
+
+    Un incremento negativo sobre una fila inexistente (un pedido que nunca se
+    sumó al resumen, p. ej. creado con bulk_create, que cambia de estado)
+    también se aplica: la fila queda en negativo y compensa la suma del estado
+    nuevo, así los totales del día no cuentan dos veces ese pedido.
+    `reconstruir_resumenes` deja todo en los valores reales.
+    """
+    cambios = {campo: F(campo) + valor for campo, valor in incrementos.items()}
+    if modelo.objects.filter(**claves).update(**cambios):
+        return
+
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**claves, **incrementos)
+    except IntegrityError:
+        # Otro proceso creó la fila entre medio, basta con actualizarla
+        modelo.objects.filter(**claves).update(**cambios)
+
+
+def _al_confirmar(funcion):
+    """
+    Aplica el cambio al resumen cuando la transacción del pedido se confirma.
+
+    Así la fila (día, estado), que comparten todos los pedidos del día, no
+    queda bloqueada mientras dura cada checkout; si la transacción se revierte
+    el resumen no se toca. Fuera de una transacción se ejecuta de inmediato.
+    """
+    transaction.on_commit(funcion)
+
+
+def registrar_pedido_nuevo(pedido):
+    """Suma un pedido recién creado al resumen de su día y estado."""
+    from .models import ResumenVentaDiaria
+
+    claves = {'fecha': _fecha_pedido(pedido), 'estado': pedido.estado}
+    total = Decimal(str(pedido.total or 0))
+    _al_confirmar(lambda: _incrementar(ResumenVentaDiaria, claves, cantidad_pedidos=1, total=total))
+
+
+def registrar_detalles(pedido, detalles):
+    """Suma las líneas de un pedido (creadas una a una o con bulk_create) al resumen por producto."""
+    from .models import ResumenProductoDiario
+
+    por_producto = defaultdict(lambda: [0, Decimal('0')])
+    for detalle in detalles:
+        acumulado = por_producto[detalle.producto_id]
+        acumulado[0] += detalle.cantidad
+        acumulado[1] += Decimal(str(detalle.subtotal))
+
+    fecha = _fecha_pedido(pedido)
+    estado = pedido.estado
+
+    def aplicar():
+        with transaction.atomic():
+            # Orden fijo por producto para no generar deadlocks entre procesos
+            for producto_id, (cantidad, total) in sorted(por_producto.items()):
+                _incrementar(
+                    ResumenProductoDiario,
+                    {'fecha': fecha, 'producto_id': producto_id, 'estado': estado},
+                    cantidad=cantidad,
+                    total=total,
+                )
+
+    _al_confirmar(aplicar)
+
+
+def registrar_cambio_estado(pedido, estado_anterior):
+    """Mueve los totales de un pedido (y de sus líneas) desde el estado anterior al nuevo."""
+    from .models import ResumenProductoDiario, ResumenVentaDiaria
+
+    fecha = _fecha_pedido(pedido)
+    estado = pedido.estado
+    total = Decimal(str(pedido.total or 0))
+    lineas = list(
+        pedido.detalles.values('producto_id')
+        .annotate(cantidad_total=Sum('cantidad'), monto_total=Sum('subtotal'))
+        .order_by('producto_id')
+    )
+
+    def aplicar():
+        with transaction.atomic():
+            _incrementar(ResumenVentaDiaria, {'fecha': fecha, 'estado': estado_anterior},
+                         cantidad_pedidos=-1, total=-total)
+            _incrementar(ResumenVentaDiaria, {'fecha': fecha, 'estado': estado},
+                         cantidad_pedidos=1, total=total)
+
+            for linea in lineas:
+                claves = {'fecha': fecha, 'producto_id': linea['producto_id']}
+                _incrementar(ResumenProductoDiario, {**claves, 'estado': estado_anterior},
+                             cantidad=-linea['cantidad_total'], total=-linea['monto_total'])
+                _incrementar(ResumenProductoDiario, {**claves, 'estado': estado},
+                             cantidad=linea['cantidad_total'], total=linea['monto_total'])
+
+    _al_confirmar(aplicar)
+
+
+def registrar_cambios_estado(pedidos, estado):
+    """
+    Versión por lotes de registrar_cambio_estado para core/estados.py: los
+    pedidos traen `_estado_original` con el estado que tenían antes del
+    UPDATE. Las líneas de todos se leen con una sola consulta y los
+    incrementos se agrupan por (día, estado[, producto]).
+    """
+    from .models import DetallePedido, ResumenProductoDiario, ResumenVentaDiaria
+
+    ventas = defaultdict(lambda: [0, Decimal('0')])
+    origen = {}
+    for pedido in pedidos:
+        fecha = _fecha_pedido(pedido)
+        origen[pedido.pk] = (fecha, pedido._estado_original)
+        total = Decimal(str(pedido.total or 0))
+        for clave, signo in (((fecha, pedido._estado_original), -1), ((fecha, estado), 1)):
+            ventas[clave][0] += signo
+            ventas[clave][1] += signo * total
+
+    productos = defaultdict(lambda: [0, Decimal('0')])
+    lineas = (DetallePedido.objects.filter(pedido_id__in=origen)
+              .values('pedido_id', 'producto_id')
+              .annotate(cantidad_total=Sum('cantidad'), monto_total=Sum('subtotal'))
+              .order_by())
+    for linea in lineas:
+        fecha, estado_anterior = origen[linea['pedido_id']]
+        for clave, signo in (((fecha, linea['producto_id'], estado_anterior), -1),
+                             ((fecha, linea['producto_id'], estado), 1)):
+            productos[clave][0] += signo * linea['cantidad_total']
+            productos[clave][1] += signo * linea['monto_total']
+
+    def aplicar():
+        with transaction.atomic():
+            # Orden fijo de filas para no generar deadlocks entre procesos
+            for (fecha, estado_fila), (cantidad, total) in sorted(ventas.items()):
+                _incrementar(ResumenVentaDiaria, {'fecha': fecha, 'estado': estado_fila},
+                             cantidad_pedidos=cantidad, total=total)
+            for (fecha, producto_id, estado_fila), (cantidad, total) in sorted(productos.items()):
+                _incrementar(ResumenProductoDiario,
+                             {'fecha': fecha, 'producto_id': producto_id, 'estado': estado_fila},
+                             cantidad=cantidad, total=total)
+
+    _al_confirmar(aplicar)
@@ -0,0 +1,89 @@
+"""
+Seguimiento de pedidos: estado y fechas de un pedido, para que el cliente
+vea si su pedido avanzó sin recargar mis_pedidos_view (que trae todos sus
+pedidos con sus detalles).
+
+Cada pedido lleva un contador `version` que sube con cada cambio
+(Pedido.save, estados.transicionar, despacho). La respuesta del seguimiento
+lleva ETag "<pk>-<version>"; si el cliente manda el mismo en If-None-Match
+se contesta 304 sin cuerpo. Los datos se guardan en el caché por número de
+pedido y se borran al confirmarse cada cambio, así que un refresco cuesta un
+acierto de caché o una consulta por el índice único de numero_pedido, nunca
+una lectura de los detalles del pedido.
+
+El enlace público no pide sesión: lleva el número de pedido firmado
+(token_seguimiento), para que no baste con probar números correlativos.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signing import BadSignature, Signer
+from django.db import transaction
+
+CAMPOS = (
+    'numero_pedido', 'estado', 'tipo_orden', 'fecha_creacion', 'fecha_confirmacion',
+    'fecha_preparacion', 'fecha_listo', 'fecha_entrega',
+)
+
+_firmador = Signer(salt='core.seguimiento')
+
+
+def token_seguimiento(numero_pedido):
+    return _firmador.sign(numero_pedido)
+
+
+def numero_desde_token(token):
+    """Número de pedido del token, o None si el token no es válido."""
+    try:
+        return _firmador.unsign(token)
+    except BadSignature:
+        return None
+
+
+def datos_seguimiento(fila):
+    """Lo que ve el cliente del pedido, a partir de un values() con CAMPOS."""
+    from .models import Pedido
+
+    datos = {campo: fila[campo] for campo in CAMPOS}
+    for campo in CAMPOS:
+        if campo.startswith('fecha_') and datos[campo] is not None:
+            datos[campo] = datos[campo].isoformat()
+    datos['estado_display'] = dict(Pedido.ESTADO_CHOICES).get(fila['estado'], fila['estado'])
+    return datos
+
+
+def etag(seguimiento):
+    return f'"{seguimiento["pedido"]}-{seguimiento["version"]}"'
+
+
+def _clave(numero_pedido):
+    return f'seguimiento:{numero_pedido}'
+
+
+def _timeout():
+    # Acota lo que puede durar una entrada vieja si una lectura se cruza con un cambio
+    return getattr(settings, 'SEGUIMIENTO_CACHE_TIMEOUT', 60)
+
+
+async def aobtener_seguimiento(numero_pedido):
+    """{'pedido', 'version', 'datos'} del pedido, desde el caché si está; None si no existe."""
+    from .models import Pedido
+
+    seguimiento = await cache.aget(_clave(numero_pedido))
+    if seguimiento is None:
+        fila = await (Pedido.objects
+                      .filter(numero_pedido=numero_pedido)
+                      .values('pk', 'version', *CAMPOS)
+                      .afirst())
+        if fila is None:
+            return None
+        seguimiento = {'pedido': fila['pk'], 'version': fila['version'], 'datos': datos_seguimiento(fila)}
+        await cache.aset(_clave(numero_pedido), seguimiento, _timeout())
+    return seguimiento
+
+
+def invalidar(numeros_pedido):
+    """Borra el seguimiento guardado de esos pedidos cuando se confirme la transacción."""
+    claves = [_clave(numero) for numero in numeros_pedido]
+    if claves:
+        transaction.on_commit(lambda: cache.delete_many(claves))
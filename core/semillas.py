@@ -0,0 +1,335 @@
+"""
+Generación masiva y determinista de datos para benchmarks (comando `sembrar_datos`)
+y datos de demostración para desarrollo (comando `sembrar_demo`).
+
+Con la misma semilla se generan siempre los mismos usuarios, productos,
+pedidos, líneas y reclamos (salvo los números de pedido, que salen del
+contador de core/numeracion.py). Las distribuciones imitan un local real:
+
+- más pedidos a la hora de almuerzo y de cena, y los viernes y sábados,
+- pocos productos concentran la mayoría de las ventas (distribución tipo Zipf),
+- algunos clientes piden mucho más que otros,
+- los pedidos viejos están casi todos entregados; los de las últimas horas,
+  repartidos entre los estados activos.
+
+Todo se inserta con bulk_create por lotes, sin pasar por save() ni señales;
+al terminar hay que reconstruir los resúmenes e invalidar los índices (el
+comando lo hace).
+"""
+
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .fechas import inicio_del_dia
+from .models import (
+    Carrito, Categoria, DetallePedido, MetodoPago, Pedido, Producto, Reclamo, Repartidor, Usuario,
+)
+from .numeracion import asignar_numeros
+
+PREFIJO = 'SEED'
+
+# Peso relativo de cada hora del día (0-23): almuerzo y cena
+PESOS_HORA = [0, 0, 0, 0, 0, 0, 1, 2, 4, 4, 5, 8, 20, 26, 18, 7, 5, 6, 10, 18, 22, 16, 8, 3]
+# Lunes a domingo
+PESOS_DIA_SEMANA = [0.8, 0.85, 0.9, 1.0, 1.3, 1.4, 1.1]
+
+PESOS_LINEAS = [35, 30, 20, 10, 5]  # pedidos con 1, 2, 3, 4 y 5 productos distintos
+PESOS_CANTIDAD = [70, 20, 10]  # 1, 2 o 3 unidades por línea
+TIPOS_ORDEN = ['delivery', 'retiro', 'local']
+PESOS_TIPO_ORDEN = [55, 25, 20]
+ESTADOS_HISTORICOS = ['entregado', 'cancelado']
+PESOS_ESTADOS_HISTORICOS = [94, 6]
+ESTADOS_RECIENTES = ['pendiente', 'confirmado', 'en_preparacion', 'listo', 'en_camino', 'entregado', 'cancelado']
+PESOS_ESTADOS_RECIENTES = [15, 15, 20, 10, 15, 22, 3]
+MOTIVOS_RECLAMO = ['pedido_incorrecto', 'producto_danado', 'demora_excesiva', 'mala_atencion', 'otro']
+PESOS_MOTIVOS = [25, 10, 45, 10, 10]
+
+MENU = {
+    'Hamburguesas': (['Hamburguesa', 'Cheeseburger', 'Burger'], (4500, 9900)),
+    'Pizzas': (['Pizza', 'Calzone'], (6900, 15900)),
+    'Sándwiches': (['Completo', 'Churrasco', 'Barros Luco', 'Chacarero', 'Lomito'], (3500, 8900)),
+    'Empanadas': (['Empanada'], (1800, 3200)),
+    'Acompañamientos': (['Papas fritas', 'Aros de cebolla', 'Nuggets', 'Sopaipillas'], (1500, 4500)),
+    'Ensaladas': (['Ensalada', 'Bowl'], (3900, 7500)),
+    'Bebidas': (['Bebida', 'Jugo natural', 'Limonada', 'Agua mineral'], (1000, 2900)),
+    'Cafetería': (['Café', 'Té', 'Capuccino', 'Chocolate caliente'], (1200, 3200)),
+    'Postres': (['Helado', 'Torta', 'Kuchen', 'Brownie', 'Leche asada'], (1900, 4500)),
+}
+VARIANTES = ['clásica', 'doble', 'italiana', 'vegana', 'picante', 'con queso', 'de pollo', 'de carne', 'napolitana',
+             'especial', 'familiar', 'mediana', 'light', 'artesanal', 'de la casa', 'XL', 'BBQ', 'al pil pil']
+INGREDIENTES = ['tomate', 'palta', 'mayonesa', 'queso', 'jamón', 'champiñón', 'cebolla', 'ají', 'pepinillo',
+                'lechuga', 'tocino', 'huevo', 'aceituna', 'choclo', 'porotos verdes', 'pimentón']
+NOMBRES = ['Camila', 'Valentina', 'Javiera', 'Catalina', 'Martina', 'Sofía', 'Antonia', 'Fernanda', 'Benjamín',
+           'Matías', 'Vicente', 'Joaquín', 'Tomás', 'Agustín', 'Diego', 'Cristóbal', 'Felipe', 'Ignacio']
+APELLIDOS = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda',
+             'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández', 'Torres', 'Araya', 'Flores']
+CALLES = ['Av. Providencia', 'Av. Apoquindo', 'Los Leones', 'Irarrázaval', 'Av. Matta', 'San Diego', 'Vicuña Mackenna',
+          'Av. Grecia', 'Manuel Montt', 'Av. Ossa', 'Pedro de Valdivia', 'Bilbao']
+
+
+@contextmanager
+def sin_auto_now_add(modelo, campo):
+    """Permite fijar a mano un campo auto_now_add (bulk_create lo pisaría con now())."""
+    field = modelo._meta.get_field(campo)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _acumulados_zipf(cantidad, exponente):
+    """Pesos acumulados 1/rango^exponente, para usar con random.choices(cum_weights=...)."""
+    return list(accumulate(1 / (rango ** exponente) for rango in range(1, cantidad + 1)))
+
+
+class Sembrador:
+    """
+    Genera los datos con un random.Random propio, así el resultado depende
+    solo de la semilla y de los parámetros.
+    """
+
+    def __init__(self, semilla=42, lote=5000, password='cosmofood123', stdout=None):
+        self.rng = random.Random(semilla)
+        self.lote = lote
+        self.password = password
+        self.stdout = stdout
+
+    def _log(self, mensaje, ending='\n'):
+        if self.stdout:
+            self.stdout.write(mensaje, ending=ending)
+
+    # --- Usuarios ---
+
+    def usuarios(self, rol, cantidad):
+        """Crea `cantidad` usuarios del rol (todos con la misma contraseña) y devuelve sus pks."""
+        clave = make_password(self.password)  # se hashea una vez, no por usuario
+        for desde in range(0, cantidad, self.lote):
+            lote = []
+            for i in range(desde, min(desde + self.lote, cantidad)):
+                nombre, apellido = self.rng.choice(NOMBRES), self.rng.choice(APELLIDOS)
+                lote.append(Usuario(
+                    username=f'{PREFIJO}_{rol}_{i}',
+                    password=clave,
+                    first_name=nombre,
+                    last_name=apellido,
+                    email=f'{PREFIJO.lower()}.{rol}.{i}@cosmofood.test',
+                    rol=rol,
+                    telefono=f'+569{self.rng.randrange(10_000_000, 99_999_999)}',
+                    direccion=f'{self.rng.choice(CALLES)} {self.rng.randrange(100, 9999)}' if rol == 'cliente' else None,
+                ))
+            with transaction.atomic():
+                Usuario.objects.bulk_create(lote)
+        pks = list(Usuario.objects.filter(username__startswith=f'{PREFIJO}_{rol}_').order_by('pk').values_list('pk', flat=True))
+
+        if rol == 'cliente':
+            for desde in range(0, len(pks), self.lote):
+                Carrito.objects.bulk_create([
+                    Carrito(usuario_id=pk, cache_total_items=0, cache_total_precio=Decimal('0'))
+                    for pk in pks[desde:desde + self.lote]
+                ])
+        elif rol == 'repartidor':
+            for desde in range(0, len(pks), self.lote):
+                Repartidor.objects.bulk_create([
+                    Repartidor(
+                        usuario_id=pk,
+                        vehiculo=self.rng.choice(['Moto', 'Bicicleta', 'Auto']),
+                        placa_vehiculo=f'{PREFIJO[:2]}{self.rng.randrange(1000, 9999)}',
+                        calificacion_promedio=Decimal(self.rng.randrange(380, 500)) / 100,
+                    )
+                    for pk in pks[desde:desde + self.lote]
+                ])
+            return list(Repartidor.objects.filter(usuario_id__in=pks).order_by('pk').values_list('pk', flat=True))
+        return pks
+
+    # --- Catálogo ---
+
+    def catalogo(self, cantidad_productos):
+        """Categorías del menú y `cantidad_productos` productos repartidos entre ellas."""
+        categorias = Categoria.objects.bulk_create([
+            Categoria(nombre=f'{PREFIJO} {nombre}', descripcion=f'{nombre} de la casa') for nombre in MENU
+        ])
+        productos = []
+        for i in range(cantidad_productos):
+            categoria = categorias[i % len(categorias)]
+            platos, (minimo, maximo) = MENU[categoria.nombre[len(PREFIJO) + 1:]]
+            plato = self.rng.choice(platos)
+            productos.append(Producto(
+                nombre=f'{PREFIJO} {plato} {self.rng.choice(VARIANTES)} {i}',
+                descripcion=f'{plato} con {", ".join(self.rng.sample(INGREDIENTES, 3))}',
+                precio=Decimal(self.rng.randrange(minimo, maximo, 100)),
+                stock=self.rng.randrange(20, 500),
+                categoria=categoria,
+                en_promocion=self.rng.random() < 0.08,
+            ))
+        Producto.objects.bulk_create(productos, batch_size=self.lote)
+        return list(Producto.objects.filter(nombre__startswith=f'{PREFIJO} ').order_by('pk').values_list('pk', 'precio'))
+
+    # --- Pedidos ---
+
+    def _dias(self, dias):
+        """(inicio del día, peso) de los últimos `dias` días, con más peso los días recientes y el fin de semana."""
+        hoy = timezone.localdate()
+        resultado = []
+        for atras in range(dias, -1, -1):
+            fecha = hoy - timedelta(days=atras)
+            tendencia = 1 + 0.5 * (dias - atras) / max(dias, 1)  # el local va creciendo
+            resultado.append((inicio_del_dia(fecha), PESOS_DIA_SEMANA[fecha.weekday()] * tendencia))
+        return resultado
+
+    def pedidos(self, cantidad, dias, clientes, repartidores, productos, tasa_reclamos=0.01):
+        """Crea `cantidad` pedidos con sus líneas y reclamos, en lotes."""
+        rng = self.rng
+        ahora = timezone.now()
+        hace_dos_horas = ahora - timedelta(hours=2)
+        pago_ids = [
+            MetodoPago.objects.get_or_create(nombre=nombre, defaults={'tipo': tipo})[0].pk
+            for nombre, tipo in (('Efectivo', 'efectivo'), ('Tarjeta', 'tarjeta'), ('Transferencia', 'transferencia'))
+        ]
+
+        dias_inicio = self._dias(dias)
+        inicios = [inicio for inicio, _ in dias_inicio]
+        acum_dias = list(accumulate(peso for _, peso in dias_inicio))
+        acum_horas = list(accumulate(PESOS_HORA))
+        acum_productos = _acumulados_zipf(len(productos), 1.1)
+        acum_clientes = _acumulados_zipf(len(clientes), 0.6)
+        rango_lineas = range(1, len(PESOS_LINEAS) + 1)
+
+        creados = 0
+        with sin_auto_now_add(Pedido, 'fecha_creacion'):
+            while creados < cantidad:
+                tamano = min(self.lote, cantidad - creados)
+                pedidos, lineas_por_pedido = [], []
+                for _ in range(tamano):
+                    creado = (rng.choices(inicios, cum_weights=acum_dias)[0]
+                              + timedelta(hours=rng.choices(range(24), cum_weights=acum_horas)[0],
+                                          seconds=rng.randrange(3600)))
+                    if creado > ahora:
+                        creado = ahora - timedelta(seconds=rng.randrange(1, 7200))
+
+                    reciente = creado >= hace_dos_horas
+                    estado = (rng.choices(ESTADOS_RECIENTES, PESOS_ESTADOS_RECIENTES)[0] if reciente
+                              else rng.choices(ESTADOS_HISTORICOS, PESOS_ESTADOS_HISTORICOS)[0])
+                    tipo_orden = rng.choices(TIPOS_ORDEN, PESOS_TIPO_ORDEN)[0]
+
+                    # Productos distintos del pedido, elegidos por popularidad
+                    elegidos = {}
+                    for _ in range(rng.choices(rango_lineas, PESOS_LINEAS)[0]):
+                        pk, precio = rng.choices(productos, cum_weights=acum_productos)[0]
+                        elegidos[pk] = (precio, rng.choices((1, 2, 3), PESOS_CANTIDAD)[0])
+                    subtotal = sum((precio * cantidad_linea for precio, cantidad_linea in elegidos.values()), Decimal('0'))
+                    costo_envio = Decimal('1990') if tipo_orden == 'delivery' else Decimal('0')
+
+                    pedido = Pedido(
+                        cliente_id=rng.choices(clientes, cum_weights=acum_clientes)[0],
+                        metodo_pago_id=rng.choice(pago_ids),
+                        tipo_orden=tipo_orden,
+                        estado=estado,
+                        subtotal=subtotal,
+                        costo_envio=costo_envio,
+                        total=subtotal + costo_envio,
+                        fecha_creacion=creado,
+                    )
+                    if tipo_orden == 'delivery':
+                        pedido.direccion_entrega = f'{rng.choice(CALLES)} {rng.randrange(100, 9999)}'
+                        if estado not in ('pendiente', 'cancelado') and repartidores:
+                            pedido.repartidor_id = rng.choice(repartidores)
+                    if estado not in ('pendiente', 'cancelado'):
+                        pedido.fecha_confirmacion = creado + timedelta(minutes=rng.randrange(1, 5))
+                    if estado in ('listo', 'en_camino', 'entregado'):
+                        pedido.fecha_preparacion = creado + timedelta(minutes=rng.randrange(5, 10))
+                        pedido.fecha_listo = creado + timedelta(minutes=rng.randrange(12, 25))
+                    if estado == 'entregado':
+                        pedido.fecha_entrega = creado + timedelta(minutes=rng.randrange(25, 60))
+                    pedidos.append(pedido)
+                    lineas_por_pedido.append(elegidos)
+
+                with transaction.atomic():
+                    Pedido.objects.bulk_create(asignar_numeros(pedidos))
+                    DetallePedido.objects.bulk_create([
+                        DetallePedido(pedido_id=pedido.pk, producto_id=pk, cantidad=cantidad_linea,
+                                      precio_unitario=precio, subtotal=precio * cantidad_linea)
+                        for pedido, elegidos in zip(pedidos, lineas_por_pedido)
+                        for pk, (precio, cantidad_linea) in elegidos.items()
+                    ])
+                    Reclamo.objects.bulk_create(self._reclamos(pedidos, tasa_reclamos))
+
+                creados += tamano
+                self._log(f'  {creados}/{cantidad} pedidos', ending='\r')
+        self._log('')
+        return creados
+
+    def _reclamos(self, pedidos, tasa):
+        reclamos = []
+        for pedido in pedidos:
+            if pedido.estado == 'entregado' and self.rng.random() < tasa:
+                motivo = self.rng.choices(MOTIVOS_RECLAMO, PESOS_MOTIVOS)[0]
+                reclamos.append(Reclamo(
+                    cliente_id=pedido.cliente_id,
+                    pedido_id=pedido.pk,
+                    motivo=motivo,
+                    descripcion=f'Reclamo por {motivo.replace("_", " ")} en el pedido {pedido.numero_pedido}.',
+                    estado=self.rng.choices(['nuevo', 'en_revision', 'resuelto', 'cerrado'], [30, 20, 35, 15])[0],
+                ))
+        return reclamos
+
+
+def borrar_datos_sembrados():
+    """Elimina todo lo creado por el Sembrador (se reconoce por el prefijo)."""
+    pedidos = Pedido.objects.filter(cliente__username__startswith=f'{PREFIJO}_')
+    Reclamo.objects.filter(pedido__in=pedidos).delete()
+    DetallePedido.objects.filter(pedido__in=pedidos).delete()
+    pedidos.delete()
+    Usuario.objects.filter(username__startswith=f'{PREFIJO}_').delete()
+    Producto.objects.filter(nombre__startswith=f'{PREFIJO} ').delete()
+    Categoria.objects.filter(nombre__startswith=f'{PREFIJO} ').delete()
+
+
+# --- Datos de demostración para desarrollo ---
+
+ESTADOS_DEMO = ['confirmado', 'en_camino', 'entregado']
+
+
+def sembrar_pedidos_demo(repartidores=None):
+    """
+    Crea tres pedidos de ejemplo (confirmado, en camino y entregado hoy) a cada
+    repartidor que todavía no tenga ninguno, para que su panel muestre datos.
+
+    Es idempotente: los repartidores que ya tienen pedidos se saltan, así que
+    se puede correr cuantas veces se quiera. Devuelve la cantidad de pedidos creados.
+    """
+    if repartidores is None:
+        repartidores = Repartidor.objects.all()
+    pendientes = list(repartidores.filter(pedido__isnull=True).select_related('usuario'))
+    if not pendientes:
+        return 0
+
+    with transaction.atomic():
+        metodo, _ = MetodoPago.objects.get_or_create(
+            nombre='Efectivo (auto)', defaults={'tipo': 'efectivo', 'activo': True},
+        )
+        ahora = timezone.now()
+        creados = 0
+        for perfil in pendientes:
+            for i, estado in enumerate(ESTADOS_DEMO, start=1):
+                subtotal = Decimal('20.00') * i
+                Pedido.objects.create(
+                    cliente=perfil.usuario,
+                    repartidor=perfil,
+                    metodo_pago=metodo,
+                    tipo_orden='delivery',
+                    estado=estado,
+                    subtotal=subtotal,
+                    costo_envio=Decimal('5.00'),
+                    total=subtotal + Decimal('5.00'),
+                    fecha_entrega=ahora if estado == 'entregado' else None,
+                )
+                creados += 1
+    return creados
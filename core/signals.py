@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .busqueda import indice_clientes, indice_productos
+from .cache_catalogo import invalidar_catalogo
+from .models import Carrito, Categoria, Producto, Slide, Usuario
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=Slide)
+@receiver(post_delete, sender=Slide)
+def invalidar_cache_catalogo(sender, **kwargs):
+    """Cualquier cambio en productos, categorías o slides invalida el catálogo cacheado."""
+    # Al confirmar: si la versión subiera antes, un request concurrente podría
+    # volver a cachear el estado anterior bajo la versión nueva
+    transaction.on_commit(invalidar_catalogo)
+
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, created, **kwargs):
+    """Mantiene el índice de búsqueda al día; los cambios de stock o precio no lo tocan."""
+    if created or instance.textos_cambiaron():
+        indice_productos.actualizar(instance)
+        instance._textos_originales = (instance.nombre, instance.descripcion)
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto(sender, instance, **kwargs):
+    indice_productos.eliminar(instance.pk)
+
+
+@receiver(post_save, sender=Usuario)
+def indexar_usuario(sender, instance, created, **kwargs):
+    """Reindexa al usuario solo si cambió su username o nombre (no en cada login)."""
+    if created or instance.textos_cambiaron():
+        indice_clientes.actualizar(instance)
+        instance._textos_originales = (instance.username, instance.first_name, instance.last_name)
+
+
+@receiver(post_delete, sender=Usuario)
+def desindexar_usuario(sender, instance, **kwargs):
+    indice_clientes.eliminar(instance.pk)
+
+
+@receiver(post_save, sender=Producto)
+def recalcular_carritos_por_precio(sender, instance, created, **kwargs):
+    """Los totales guardados de los carritos usan el precio vigente: si cambia, se recalculan."""
+    if not created and instance.precio_cambio():
+        Carrito.recalcular_totales_de(Carrito.objects.filter(items__producto=instance))
+        instance._precio_original = instance.precio
+
+
+@receiver(pre_delete, sender=Producto)
+def recordar_carritos_del_producto(sender, instance, **kwargs):
+    # Los items se borran en cascada sin pasar por ItemCarrito.delete()
+    instance._carritos_afectados = list(Carrito.objects.filter(items__producto=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Producto)
+def recalcular_carritos_sin_producto(sender, instance, **kwargs):
+    carritos = getattr(instance, '_carritos_afectados', None)
+    if carritos:
+        Carrito.recalcular_totales_de(Carrito.objects.filter(pk__in=carritos))
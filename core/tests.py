@@ -0,0 +1,734 @@
+"""
+Regresiones de consultas SQL por vista y rol.
+
+Cada caso llama a una vista con cada rol (y como visitante anónimo) y
+verifica con assertNumQueries la cantidad exacta de consultas y el status
+de la respuesta, con dos volúmenes de datos: si la cantidad crece con el
+volumen (un N+1, un loop que consulta por fila) el caso falla en el volumen
+grande.
+
+Las vistas se llaman directo con RequestFactory, sin pasar por las URLs ni
+por los middlewares; así cualquier vista se puede medir aunque no tenga ruta,
+y las cifras son solo las consultas de la vista (sin la carga de la sesión y
+del usuario que hace AuthenticationMiddleware). Tampoco se renderizan las
+plantillas: `render` se reemplaza por una versión que evalúa los querysets
+del contexto (lo que haría la plantilla al recorrerlos), así que las cifras
+no dependen del HTML. El caché se vacía antes de cada llamada, así que cada
+cifra es el peor caso (caché frío).
+
+Las fábricas de datos de abajo crean todo con bulk_create dentro de la
+transacción del test.
+
+Después de los casos vienen tests de comportamiento de lo que esas vistas
+optimizan: stock y sobreventa en el checkout y el POS, numeración de
+pedidos, transiciones de estado, ETag del seguimiento, contadores de los
+repartidores, caché del catálogo e índice de búsqueda.
+"""
+
+import json
+from collections import namedtuple
+from decimal import Decimal
+from itertools import cycle
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import QuerySet, Sum
+from django.http import HttpResponse
+from django.template import engines
+from django.template.backends.django import Template as PlantillaDjango
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import ResolverMatch
+from django.utils import timezone
+
+from . import carrito as servicio_carrito
+from . import metricas, ventas, views
+from .busqueda import ids_productos, indice_productos
+from .cache_catalogo import invalidar_catalogo, obtener_version
+from .checks import eventos_con_varios_workers
+from .cocina import tablero as tablero_cocina
+from .contadores import reconciliar
+from .despacho import despachar
+from .estados import TransicionInvalida, cambiar_estado, opciones_estado, transicionar
+from .middleware import InstrumentacionMiddleware
+from .models import (
+    Carrito, Categoria, DetallePedido, ItemCarrito, MetodoPago, Pedido, Producto, Reclamo, Repartidor,
+    ResumenProductoDiario, ResumenVentaDiaria, SecuenciaPedido, Usuario,
+)
+from .numeracion import SECUENCIA_PEDIDOS, GeneradorPorBloques, asignar_numeros
+from .seguimiento import token_seguimiento
+from .ventas import StockInsuficiente, confirmar_carrito, registrar_venta_pos
+
+PREFIJO = 'QC'
+
+ESTADOS_ACTIVOS = ['confirmado', 'en_preparacion', 'listo', 'en_camino']
+
+ROLES = (None, 'cliente', 'administrador', 'cajero', 'repartidor', 'cocina')
+
+VOLUMENES = (3, 30)
+
+CACHE_AISLADO = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests-consultas',
+    }
+}
+
+
+# ========== FÁBRICAS ==========
+
+def crear_usuario(rol, username, **campos):
+    usuario = Usuario.objects.create(username=f'{PREFIJO}_{username}', rol=rol, **campos)
+    if rol == 'cliente':
+        Carrito.objects.create(usuario=usuario)
+    if rol == 'repartidor':
+        Repartidor.objects.create(usuario=usuario, vehiculo='Moto')
+    return usuario
+
+
+def crear_catalogo(cantidad, categorias=3):
+    """Crea `categorias` categorías y `cantidad` productos repartidos entre ellas."""
+    lista_categorias = Categoria.objects.bulk_create([
+        Categoria(nombre=f'{PREFIJO} categoría {i}') for i in range(categorias)
+    ])
+    productos = Producto.objects.bulk_create([
+        Producto(
+            nombre=f'{PREFIJO} producto {i}',
+            descripcion=f'Producto de prueba {i} con queso',
+            precio=Decimal(1000 + i * 10),
+            stock=100,
+            categoria=categoria,
+            en_promocion=i % 5 == 0,
+        )
+        for i, categoria in zip(range(cantidad), cycle(lista_categorias))
+    ])
+    return lista_categorias, productos
+
+
+def metodo_pago():
+    return MetodoPago.objects.get_or_create(nombre='Efectivo', defaults={'tipo': 'efectivo'})[0]
+
+
+def crear_pedidos(cantidad, cliente, productos, repartidor=None, estados=None, lineas=3):
+    """Crea `cantidad` pedidos del cliente, con `lineas` productos cada uno."""
+    estados = cycle(estados or ['pendiente'] + ESTADOS_ACTIVOS + ['entregado'])
+    ahora = timezone.now()
+    pago = metodo_pago()
+    pedidos = []
+    for _ in range(cantidad):
+        estado = next(estados)
+        pedidos.append(Pedido(
+            cliente=cliente,
+            repartidor=repartidor,
+            metodo_pago=pago,
+            tipo_orden='delivery',
+            estado=estado,
+            direccion_entrega='Av. Siempre Viva 742',
+            subtotal=Decimal('0'),
+            total=Decimal('0'),
+            fecha_entrega=ahora if estado == 'entregado' else None,
+        ))
+    pedidos = Pedido.objects.bulk_create(asignar_numeros(pedidos))
+
+    productos = cycle(productos)
+    detalles = []
+    for pedido in pedidos:
+        for _ in range(lineas):
+            producto = next(productos)
+            detalles.append(DetallePedido(
+                pedido=pedido, producto=producto, cantidad=1,
+                precio_unitario=producto.precio, subtotal=producto.precio,
+            ))
+    DetallePedido.objects.bulk_create(detalles)
+    return pedidos
+
+
+def crear_reclamos(pedidos):
+    return Reclamo.objects.bulk_create([
+        Reclamo(cliente_id=pedido.cliente_id, pedido=pedido, motivo='demora_excesiva', descripcion='Llegó frío')
+        for pedido in pedidos
+    ])
+
+
+def llenar_carrito(usuario, productos):
+    carrito = usuario.carrito
+    ItemCarrito.objects.bulk_create([ItemCarrito(carrito=carrito, producto=p, cantidad=1) for p in productos])
+    carrito.recalcular_totales()
+    return carrito
+
+
+def crear_escenario(volumen):
+    """
+    Un usuario por rol y datos que crecen con `volumen`: 10×volumen
+    productos, `volumen` pedidos del cliente (asignados al repartidor),
+    `volumen` reclamos y un carrito con `volumen` productos.
+    """
+    usuarios = {
+        'cliente': crear_usuario('cliente', 'cliente', direccion='Av. Siempre Viva 742'),
+        'administrador': crear_usuario('administrador', 'admin'),
+        'cajero': crear_usuario('cajero', 'cajero'),
+        'repartidor': crear_usuario('repartidor', 'repartidor'),
+        'cocina': crear_usuario('cocina', 'cocina'),
+    }
+    crear_usuario('cliente', 'clientelocal')
+
+    _, productos = crear_catalogo(10 * volumen)
+    pedidos = crear_pedidos(
+        volumen, usuarios['cliente'], productos, repartidor=usuarios['repartidor'].perfil_repartidor
+    )
+    crear_reclamos(pedidos)
+    llenar_carrito(usuarios['cliente'], productos[:volumen])
+    return {'usuarios': usuarios, 'productos': productos, 'pedidos': pedidos}
+
+
+# ========== CASOS ==========
+
+# `datos`, `kwargs` y `cuerpo` pueden ser funciones escenario -> valor.
+# `esperado`: {rol: (status, consultas)}; '*' vale para los roles no listados.
+Caso = namedtuple('Caso', 'vista esperado metodo datos kwargs cuerpo', defaults=('get', None, None, None))
+
+
+def _primer_pedido(estado):
+    return lambda escenario: next(pedido for pedido in escenario['pedidos'] if pedido.estado == estado)
+
+
+CASOS = [
+    Caso('home', {'*': (200, 2)}),
+    Caso('catalogo_productos_view', {'*': (200, 2)}, datos={'ver_todo': '1'}),
+    Caso('catalogo_productos_view', {'*': (200, 3)}, datos={'q': 'queso'}),
+    Caso('mis_pedidos_view', {None: (302, 0), 'cliente': (200, 3), '*': (200, 1)}),
+    Caso('ver_carrito_view', {None: (302, 0), 'cliente': (200, 2), '*': (200, 3)}),
+    Caso('admin_dashboard_view', {'administrador': (200, 6), '*': (302, 0)}),
+    Caso('admin_productos_lista', {'administrador': (200, 6), '*': (302, 0)}),
+    Caso('admin_pedidos_lista_view', {'administrador': (200, 1), '*': (302, 0)}),
+    Caso('admin_pedidos_pagina_json_view', {None: (302, 0), 'administrador': (200, 1), '*': (403, 0)}),
+    Caso('admin_pedido_detalle_view', {'administrador': (200, 4), '*': (302, 0)},
+         kwargs=lambda e: {'pk': e['pedidos'][0].pk}),
+    Caso('admin_reclamos_lista', {'administrador': (200, 1), '*': (302, 0)}),
+    Caso('admin_repartidores_lista', {'administrador': (200, 1), '*': (302, 0)}),
+    Caso('pos_view', {'administrador': (200, 2), 'cajero': (200, 2), '*': (302, 0)}),
+    Caso('buscar_pedido_view', {None: (302, 0), 'administrador': (200, 1), '*': (403, 0)},
+         datos=lambda e: {'q': e['pedidos'][0].numero_pedido}),
+    Caso('repartidor_pedidos_view', {'repartidor': (200, 2), '*': (302, 0)}),
+    Caso('repartidor_pedidos_json_view', {None: (302, 0), 'repartidor': (200, 2), '*': (403, 0)}),
+    Caso('cocina_tablero_json_view', {None: (302, 0), 'administrador': (200, 3), 'cocina': (200, 3), '*': (403, 0)}),
+    Caso('catalogo_json_async_view', {'*': (200, 2)}, datos={'q': 'queso'}),
+    Caso('producto_detalle_async_view', {'*': (200, 1)},
+         kwargs=lambda e: {'pk': e['productos'][0].pk}),
+    Caso('pedido_estado_async_view', {None: (401, 0), '*': (200, 1)},
+         kwargs=lambda e: {'numero_pedido': e['pedidos'][0].numero_pedido}),
+    Caso('buscar_pedido_async_view', {None: (401, 0), 'administrador': (200, 1), '*': (403, 0)},
+         datos=lambda e: {'q': e['pedidos'][0].numero_pedido}),
+    Caso('seguimiento_pedido_view', {'*': (200, 1)},
+         kwargs=lambda e: {'token': token_seguimiento(e['pedidos'][0].numero_pedido)}),
+    Caso('carrito_agregar_json_view', {None: (302, 0), 'cliente': (200, 6), '*': (200, 9)}, metodo='post',
+         datos=lambda e: {'product_id': e['productos'][0].pk}),
+    Caso('carrito_lote_json_view', {None: (302, 0), 'cliente': (200, 6), '*': (200, 9)}, metodo='post',
+         cuerpo=lambda e: {'lineas': [{'producto_id': p.pk, 'cantidad': 2} for p in e['productos'][:3]]}),
+    Caso('pedidos_estado_json_view',
+         {None: (302, 0), 'cliente': (403, 0), 'cajero': (403, 0), '*': (200, 5)}, metodo='post',
+         datos=lambda e: {'estado': 'en_preparacion', 'pedido_id': [_primer_pedido('confirmado')(e).pk]}),
+    Caso('admin_despachar_json_view', {None: (302, 0), 'administrador': (200, 3), '*': (403, 0)}, metodo='post'),
+]
+
+
+def _resolver(valor, escenario):
+    return valor(escenario) if callable(valor) else valor
+
+
+def llamar(caso, usuario, escenario):
+    """Llama a la vista del caso con RequestFactory, como si ya hubiera pasado por los middlewares."""
+    fabrica = RequestFactory()
+    cuerpo = _resolver(caso.cuerpo, escenario)
+    if cuerpo is not None:
+        request = fabrica.post('/', json.dumps(cuerpo), content_type='application/json')
+    else:
+        request = getattr(fabrica, caso.metodo)('/', _resolver(caso.datos, escenario) or {})
+    request.user = usuario or AnonymousUser()
+    request.session = SessionStore()
+    request._messages = FallbackStorage(request)
+
+    vista = getattr(views, caso.vista)
+    kwargs = _resolver(caso.kwargs, escenario) or {}
+    if iscoroutinefunction(vista):
+        return async_to_sync(vista)(request, **kwargs)
+    return vista(request, **kwargs)
+
+
+def render_sin_plantilla(request, plantilla, contexto=None, *args, **kwargs):
+    """Reemplazo de render para los tests: evalúa los querysets del contexto y no usa la plantilla."""
+    for valor in (contexto or {}).values():
+        if isinstance(valor, QuerySet):
+            list(valor)
+    return HttpResponse(plantilla)
+
+
+def _preparar_cache():
+    cache.clear()
+    tablero_cocina.reiniciar()
+
+
+@override_settings(CACHES=CACHE_AISLADO)
+@mock.patch('core.views.render', render_sin_plantilla)
+class ConsultasPorVistaTests(TestCase):
+
+    def test_consultas_por_vista_y_rol(self):
+        for volumen in VOLUMENES:
+            with transaction.atomic():
+                escenario = crear_escenario(volumen)
+                invalidar_catalogo()  # bulk_create no dispara señales
+                for caso in CASOS:
+                    for rol in ROLES:
+                        status, consultas = caso.esperado.get(rol, caso.esperado.get('*'))
+                        nombre = caso.vista + (f' {caso.datos}' if isinstance(caso.datos, dict) else '')
+                        with self.subTest(vista=nombre, rol=rol or 'anónimo', volumen=volumen):
+                            # Cada llamada en su savepoint: las vistas que escriben no afectan a las demás
+                            with transaction.atomic():
+                                _preparar_cache()
+                                with self.assertNumQueries(consultas):
+                                    respuesta = llamar(caso, escenario['usuarios'].get(rol), escenario)
+                                self.assertEqual(respuesta.status_code, status)
+                                transaction.set_rollback(True)
+                transaction.set_rollback(True)
+
+
+@override_settings(CACHES=CACHE_AISLADO)
+@mock.patch('core.views.render', render_sin_plantilla)
+class CacheCatalogoTests(TestCase):
+    """Con el caché caliente las páginas públicas no consultan la base."""
+
+    def setUp(self):
+        self.escenario = crear_escenario(VOLUMENES[0])
+        invalidar_catalogo()
+        _preparar_cache()
+
+    def _calentar(self, caso):
+        llamar(caso, None, self.escenario)
+
+    def test_home_anonimo(self):
+        caso = Caso('home', {})
+        self._calentar(caso)
+        with self.assertNumQueries(0):
+            llamar(caso, None, self.escenario)
+
+    def test_catalogo_anonimo(self):
+        caso = Caso('catalogo_productos_view', {}, datos={'q': 'queso'})
+        self._calentar(caso)
+        with self.assertNumQueries(0):
+            llamar(caso, None, self.escenario)
+
+    def test_catalogo_json(self):
+        caso = Caso('catalogo_json_async_view', {}, datos={'q': 'queso'})
+        self._calentar(caso)
+        with self.assertNumQueries(0):
+            respuesta = llamar(caso, None, self.escenario)
+        # El stock cambia con cada venta sin invalidar el caché: no va en la respuesta cacheada
+        self.assertNotIn('stock', json.loads(respuesta.content)['productos'][0])
+
+    def test_cambio_invalida_al_confirmar(self):
+        version = obtener_version()
+        producto = Producto.objects.get(pk=self.escenario['productos'][0].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                producto.precio += 1
+                producto.save()
+                transaction.set_rollback(True)
+        self.assertEqual(obtener_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.precio += 1
+            producto.save()
+        self.assertGreater(obtener_version(), version)
+
+
+class CarritoTests(TestCase):
+    """Las operaciones del carrito dejan líneas y totales guardados coherentes."""
+
+    def setUp(self):
+        self.escenario = crear_escenario(VOLUMENES[0])
+        self.cliente = self.escenario['usuarios']['cliente']
+        self.productos = self.escenario['productos']
+
+    def test_lote_agrega_cambia_y_quita_lineas(self):
+        p = self.productos
+        carrito, items = servicio_carrito.aplicar_cambios(self.cliente, [
+            {'producto_id': p[0].pk, 'cantidad': 3},
+            {'producto_id': p[1].pk, 'cantidad': 0},
+            {'producto_id': p[5].pk, 'cantidad': 2},
+        ])
+
+        self.assertIsNone(items[p[1].pk])
+        guardadas = dict(carrito.items.values_list('producto_id', 'cantidad'))
+        self.assertEqual(guardadas, {p[0].pk: 3, p[2].pk: 1, p[5].pk: 2})
+        self.assertEqual(ItemCarrito.objects.get(pk=items[p[5].pk].pk).producto_id, p[5].pk)
+        carrito = Carrito.objects.get(pk=carrito.pk)
+        self.assertEqual((carrito.cache_total_items, carrito.cache_total_precio), carrito.calcular_totales())
+
+    def test_sin_stock_no_aplica_ninguna_linea(self):
+        p = self.productos
+        antes = dict(self.cliente.carrito.items.values_list('producto_id', 'cantidad'))
+        with self.assertRaises(StockInsuficiente):
+            servicio_carrito.aplicar_cambios(self.cliente, [
+                {'producto_id': p[0].pk, 'cantidad': 2},
+                {'producto_id': p[5].pk, 'cantidad': p[5].stock + 1},
+            ])
+        self.assertEqual(dict(self.cliente.carrito.items.values_list('producto_id', 'cantidad')), antes)
+
+    def test_agregar_crea_el_carrito_y_suma_a_la_misma_linea(self):
+        cajero = self.escenario['usuarios']['cajero']
+        producto = self.productos[0]
+        servicio_carrito.agregar(cajero, producto.pk)
+        carrito, item = servicio_carrito.agregar(cajero, producto.pk, 2)
+
+        self.assertEqual(list(carrito.items.values_list('producto_id', 'cantidad')), [(producto.pk, 3)])
+        self.assertEqual((carrito.total_items, carrito.total_precio), (3, producto.precio * 3))
+        self.assertEqual(Carrito.objects.get(pk=carrito.pk).calcular_totales(), (3, producto.precio * 3))
+
+
+class PedidoSaveTests(TestCase):
+    """Pedido.save() y lo que arrastra (versión, resúmenes, contadores) se confirman o se deshacen juntos."""
+
+    def setUp(self):
+        self.escenario = crear_escenario(VOLUMENES[0])
+
+    def test_fallo_en_contadores_deshace_el_guardado(self):
+        pedido = Pedido.objects.get(pk=_primer_pedido('confirmado')(self.escenario).pk)
+        pedido.estado = 'en_preparacion'
+        with mock.patch('core.contadores.registrar_cambios', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                pedido.save()
+
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.estado, 'confirmado')
+        self.assertEqual(pedido.version, 0)
+
+    def test_guardado_sube_la_version(self):
+        pedido = Pedido.objects.get(pk=_primer_pedido('confirmado')(self.escenario).pk)
+        pedido.estado = 'en_preparacion'
+        pedido.save()
+        pedido.refresh_from_db()
+        self.assertEqual((pedido.estado, pedido.version), ('en_preparacion', 1))
+
+
+class DespachoTests(TestCase):
+
+    def setUp(self):
+        self.escenario = crear_escenario(VOLUMENES[0])
+        self.repartidor = self.escenario['usuarios']['repartidor'].perfil_repartidor
+        self.cola = crear_pedidos(3, self.escenario['usuarios']['cliente'], self.escenario['productos'],
+                                  estados=['confirmado'])
+
+    def test_solo_registra_los_pedidos_que_gano(self):
+        pks = [pedido.pk for pedido in self.cola]
+        otro = crear_usuario('repartidor', 'otro').perfil_repartidor
+
+        def planificar_con_carrera(pedidos, repartidores, capacidad):
+            # Una asignación manual gana el primer pedido mientras se planifica
+            Pedido.objects.filter(pk=pks[0]).update(repartidor=otro)
+            return {self.repartidor.pk: pks}
+
+        activos_antes = Repartidor.objects.get(pk=self.repartidor.pk).pedidos_activos
+        with mock.patch('core.despacho.planificar', planificar_con_carrera), \
+                mock.patch('core.despacho.publicar_cambio_pedido') as publicar:
+            asignados = despachar()
+
+        self.assertEqual(asignados, {self.repartidor.pk: pks[1:]})
+        self.assertEqual(Repartidor.objects.get(pk=self.repartidor.pk).pedidos_activos, activos_antes + 2)
+        self.assertEqual([llamada.args[0].pk for llamada in publicar.call_args_list], pks[1:])
+        self.assertEqual(Pedido.objects.get(pk=pks[0]).repartidor_id, otro.pk)
+
+
+@override_settings(CACHES=CACHE_AISLADO)
+class IndiceBusquedaTests(TestCase):
+    """El índice de búsqueda y su versión compartida cambian solo con datos confirmados."""
+
+    def setUp(self):
+        cache.clear()
+        _, productos = crear_catalogo(5)
+        self.producto = Producto.objects.get(pk=productos[0].pk)
+        indice_productos.reconstruir()
+
+    def _renombrar(self, nombre):
+        self.producto.nombre = nombre
+        self.producto.save()
+
+    def test_cambio_confirmado_se_indexa(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._renombrar('Empanada de pino')
+        self.assertEqual(ids_productos('empanada'), [self.producto.pk])
+
+    def test_cambio_revertido_no_toca_el_indice(self):
+        version = cache.get(indice_productos.clave_version)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                self._renombrar('Empanada de pino')
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(ids_productos('empanada'), [])
+        self.assertEqual(cache.get(indice_productos.clave_version), version)
+
+    def test_borrado_confirmado_sale_del_indice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._renombrar('Empanada de pino')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.delete()
+        self.assertEqual(ids_productos('empanada'), [])
+
+
+class EstadosTests(TestCase):
+
+    def setUp(self):
+        # Un pedido en cada estado del ciclo de crear_pedidos
+        self.escenario = crear_escenario(len(ESTADOS_ACTIVOS) + 2)
+        self.usuarios = self.escenario['usuarios']
+
+    def _pedido(self, estado):
+        return Pedido.objects.get(pk=_primer_pedido(estado)(self.escenario).pk)
+
+    def test_opciones_son_las_transiciones_permitidas(self):
+        admin, cocina = self.usuarios['administrador'], self.usuarios['cocina']
+        self.assertEqual([valor for valor, _ in opciones_estado(admin, 'confirmado')], ['en_preparacion', 'cancelado'])
+        self.assertEqual([valor for valor, _ in opciones_estado(cocina, 'confirmado')], ['en_preparacion'])
+        self.assertEqual(opciones_estado(admin, 'entregado'), [])
+        self.assertEqual(opciones_estado(self.usuarios['cliente']), [])
+
+    def test_detalle_admin_ofrece_solo_transiciones_validas(self):
+        pedido = self._pedido('listo')
+        contexto = {}
+
+        def capturar(request, plantilla, datos=None, *args, **kwargs):
+            contexto.update(datos)
+            return render_sin_plantilla(request, plantilla, datos)
+
+        with mock.patch('core.views.render', capturar):
+            llamar(Caso('admin_pedido_detalle_view', {}, kwargs={'pk': pedido.pk}),
+                   self.usuarios['administrador'], self.escenario)
+        self.assertEqual([valor for valor, _ in contexto['estados_posibles']], ['en_camino', 'entregado', 'cancelado'])
+
+    def test_cambiar_estado_rechaza_transicion_invalida(self):
+        pedido = self._pedido('entregado')
+        with self.assertRaises(TransicionInvalida):
+            cambiar_estado(pedido, 'confirmado')
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.estado, 'entregado')
+
+    def test_cambiar_estado_marca_la_fecha(self):
+        pedido = cambiar_estado(self._pedido('confirmado'), 'en_preparacion')
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.estado, 'en_preparacion')
+        self.assertIsNotNone(pedido.fecha_preparacion)
+
+    def test_transicionar_deja_los_que_no_pueden_pasar(self):
+        confirmado, entregado = self._pedido('confirmado'), self._pedido('entregado')
+        movidos = transicionar(Pedido.objects.filter(pk__in=[confirmado.pk, entregado.pk]), 'en_preparacion')
+        self.assertEqual([pedido.pk for pedido in movidos], [confirmado.pk])
+        self.assertEqual(Pedido.objects.get(pk=entregado.pk).estado, 'entregado')
+        with self.assertRaises(TransicionInvalida):
+            transicionar(Pedido.objects.all(), 'volando')
+
+
+class VentasTests(TestCase):
+    """El checkout y el POS descuentan stock una vez por línea y nunca lo dejan negativo."""
+
+    def setUp(self):
+        self.escenario = crear_escenario(VOLUMENES[0])
+        self.cliente = self.escenario['usuarios']['cliente']
+        self.productos = self.escenario['productos']
+
+    def _stock(self, *productos):
+        return list(Producto.objects.filter(pk__in=[p.pk for p in productos]).order_by('pk').values_list('stock', flat=True))
+
+    def test_confirmar_carrito_descuenta_stock_y_vacia_el_carrito(self):
+        en_carrito = self.productos[:VOLUMENES[0]]
+        pedido = confirmar_carrito(self.cliente.carrito, metodo_pago(), direccion_entrega='Av. Siempre Viva 742')
+
+        self.assertEqual(self._stock(*en_carrito), [99] * len(en_carrito))
+        self.assertEqual(pedido.detalles.count(), len(en_carrito))
+        self.assertEqual(pedido.subtotal, sum(p.precio for p in en_carrito))
+        carrito = Carrito.objects.get(pk=self.cliente.carrito.pk)
+        self.assertEqual((carrito.items.count(), carrito.cache_total_items), (0, 0))
+
+    def test_confirmar_carrito_sin_stock_no_crea_el_pedido(self):
+        agotado = self.productos[1]
+        Producto.objects.filter(pk=agotado.pk).update(stock=0)
+        pedidos = Pedido.objects.count()
+
+        with self.assertRaises(StockInsuficiente):
+            confirmar_carrito(self.cliente.carrito, metodo_pago(), direccion_entrega='Av. Siempre Viva 742')
+        self.assertEqual(Pedido.objects.count(), pedidos)
+        self.assertEqual(self._stock(self.productos[0], agotado), [100, 0])
+        self.assertEqual(self.cliente.carrito.items.count(), VOLUMENES[0])
+
+    def test_venta_pos_suma_lineas_repetidas(self):
+        producto = self.productos[0]
+        pedido = registrar_venta_pos(
+            [{'id': producto.pk, 'cantidad': 2}, {'id': producto.pk, 'cantidad': 1}],
+            metodo_pago(), None, 'Mesa 4', producto.precio * 3,
+        )
+        self.assertEqual(list(pedido.detalles.values_list('producto_id', 'cantidad')), [(producto.pk, 3)])
+        self.assertEqual(self._stock(producto), [97])
+
+    def test_venta_pos_no_sobrevende_con_stock_desactualizado(self):
+        producto = self.productos[0]
+        bloquear = ventas.bloquear_productos
+
+        def bloquear_y_vender_en_paralelo(cantidades):
+            # Como en SQLite: el stock leído ya no es el de la fila al descontar
+            productos = bloquear(cantidades)
+            Producto.objects.filter(pk=producto.pk).update(stock=1)
+            return productos
+
+        pedidos = Pedido.objects.count()
+        with mock.patch('core.ventas.bloquear_productos', bloquear_y_vender_en_paralelo):
+            with self.assertRaises(StockInsuficiente):
+                registrar_venta_pos([{'id': producto.pk, 'cantidad': 2}], metodo_pago(), None, 'Mesa 4',
+                                    producto.precio * 2)
+        # La venta entera se deshace, también la del "otro" que corrió en la misma transacción
+        self.assertEqual(Pedido.objects.count(), pedidos)
+        self.assertEqual(self._stock(producto), [100])
+
+
+@override_settings(CACHES=CACHE_AISLADO)
+class SeguimientoTests(TestCase):
+    """El seguimiento público responde 304 mientras el pedido no cambie."""
+
+    def setUp(self):
+        _preparar_cache()
+        self.escenario = crear_escenario(VOLUMENES[0])
+        self.pedido = Pedido.objects.get(pk=_primer_pedido('confirmado')(self.escenario).pk)
+
+    def _consultar(self, **cabeceras):
+        request = RequestFactory().get('/', **cabeceras)
+        return async_to_sync(views.seguimiento_pedido_view)(request, token_seguimiento(self.pedido.numero_pedido))
+
+    def test_etag_vigente_responde_304(self):
+        primera = self._consultar()
+        self.assertEqual(primera.status_code, 200)
+        etag = primera['ETag']
+
+        self.assertEqual(self._consultar(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self._consultar(HTTP_IF_NONE_MATCH=f'W/{etag}').status_code, 304)
+        self.assertEqual(self._consultar(HTTP_IF_NONE_MATCH='"otro"').status_code, 200)
+
+    def test_cambio_de_estado_cambia_el_etag(self):
+        etag = self._consultar()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            cambiar_estado(self.pedido, 'en_preparacion')
+
+        respuesta = self._consultar(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(json.loads(respuesta.content)['pedido']['estado'], 'en_preparacion')
+
+
+class ContadoresTests(TestCase):
+    """Los contadores de carga del repartidor coinciden con sus pedidos."""
+
+    def setUp(self):
+        # Un pedido en cada estado, creados con bulk_create (sin pasar por los contadores)
+        self.escenario = crear_escenario(len(ESTADOS_ACTIVOS) + 2)
+        self.repartidor = self.escenario['usuarios']['repartidor'].perfil_repartidor
+
+    def _contadores(self):
+        repartidor = Repartidor.objects.get(pk=self.repartidor.pk)
+        return repartidor.pedidos_activos, repartidor.pedidos_en_camino, repartidor.entregas_de_hoy
+
+    def test_reconciliar_corrige_los_desfasados(self):
+        self.assertEqual(reconciliar(), 1)
+        self.assertEqual(self._contadores(), (len(ESTADOS_ACTIVOS), 1, 1))
+        self.assertEqual(reconciliar(), 0)
+
+    def test_cambios_de_estado_mantienen_los_contadores(self):
+        reconciliar()
+        cambiar_estado(Pedido.objects.get(pk=_primer_pedido('listo')(self.escenario).pk), 'en_camino')
+        cambiar_estado(Pedido.objects.get(pk=_primer_pedido('en_camino')(self.escenario).pk), 'entregado')
+        self.assertEqual(self._contadores(), (len(ESTADOS_ACTIVOS) - 1, 1, 2))
+        self.assertEqual(reconciliar(), 0)
+
+
+class ResumenesTests(TestCase):
+    """Los resúmenes diarios se mueven con los pedidos aunque la fila de origen no exista."""
+
+    def setUp(self):
+        self.escenario = crear_escenario(VOLUMENES[0])
+
+    def test_cambio_de_estado_sin_fila_de_origen_no_cuenta_dos_veces(self):
+        # Los pedidos de crear_pedidos se insertan con bulk_create: no están en el resumen
+        pedido = Pedido.objects.get(pk=_primer_pedido('confirmado')(self.escenario).pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            cambiar_estado(pedido, 'en_preparacion')
+
+        filas = dict(ResumenVentaDiaria.objects.values_list('estado', 'cantidad_pedidos'))
+        self.assertEqual(filas, {'confirmado': -1, 'en_preparacion': 1})
+        self.assertEqual(ResumenProductoDiario.objects.aggregate(total=Sum('cantidad'))['total'], 0)
+
+
+class ChecksTests(TestCase):
+
+    @override_settings(WEB_CONCURRENCY=4, BROKER_EVENTOS_PEDIDOS='core.eventos.BrokerLocal')
+    def test_varios_workers_con_broker_local(self):
+        self.assertEqual([aviso.id for aviso in eventos_con_varios_workers(None)], ['core.W001'])
+
+    @override_settings(WEB_CONCURRENCY=4, BROKER_EVENTOS_PEDIDOS='core.eventos.BrokerCache', CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/cosmofood'},
+    })
+    def test_varios_workers_con_broker_compartido(self):
+        self.assertEqual(eventos_con_varios_workers(None), [])
+
+
+class InstrumentacionTests(TestCase):
+    """El middleware mide el render de plantillas sin dejar Template.render reemplazado."""
+
+    def test_render_se_mide_solo_durante_el_request(self):
+        render_original = PlantillaDjango.render
+        durante = []
+
+        def vista(request):
+            durante.append(PlantillaDjango.render is not render_original)
+            return HttpResponse(engines['django'].from_string('{{ n }}').render({'n': 1}))
+
+        request = RequestFactory().get('/')
+        request.resolver_match = ResolverMatch(vista, (), {})
+        with mock.patch.object(metricas, 'registrar') as registrar:
+            InstrumentacionMiddleware(vista)(request)
+
+        self.assertEqual(durante, [True])
+        self.assertIs(PlantillaDjango.render, render_original)
+        vista_medida, _, _, tiempo_plantillas, _, _ = registrar.call_args.args
+        self.assertEqual(vista_medida, 'vista')
+        self.assertGreater(tiempo_plantillas, 0)
+
+
+class NumeracionTests(TestCase):
+    """Los tests corren dentro de una transacción, como un checkout."""
+
+    def setUp(self):
+        self.generador = GeneradorPorBloques(tamano_bloque=10)
+
+    def _numeros(self, cantidad):
+        return [int(self.generador.siguiente()) for _ in range(cantidad)]
+
+    def test_sin_huecos_ni_repetidos_en_una_transaccion(self):
+        numeros = self._numeros(3) + [int(numero) for numero in self.generador.reservar(4)]
+        self.assertEqual(numeros, list(range(numeros[0], numeros[0] + 7)))
+        self.assertEqual(SecuenciaPedido.objects.get(nombre=SECUENCIA_PEDIDOS).ultimo, numeros[-1])
+
+    def test_rollback_devuelve_los_numeros(self):
+        with transaction.atomic():
+            revertido = self._numeros(1)[0]
+            transaction.set_rollback(True)
+        # No quedó un bloque en memoria con números de la reserva revertida
+        self.assertEqual(self._numeros(1)[0], revertido)
+
+    def test_fuera_de_sqlite_reserva_en_otra_conexion(self):
+        en_el_hilo = mock.Mock(side_effect=lambda funcion, *args: funcion(*args))
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch('core.numeracion._en_otra_conexion', en_el_hilo):
+            numeros = self._numeros(12)
+        self.assertEqual(numeros, list(range(numeros[0], numeros[0] + 12)))
+        # Dos bloques de 10, no una reserva por pedido
+        self.assertEqual(en_el_hilo.call_count, 2)
@@ -0,0 +1,170 @@
+"""
+Motor de checkout: crea las líneas de un pedido y descuenta stock en lote.
+
+En vez de un `select_for_update().get()` + `create()` + `save()` por cada
+línea, aquí se hace:
+
+1. un solo SELECT ... FOR UPDATE de todos los productos, ordenado por pk
+   (todas las cajas bloquean en el mismo orden, así no hay deadlocks),
+2. la validación de stock de todas las líneas a la vez,
+3. un bulk_create de los DetallePedido,
+4. un UPDATE condicional `stock = stock - n WHERE stock >= n` por producto.
+
+Lo usan el POS (registrar_venta_pos) y el checkout del carrito (confirmar_carrito).
+"""
+
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from .cache_catalogo import invalidar_catalogo
+from .models import DetallePedido, Pedido, Producto
+from .resumenes import registrar_detalles
+
+
+class StockInsuficiente(ValueError):
+    """No hay stock para una o más líneas del pedido."""
+
+
+def agrupar_lineas(items):
+    """
+    Convierte una lista de {'id': producto_id, 'cantidad': n} en un dict
+    ordenado por pk {producto_id: cantidad}, sumando productos repetidos.
+    """
+    cantidades = {}
+    for item in items:
+        producto_id = int(item['id'])
+        cantidad = int(item['cantidad'])
+        if cantidad < 1:
+            raise ValueError('La cantidad debe ser al menos 1.')
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+    return OrderedDict(sorted(cantidades.items()))
+
+
+def bloquear_productos(cantidades):
+    """
+    Bloquea y devuelve {pk: Producto} para las cantidades pedidas, validando
+    el stock de todas las líneas juntas. Debe llamarse dentro de una transacción.
+    """
+    productos = {
+        producto.pk: producto
+        for producto in Producto.objects.select_for_update().filter(pk__in=list(cantidades)).order_by('pk')
+    }
+    if len(productos) != len(cantidades):
+        raise Producto.DoesNotExist('Uno de los productos seleccionados ya no existe.')
+
+    inactivos = [producto.nombre for producto in productos.values() if not producto.activo]
+    if inactivos:
+        raise ValueError('Productos no disponibles actualmente: ' + ', '.join(inactivos))
+
+    sin_stock = [
+        f'{producto.nombre} (disponible: {producto.stock}, pedido: {cantidades[pk]})'
+        for pk, producto in productos.items()
+        if producto.stock < cantidades[pk]
+    ]
+    if sin_stock:
+        raise StockInsuficiente('Stock insuficiente para ' + ', '.join(sin_stock))
+    return productos
+
+
+def crear_detalles_y_descontar_stock(pedido, productos, cantidades):
+    """
+    Inserta las líneas del pedido con bulk_create y descuenta el stock con un
+    UPDATE condicional por producto. Debe llamarse dentro de una transacción.
+    """
+    detalles = [
+        DetallePedido(
+            pedido=pedido,
+            producto=productos[pk],
+            cantidad=cantidad,
+            precio_unitario=productos[pk].precio,
+            # bulk_create no llama a save(), así que calculamos el subtotal aquí
+            subtotal=productos[pk].precio * cantidad,
+        )
+        for pk, cantidad in cantidades.items()
+    ]
+    DetallePedido.objects.bulk_create(detalles)
+
+    agotados = False
+    for pk, cantidad in cantidades.items():
+        actualizados = Producto.objects.filter(pk=pk, stock__gte=cantidad).update(stock=F('stock') - cantidad)
+        if not actualizados:
+            # Solo pasa si otro proceso descontó sin bloquear (p. ej. en SQLite)
+            raise StockInsuficiente(f'Stock insuficiente para {productos[pk].nombre}')
+        agotados = agotados or productos[pk].stock - cantidad <= 0
+
+    registrar_detalles(pedido, detalles)
+    # El UPDATE masivo no dispara señales: si algún producto se agotó, el
+    # catálogo cacheado ya no es válido.
+    if agotados:
+        transaction.on_commit(invalidar_catalogo)
+    return detalles
+
+
+def registrar_venta_pos(items, metodo_pago, cliente, nombre_referencia, total):
+    """Crea la venta del POS con sus líneas y descuenta el stock en una sola transacción."""
+    cantidades = agrupar_lineas(items)
+    if not cantidades:
+        raise ValueError('La venta no tiene productos.')
+
+    with transaction.atomic():
+        # El pedido se inserta antes de bloquear productos para que los
+        # bloqueos duren lo menos posible.
+        pedido = Pedido.objects.create(
+            cliente=cliente,
+            nombre_referencia_cliente=nombre_referencia,
+            metodo_pago=metodo_pago,
+            tipo_orden='local',                       # Tipo de orden para POS
+            estado='en_preparacion',                  # Estado inicial del POS
+            subtotal=total,                           # Asume que el total JS es el subtotal
+            costo_envio=0,                            # Sin costo de envío para POS
+            total=total,
+        )
+        productos = bloquear_productos(cantidades)
+        crear_detalles_y_descontar_stock(pedido, productos, cantidades)
+    return pedido
+
+
+def confirmar_carrito(carrito, metodo_pago, tipo_orden='delivery', direccion_entrega=None,
+                      referencia_direccion=None, notas_cliente=None, costo_envio=Decimal('0')):
+    """
+    Convierte el carrito en un Pedido con sus DetallePedido, descuenta el
+    stock y vacía el carrito, todo en una transacción.
+
+    Muchos checkouts concurrentes sobre el mismo producto no pueden sobrevender:
+    solo se bloquean las filas de los productos del carrito y el UPDATE de
+    stock es condicional.
+    """
+    with transaction.atomic():
+        # Mismo orden de bloqueo que core/carrito.py: primero el carrito
+        carrito.bloquear()
+        cantidades = agrupar_lineas(
+            {'id': producto_id, 'cantidad': cantidad}
+            for producto_id, cantidad in carrito.items.values_list('producto_id', 'cantidad')
+        )
+        if not cantidades:
+            raise ValueError('Tu carrito está vacío.')
+
+        productos = bloquear_productos(cantidades)
+        subtotal = sum((productos[pk].precio * cantidad for pk, cantidad in cantidades.items()), Decimal('0'))
+        costo_envio = Decimal(costo_envio) if tipo_orden == 'delivery' else Decimal('0')
+
+        pedido = Pedido.objects.create(
+            cliente=carrito.usuario,
+            metodo_pago=metodo_pago,
+            tipo_orden=tipo_orden,
+            estado='pendiente',
+            direccion_entrega=direccion_entrega if tipo_orden == 'delivery' else None,
+            referencia_direccion=referencia_direccion,
+            notas_cliente=notas_cliente,
+            subtotal=subtotal,
+            costo_envio=costo_envio,
+            total=subtotal + costo_envio,
+        )
+        crear_detalles_y_descontar_stock(pedido, productos, cantidades)
+
+        # Vaciar el carrito con un solo DELETE (y sus totales en cero)
+        carrito.vaciar()
+    return pedido
@@ -1,3 +1,4 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
@@ -6,16 +7,34 @@ from django.core.mail import send_mail
 from django.contrib import messages
 from django.db import models
 from django.db import transaction
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from .forms import ( 
     RegistroForm, LoginForm, PerfilForm, ProductoForm,
     RecuperarPasswordForm, ResetPasswordForm
 )
 from .models import Carrito, Producto, Usuario, Categoria, ItemCarrito, Pedido, Slide,MetodoPago, DetallePedido,Reclamo,Repartidor
 from .forms import RepartidorForm
+from .estadisticas import calcular_metricas_dashboard, VENTANAS_DIAS
+from .fechas import rango_dia
+from .busqueda import LIMITE_RESULTADOS, ids_clientes, ids_productos
+from .cocina import tablero as tablero_cocina
+from .despacho import despachar
+from .estados import TransicionInvalida, cambiar_estado, destinos_permitidos, opciones_estado, transicionar
+from .numeracion import formatear as formatear_numero_pedido
+from .paginacion import pagina_keyset
+from .ventas import confirmar_carrito, registrar_venta_pos
+from . import carrito as servicio_carrito
+from . import metricas
+from . import eventos as eventos_pedidos
+from . import seguimiento
+from .cache_catalogo import (
+    aproductos_catalogo, categorias_activas, productos_catalogo, productos_promocion,
+    respuesta_anonima_cacheada, slides_activos
+)
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.tokens import default_token_generator
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.http import parse_etags, urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.contrib.sites.shortcuts import get_current_site
 from django.utils import timezone
@@ -24,29 +43,25 @@ from decimal import Decimal
 from django.db.models import Sum    
 from datetime import timedelta
 import json
+import time
 
 
 def home(request):
-    slides = Slide.objects.filter(activo=True).order_by('orden')
-    # Obtener productos en promoción (máximo 6 para el carrusel)
-    productos_promocion = Producto.objects.filter(
-        activo=True,
-        en_promocion=True,
-        stock__gt=0
-    ).select_related('categoria').order_by('-fecha_actualizacion')[:6]
+    def generar():
+        contexto = {
+            'slides': slides_activos(),
+            # Productos en promoción (máximo 6 para el carrusel)
+            'productos_promocion': productos_promocion()
+        }
+        return render(request, 'core/home.html', contexto)
 
-    contexto = {
-        'slides': slides,
-        'productos_promocion': productos_promocion
-    }
-    return render(request, 'core/home.html', contexto)
+    # Los visitantes anónimos reciben la página completa desde el caché
+    return respuesta_anonima_cacheada(request, 'home', (), generar)
 
 
 def catalogo_productos_view(request):
     """Vista para que los clientes y visitantes vean el catálogo de productos (HU10)"""
     
-    productos = Producto.objects.none()
-    
     busqueda = request.GET.get('q', '')
     
     # Filtro por categoría
@@ -54,24 +69,23 @@ def catalogo_productos_view(request):
     
     # Ver todo
     ver_todo = request.GET.get('ver_todo')
-    
-    # Solo mostramos productos si hay algún filtro activo
-    if busqueda or categoria_id or ver_todo:
-        productos = Producto.objects.filter(activo=True, stock__gt=0).select_related('categoria').order_by('nombre')
-        
-        if busqueda:
-            productos = productos.filter(nombre__icontains=busqueda)
-        
-        if categoria_id:
-            productos = productos.filter(categoria_id=categoria_id)
-    
-    contexto = {
-        'productos': productos,
-        'categorias': Categoria.objects.filter(activo=True),
-        'busqueda': busqueda,
-        'categoria_seleccionada': categoria_id
-    }
-    return render(request, 'core/catalogo_productos.html', contexto)
+
+    def generar():
+        productos = []
+        # Solo mostramos productos si hay algún filtro activo
+        if busqueda or categoria_id or ver_todo:
+            productos = productos_catalogo(busqueda, categoria_id)
+
+        contexto = {
+            'productos': productos,
+            'categorias': categorias_activas(),
+            'busqueda': busqueda,
+            'categoria_seleccionada': categoria_id
+        }
+        return render(request, 'core/catalogo_productos.html', contexto)
+
+    partes = (busqueda, categoria_id or '', bool(ver_todo))
+    return respuesta_anonima_cacheada(request, 'catalogo', partes, generar)
 
 # ========== AUTENTICACIÓN ==========
 
@@ -117,43 +131,6 @@ def login_view(request):
                 login(request, user)
                 messages.success(request, f'¡Bienvenido de nuevo, {user.first_name}!')
                 
-                # --- Crear pedidos de ejemplo para repartidor en entorno de desarrollo ---
-                # Esto ayuda a que al iniciar sesión como repartidor (en DEBUG)
-                # el dashboard muestre datos sin necesidad de seed manual.
-                try:
-                    from core.models import Pedido, MetodoPago, Repartidor
-                    if settings.DEBUG and user.rol == 'repartidor':
-                        # Asegurarnos de tener el perfil de repartidor
-                        try:
-                            perfil = user.perfil_repartidor
-                        except Repartidor.DoesNotExist:
-                            perfil = None
-
-                        if perfil and not Pedido.objects.filter(repartidor=perfil).exists():
-                            mp, _ = MetodoPago.objects.get_or_create(nombre='Efectivo (auto)', defaults={'tipo': 'efectivo', 'activo': True})
-                            base = int(timezone.now().timestamp()) % 100000
-                            # Crear 3 pedidos de ejemplo: confirmado, en_camino, entregado (hoy)
-                            estados_demo = ['confirmado', 'en_camino', 'entregado']
-                            for i, estado in enumerate(estados_demo, start=1):
-                                numero = f"{user.username.upper()}{base}{i}"
-                                p = Pedido.objects.create(
-                                    cliente=user,
-                                    repartidor=perfil,
-                                    metodo_pago=mp,
-                                    numero_pedido=numero,
-                                    tipo_orden='delivery',
-                                    estado=estado,
-                                    subtotal=Decimal('20.00') * i,
-                                    costo_envio=Decimal('5.00'),
-                                    total=Decimal('20.00') * i + Decimal('5.00')
-                                )
-                                if estado == 'entregado':
-                                    p.fecha_entrega = timezone.now()
-                                    p.save()
-                except Exception:
-                    # No romper el login si algo falla al crear demo data
-                    pass
-
                 # Redirigir según el rol del usuario
                 if user.rol == 'administrador':
                     return redirect('admin_dashboard')
@@ -305,10 +282,60 @@ def ver_carrito_view(request):
 
     contexto = {
         'carrito': carrito,
-        'items': items
+        'items': items,
+        # Para el formulario de checkout
+        'metodos_pago': MetodoPago.objects.filter(activo=True).order_by('nombre'),
+        'tipos_orden': Pedido.TIPO_ORDEN_CHOICES,
     }
     return render(request, 'core/carrito.html', contexto)
 
+@login_required
+def checkout_view(request):
+    """Convierte el carrito del usuario en un pedido (POST desde la página del carrito)."""
+    if request.method != 'POST':
+        return redirect('ver_carrito')
+
+    try:
+        carrito = request.user.carrito
+    except Carrito.DoesNotExist:
+        messages.error(request, 'Tu carrito está vacío.')
+        return redirect('ver_carrito')
+
+    tipo_orden = request.POST.get('tipo_orden', 'delivery')
+    if tipo_orden not in dict(Pedido.TIPO_ORDEN_CHOICES):
+        messages.error(request, 'Tipo de orden no válido.')
+        return redirect('ver_carrito')
+
+    direccion = request.POST.get('direccion_entrega', '').strip() or request.user.direccion
+    if tipo_orden == 'delivery' and not direccion:
+        messages.error(request, 'Debes indicar una dirección de entrega.')
+        return redirect('ver_carrito')
+
+    metodo_pago = MetodoPago.objects.filter(pk=request.POST.get('metodo_pago'), activo=True).first()
+    if not metodo_pago:
+        messages.error(request, 'Selecciona un método de pago válido.')
+        return redirect('ver_carrito')
+
+    try:
+        pedido = confirmar_carrito(
+            carrito,
+            metodo_pago=metodo_pago,
+            tipo_orden=tipo_orden,
+            direccion_entrega=direccion,
+            referencia_direccion=request.POST.get('referencia_direccion', '').strip() or None,
+            notas_cliente=request.POST.get('notas_cliente', '').strip() or None,
+            costo_envio=settings.COSTO_ENVIO_DELIVERY,
+        )
+    except Producto.DoesNotExist:
+        messages.error(request, 'Uno de los productos de tu carrito ya no existe.')
+        return redirect('ver_carrito')
+    except ValueError as e:
+        messages.error(request, f'No se pudo confirmar el pedido: {e}')
+        return redirect('ver_carrito')
+
+    messages.success(request, f'¡Pedido #{pedido.numero_pedido} recibido! Total: ${pedido.total}.')
+    return redirect('mis_pedidos')
+
 @login_required
 def agregar_al_carrito_view(request):
 
@@ -408,6 +435,112 @@ def eliminar_item_carrito_view(request):
             messages.error(request, "Acción no permitida.")
     return redirect('ver_carrito')
 
+# ========== CARRITO (JSON) ==========
+# Versiones JSON de las vistas anteriores: responden con la línea modificada
+# y los totales del carrito, sin redirigir ni renderizar la página completa.
+
+def _item_json(item):
+    if item is None:
+        return None
+    return {
+        'id': item.pk,
+        'producto_id': item.producto_id,
+        'nombre': item.producto.nombre,
+        'cantidad': item.cantidad,
+        'precio_unitario': str(item.producto.precio),
+        'subtotal': str(item.subtotal),
+    }
+
+def _respuesta_carrito(carrito, **datos):
+    return JsonResponse({
+        'success': True,
+        **datos,
+        'carrito': {'total_items': carrito.total_items, 'total_precio': str(carrito.total_precio)},
+    })
+
+def _entero_post(request, campo, defecto=None):
+    valor = request.POST.get(campo, defecto)
+    if valor is None:
+        raise ValueError(f'Falta el parámetro "{campo}".')
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f'El parámetro "{campo}" debe ser un número entero.')
+
+def _lineas_lote(body):
+    """Valida el body de carrito_lote_json_view y devuelve sus líneas con cantidades enteras."""
+    try:
+        datos = json.loads(body or b'{}')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise ValueError('JSON inválido')
+    lineas = datos.get('lineas', []) if isinstance(datos, dict) else None
+    if not isinstance(lineas, list):
+        raise ValueError('"lineas" debe ser una lista.')
+
+    validas = []
+    for linea in lineas:
+        if not isinstance(linea, dict) or 'producto_id' not in linea or 'cantidad' not in linea:
+            raise ValueError('Cada línea necesita "producto_id" y "cantidad".')
+        try:
+            validas.append({'producto_id': int(linea['producto_id']), 'cantidad': int(linea['cantidad'])})
+        except (TypeError, ValueError):
+            raise ValueError('"producto_id" y "cantidad" deben ser números enteros.')
+    return validas
+
+def _modificar_carrito_json(request, operacion):
+    """Ejecuta `operacion()` y traduce sus errores a respuestas JSON."""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
+
+    try:
+        return operacion()
+    except (Producto.DoesNotExist, ItemCarrito.DoesNotExist) as e:
+        return JsonResponse({'success': False, 'error': str(e) or 'No encontrado'}, status=404)
+    except ValueError as e:
+        # Parámetros mal formados, StockInsuficiente y cantidades no permitidas
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+@login_required
+def carrito_agregar_json_view(request):
+    """POST product_id, cantidad: suma unidades de un producto al carrito."""
+    def operacion():
+        carrito, item = servicio_carrito.agregar(
+            request.user, _entero_post(request, 'product_id'), _entero_post(request, 'cantidad', 1)
+        )
+        return _respuesta_carrito(carrito, item=_item_json(item))
+    return _modificar_carrito_json(request, operacion)
+
+@login_required
+def carrito_cantidad_json_view(request):
+    """POST item_id, cantidad: fija la cantidad de una línea (0 la elimina)."""
+    def operacion():
+        carrito, item = servicio_carrito.fijar_cantidad(
+            request.user, _entero_post(request, 'item_id'), _entero_post(request, 'cantidad')
+        )
+        return _respuesta_carrito(carrito, item=_item_json(item))
+    return _modificar_carrito_json(request, operacion)
+
+@login_required
+def carrito_quitar_json_view(request):
+    """POST item_id: elimina una línea del carrito."""
+    def operacion():
+        carrito = servicio_carrito.quitar(request.user, _entero_post(request, 'item_id'))
+        return _respuesta_carrito(carrito, item=None)
+    return _modificar_carrito_json(request, operacion)
+
+@login_required
+def carrito_lote_json_view(request):
+    """
+    Body JSON {"lineas": [{"producto_id": 1, "cantidad": 2}, ...]}: fija varias
+    cantidades en una sola transacción (si una falla, no se aplica ninguna).
+    """
+    def operacion():
+        carrito, items = servicio_carrito.aplicar_cambios(request.user, _lineas_lote(request.body))
+        return _respuesta_carrito(carrito, items={
+            str(producto_id): _item_json(item) for producto_id, item in items.items()
+        })
+    return _modificar_carrito_json(request, operacion)
+
 # ========== DASHBOARD (ADMIN) ==========
 
 @login_required
@@ -438,76 +571,24 @@ def admin_dashboard_view(request):
         
         return redirect('admin_dashboard')
 
-    # --- Cálculos para las Tarjetas KPI ---
-    today = timezone.now().date()
-
-    # 1. Ventas de Hoy
-    ventas_hoy = Pedido.objects.filter(
-        fecha_creacion__date=today,
-        estado__in=['confirmado', 'en_preparacion', 'listo', 'en_camino', 'entregado']
-    ).aggregate(total_ventas=Sum('total'))['total_ventas'] or 0
-
-    # 2. Pedidos de Hoy
-    pedidos_hoy = Pedido.objects.filter(fecha_creacion__date=today).count()
-
-    # 3. Clientes Totales
-    total_clientes = Usuario.objects.filter(rol='cliente').count()
-
-    # 4. Productos Activos
-    total_productos_activos = Producto.objects.filter(activo=True).count()
-
-    # 5. Pedidos pendientes para la lista
-    pedidos_recientes = Pedido.objects.filter(
-        estado__in=['confirmado', 'en_preparacion']
-    ).order_by('-fecha_creacion')[:5] # Los 5 más recientes
-
-    # --- Cálculo para el Gráfico "Ventas de la Semana" ---
-    # Diccionario para traducir días al español
-    dias_espanol = {
-        'Mon': 'Lun', 'Tue': 'Mar', 'Wed': 'Mié', 
-        'Thu': 'Jue', 'Fri': 'Vie', 'Sat': 'Sáb', 'Sun': 'Dom'
-    }
-    
-    dias = []
-    ventas_por_dia = []
-    for i in range(7):
-        dia = today - timedelta(days=i)
-        dia_ingles = dia.strftime('%a')  # Obtiene día en inglés (Mon, Tue, etc.)
-        dia_espanol = dias_espanol.get(dia_ingles, dia_ingles)  # Traduce al español
-        dias.append(dia_espanol)
-        ventas_dia = Pedido.objects.filter(
-            fecha_creacion__date=dia,
-            estado__in=['confirmado', 'en_preparacion', 'listo', 'en_camino', 'entregado']
-        ).aggregate(total=Sum('total'))['total'] or 0
-        ventas_por_dia.append(float(ventas_dia))
-    dias.reverse()
-    ventas_por_dia.reverse()
-
-    detalles_hoy = DetallePedido.objects.filter(
-        pedido__fecha_creacion__date=today,
-        pedido__estado__in=['confirmado', 'en_preparacion', 'listo', 'en_camino', 'entregado']
-    )
-    productos_populares_hoy = detalles_hoy.values('producto__nombre') \
-                                          .annotate(cantidad_vendida=Sum('cantidad')) \
-                                          .order_by('-cantidad_vendida')[:5]
-    productos_bajo_stock = Producto.objects.filter(
-        activo=True,
-        stock__lte=10
-    ).select_related('categoria').order_by('stock', 'nombre')[:10]  # Los 10 con menos stock
+    # --- Cálculos para las Tarjetas KPI y el gráfico de ventas ---
+    # Ventana del gráfico: 7, 30 o 90 días (?dias=30)
+    datos = calcular_metricas_dashboard(request.GET.get('dias'))
 
     contexto = {
-        'ventas_hoy': ventas_hoy,
-        'pedidos_hoy': pedidos_hoy,
-        'total_clientes': total_clientes,
-        'total_productos_activos': total_productos_activos,
-        'pedidos_recientes': pedidos_recientes,
+        'ventas_hoy': datos['ventas_hoy'],
+        'pedidos_hoy': datos['pedidos_hoy'],
+        'total_clientes': datos['total_clientes'],
+        'total_productos_activos': datos['total_productos_activos'],
+        'pedidos_recientes': datos['pedidos_recientes'],
         'titulo': 'Dashboard',
         # Datos para gráfico de ventas
-        'chart_labels': json.dumps(dias),
-        'chart_data': json.dumps(ventas_por_dia),
-        # --- NUEVA VARIABLE AÑADIDA ---
-        'productos_populares': productos_populares_hoy,
-        'productos_bajo_stock': productos_bajo_stock,  # Nueva variable
+        'chart_labels': json.dumps(datos['chart_labels']),
+        'chart_data': json.dumps(datos['chart_data']),
+        'ventana_dias': datos['ventana_dias'],
+        'ventanas_disponibles': VENTANAS_DIAS,
+        'productos_populares': datos['productos_populares'],
+        'productos_bajo_stock': datos['productos_bajo_stock'],
     }
 
     return render(request, 'core/admin/dashboard.html', contexto)
@@ -538,11 +619,20 @@ def admin_productos_lista(request):
     
     # Búsqueda
     busqueda = request.GET.get('q', '')
+    busqueda_truncada = False
     if busqueda:
-        productos_filtrados = productos_filtrados.filter(
-            models.Q(nombre__icontains=busqueda) | 
-            models.Q(descripcion__icontains=busqueda) 
-        )
+        # Índice de búsqueda en memoria en vez de icontains sobre nombre y descripción.
+        # La lista no tiene paginación: se muestran los LIMITE_RESULTADOS más
+        # relevantes y se avisa si había más (se pide uno extra para saberlo).
+        ids = ids_productos(busqueda, LIMITE_RESULTADOS + 1)
+        busqueda_truncada = len(ids) > LIMITE_RESULTADOS
+        productos_filtrados = productos_filtrados.filter(pk__in=ids[:LIMITE_RESULTADOS])
+        if busqueda_truncada:
+            messages.warning(
+                request,
+                f'La búsqueda "{busqueda}" coincide con más de {LIMITE_RESULTADOS} productos; '
+                f'se muestran los {LIMITE_RESULTADOS} más relevantes. Agrega más términos para acotarla.'
+            )
     
     # Filtro por categoría (usando el ID)
     categoria_id = request.GET.get('categoria')
@@ -576,6 +666,7 @@ def admin_productos_lista(request):
         'productos': productos_filtrados, 
         'categorias': Categoria.objects.filter(activo=True).order_by('nombre'),
         'busqueda': busqueda,
+        'busqueda_truncada': busqueda_truncada,
         'categoria_seleccionada': categoria_id, 
         'status_filter': status_filter, 
         'sort_by': sort_by, 
@@ -665,23 +756,23 @@ def admin_producto_desactivar(request, pk):
 
 # ========== GESTIÓN DE PEDIDOS (ADMIN) ==========
 
-@login_required
-def admin_pedidos_lista_view(request):
-    """Vista para que el admin vea y filtre todos los pedidos."""
-    if request.user.rol != 'administrador':
-        messages.error(request, 'No tienes permisos para acceder aquí.')
-        return redirect('home')
-
-    pedidos = Pedido.objects.all().select_related('cliente').order_by('-fecha_creacion')
+def _pagina_pedidos_admin(request):
+    """Filtra los pedidos según la URL y devuelve una página por cursor."""
+    pedidos = Pedido.objects.all().select_related('cliente')
 
-    # Búsqueda
-    busqueda = request.GET.get('q', '')
+    # Búsqueda: número de pedido exacto o cliente por el índice de búsqueda.
+    # El número se compara por igualdad para usar el índice único (un LIKE
+    # '%123%' recorre la tabla entera en cada página). Los números nuevos van
+    # con ceros a la izquierda ('00000123'), así que "123" se busca también
+    # completado; los antiguos (10 dígitos) se buscan tal cual.
+    busqueda = request.GET.get('q', '').strip()
     if busqueda:
+        numeros = {busqueda}
+        if busqueda.isdigit():
+            numeros.add(formatear_numero_pedido(int(busqueda)))
         pedidos = pedidos.filter(
-            models.Q(numero_pedido__icontains=busqueda) |
-            models.Q(cliente__username__icontains=busqueda) |
-            models.Q(cliente__first_name__icontains=busqueda) |
-            models.Q(cliente__last_name__icontains=busqueda)
+            models.Q(numero_pedido__in=numeros) |
+            models.Q(cliente_id__in=ids_clientes(busqueda))
         )
 
     # Filtro por estado
@@ -689,14 +780,78 @@ def admin_pedidos_lista_view(request):
     if estado_filtro:
         pedidos = pedidos.filter(estado=estado_filtro)
 
+    pagina, siguiente_cursor = pagina_keyset(pedidos, request.GET.get('cursor'))
+    return pagina, siguiente_cursor, busqueda, estado_filtro
+
+@login_required
+def admin_pedidos_lista_view(request):
+    """Vista para que el admin vea y filtre todos los pedidos (paginados por cursor)."""
+    if request.user.rol != 'administrador':
+        messages.error(request, 'No tienes permisos para acceder aquí.')
+        return redirect('home')
+
+    pedidos, siguiente_cursor, busqueda, estado_filtro = _pagina_pedidos_admin(request)
+
     contexto = {
         'pedidos': pedidos,
+        'siguiente_cursor': siguiente_cursor,
         'busqueda': busqueda,
         'estado_seleccionado': estado_filtro,
         'estados_posibles': Pedido.ESTADO_CHOICES,
     }
     return render(request, 'core/admin/pedidos_lista.html', contexto)
 
+def _nombre_cliente_pedido(pedido):
+    # Nombre de referencia (POS) o, si no hay, el nombre del cliente
+    if pedido.nombre_referencia_cliente:
+        return pedido.nombre_referencia_cliente
+    if pedido.cliente:
+        return pedido.cliente.get_full_name() or pedido.cliente.username
+    return 'N/A'
+
+@login_required
+def admin_pedidos_pagina_json_view(request):
+    """Siguiente página de la lista de pedidos del admin en JSON (scroll infinito)."""
+    if request.user.rol != 'administrador':
+        return JsonResponse({'success': False, 'error': 'Sin permisos'}, status=403)
+
+    pedidos, siguiente_cursor, _, _ = _pagina_pedidos_admin(request)
+
+    return JsonResponse({
+        'success': True,
+        'pedidos': [
+            {
+                'id': pedido.pk,
+                'numero_pedido': pedido.numero_pedido,
+                'cliente': _nombre_cliente_pedido(pedido),
+                'estado': pedido.estado,
+                'estado_display': pedido.get_estado_display(),
+                'tipo_orden': pedido.get_tipo_orden_display(),
+                'total': str(pedido.total),
+                'fecha_creacion': pedido.fecha_creacion.isoformat(),
+            }
+            for pedido in pedidos
+        ],
+        'siguiente_cursor': siguiente_cursor,
+    })
+
+@login_required
+def admin_metricas_json_view(request):
+    """
+    Métricas de rendimiento por vista de este proceso (ver core/metricas.py).
+    Un POST las reinicia.
+    """
+    if request.user.rol != 'administrador':
+        return JsonResponse({'success': False, 'error': 'Sin permisos'}, status=403)
+
+    if request.method == 'POST':
+        metricas.reiniciar()
+    return JsonResponse({
+        'success': True,
+        'presupuestos': getattr(settings, 'PRESUPUESTO_CONSULTAS', {}),
+        'vistas': metricas.resumen(),
+    })
+
 @login_required
 def admin_pedido_detalle_view(request, pk): # Renombramos pk a pk_pedido para claridad
     """Vista para que el admin vea el detalle de un pedido, cambie su estado Y ASIGNE REPARTIDOR.""" # Docstring actualizado
@@ -713,19 +868,12 @@ def admin_pedido_detalle_view(request, pk): # Renombramos pk a pk_pedido para cl
         action = request.POST.get('action')
 
         if action == 'cambiar_estado':
-            nuevo_estado = request.POST.get('estado')
-            if nuevo_estado in [estado[0] for estado in Pedido.ESTADO_CHOICES]:
-                pedido.estado = nuevo_estado
-                # Opcional: Actualizar timestamps según el estado
-                if nuevo_estado == 'confirmado' and not pedido.fecha_confirmacion:
-                     pedido.fecha_confirmacion = timezone.now()
-                elif nuevo_estado == 'en_preparacion' and not pedido.fecha_preparacion:
-                     pedido.fecha_preparacion = timezone.now()
-                # ... (añadir lógica similar para otros estados si es necesario) ...
-                pedido.save()
+            # Transición validada y fechas marcadas en core/estados.py
+            try:
+                cambiar_estado(pedido, request.POST.get('estado'))
                 messages.success(request, f'Estado del pedido #{pedido.numero_pedido} actualizado a "{pedido.get_estado_display()}".')
-            else:
-                messages.error(request, 'Estado no válido.')
+            except TransicionInvalida as e:
+                messages.error(request, str(e))
 
         elif action == 'asignar_repartidor':
             repartidor_usuario_id = request.POST.get('repartidor_asignado')
@@ -755,12 +903,28 @@ def admin_pedido_detalle_view(request, pk): # Renombramos pk a pk_pedido para cl
 
         contexto = {
             'pedido': pedido,
-            'estados_posibles': Pedido.ESTADO_CHOICES,
+            # Solo las transiciones que cambiar_estado va a aceptar
+            'estados_posibles': opciones_estado(request.user, pedido.estado),
             'repartidores_disponibles': repartidores_disponibles, # Pasamos la lista a la plantilla
             'titulo': f'Detalle Pedido #{pedido.numero_pedido}'
         }
         return render(request, 'core/admin/pedido_detalle.html', contexto)
 
+@login_required
+def admin_despachar_json_view(request):
+    """Corre una pasada del despacho automático (core/despacho.py) y devuelve lo asignado."""
+    if request.user.rol != 'administrador':
+        return JsonResponse({'success': False, 'error': 'No tienes permisos.'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
+
+    asignados = despachar()
+    return JsonResponse({
+        'success': True,
+        'asignados': {str(repartidor): pedidos for repartidor, pedidos in asignados.items()},
+        'total': sum(len(pedidos) for pedidos in asignados.values()),
+    })
+
 # ========== PUNTO DE VENTA (POS - HU24, HU25) ==========
 
 @login_required
@@ -794,46 +958,26 @@ def pos_view(request):
                 defaults={'tipo': 'local', 'activo': True}
             )
 
-            # Usamos una transacción para asegurar que todo se guarde correctamente o nada
-            with transaction.atomic():
-                # --- Obtener Usuario Genérico ---
-                try:
-                    # Busca el usuario con username 'clientelocal'
-                    usuario_generico = Usuario.objects.get(username='clientelocal')
-                except Usuario.DoesNotExist:
-                    # Si no existe, muestra advertencia y usa al usuario logueado como fallback
-                    messages.warning(request, "Usuario 'clientelocal' no encontrado. Asignando pedido al usuario actual.")
-                    usuario_generico = request.user
-                # --- Fin Obtener Usuario ---
-
-                # Crear el objeto Pedido en la base de datos
-                nuevo_pedido = Pedido.objects.create(
-                    cliente=usuario_generico,                 # <-- USA USUARIO GENÉRICO
-                    nombre_referencia_cliente=nombre_referencia, # <-- GUARDA NOMBRE REFERENCIA
-                    metodo_pago=metodo_pago_obj,
-                    tipo_orden='local',                       # Tipo de orden para POS
-                    estado='en_preparacion',                  # <-- ESTADO INICIAL CORRECTO
-                    subtotal=total_venta,                     # Asume que el total JS es el subtotal
-                    costo_envio=0,                            # Sin costo de envío para POS
-                    total=total_venta,                        # Total igual a subtotal
-                )
-
-                # Crear los Detalles del Pedido y descontar stock para cada item
-                for item_data in items:
-                    producto = Producto.objects.select_for_update().get(pk=item_data['id'])
-                    cantidad = int(item_data['cantidad'])
-
-                    if producto.stock < cantidad:
-                        raise ValueError(f"Stock insuficiente para {producto.nombre}")
-
-                    DetallePedido.objects.create(
-                        pedido=nuevo_pedido,
-                        producto=producto,
-                        cantidad=cantidad,
-                        precio_unitario=producto.precio,
-                    )
-                    producto.stock -= cantidad
-                    producto.save()
+            # --- Obtener Usuario Genérico ---
+            try:
+                # Busca el usuario con username 'clientelocal'
+                usuario_generico = Usuario.objects.get(username='clientelocal')
+            except Usuario.DoesNotExist:
+                # Si no existe, muestra advertencia y usa al usuario logueado como fallback
+                messages.warning(request, "Usuario 'clientelocal' no encontrado. Asignando pedido al usuario actual.")
+                usuario_generico = request.user
+            # --- Fin Obtener Usuario ---
+
+            # Una sola transacción: bloquea todos los productos en orden de pk,
+            # valida el stock de todas las líneas, inserta los detalles con
+            # bulk_create y descuenta el stock con un UPDATE por producto.
+            nuevo_pedido = registrar_venta_pos(
+                items,
+                metodo_pago=metodo_pago_obj,
+                cliente=usuario_generico,                 # <-- USA USUARIO GENÉRICO
+                nombre_referencia=nombre_referencia,      # <-- GUARDA NOMBRE REFERENCIA
+                total=total_venta,
+            )
 
             messages.success(request, f'Venta #{nuevo_pedido.numero_pedido} registrada exitosamente.')
             return redirect('pos_view') # Redirige de vuelta al POS
@@ -1121,6 +1265,44 @@ def buscar_pedido_view(request):
 
 # ========== VISTA DEL REPARTIDOR (HU18) ==========
 
+ESTADOS_ASIGNADOS = ['confirmado', 'en_preparacion', 'listo', 'en_camino']
+
+
+def _entregas_repartidor(perfil_repartidor):
+    """
+    Pedidos asignados (activos) y entregados en las últimas 24 horas del
+    repartidor, con sus contadores, en una sola consulta (más una para las
+    líneas con su producto). Los contadores se calculan sobre esas listas: las entregas
+    de hoy siempre caen dentro de las últimas 24 horas.
+    """
+    hace_24_horas = timezone.now() - timedelta(hours=24)
+    pedidos = list(
+        Pedido.objects.filter(repartidor=perfil_repartidor)
+        .filter(models.Q(estado__in=ESTADOS_ASIGNADOS) | models.Q(estado='entregado', fecha_entrega__gte=hace_24_horas))
+        .select_related('cliente', 'metodo_pago')
+        .prefetch_related(models.Prefetch('detalles', queryset=DetallePedido.objects.select_related('producto')))
+    )
+
+    pedidos_asignados = sorted(
+        (pedido for pedido in pedidos if pedido.estado != 'entregado'),
+        key=lambda pedido: (pedido.estado, pedido.fecha_creacion),
+    )
+    pedidos_entregados_recientes = sorted(
+        (pedido for pedido in pedidos if pedido.estado == 'entregado'),
+        key=lambda pedido: pedido.fecha_entrega, reverse=True,
+    )
+    inicio_hoy, fin_hoy = rango_dia()
+    return {
+        'pedidos_asignados': pedidos_asignados,
+        'pedidos_entregados_recientes': pedidos_entregados_recientes,
+        'total_asignados': len(pedidos_asignados),
+        'total_en_camino': sum(1 for pedido in pedidos_asignados if pedido.estado == 'en_camino'),
+        'total_entregados_hoy': sum(
+            1 for pedido in pedidos_entregados_recientes if inicio_hoy <= pedido.fecha_entrega < fin_hoy
+        ),
+    }
+
+
 @login_required
 def repartidor_pedidos_view(request):
     """
@@ -1144,82 +1326,358 @@ def repartidor_pedidos_view(request):
         messages.error(request, 'No tienes un perfil de repartidor asociado. Contacta al administrador.')
         return redirect('home')
     
-    # Manejar actualización de estado (POST)
+    # Manejar actualización de estado (POST). Se pueden enviar varios
+    # pedido_id para mover un lote (p. ej. todos los 'listo' a 'en_camino').
     if request.method == 'POST':
-        pedido_id = request.POST.get('pedido_id')
+        pedido_ids = request.POST.getlist('pedido_id')
         nuevo_estado = request.POST.get('nuevo_estado')
         
         # Validar que se recibieron los datos
-        if not pedido_id or not nuevo_estado:
+        if not pedido_ids or not nuevo_estado:
             messages.error(request, 'Datos incompletos para actualizar el pedido.')
             return redirect('repartidor_pedidos')
         
-        # Obtener el pedido
+        # Validar que el nuevo estado sea válido para el repartidor
+        if nuevo_estado not in destinos_permitidos(request.user):
+            messages.error(request, 'Estado no permitido.')
+            return redirect('repartidor_pedidos')
+        
         try:
-            pedido = Pedido.objects.get(pk=pedido_id, repartidor=perfil_repartidor)
-            
-            # Validar que el nuevo estado sea válido para el repartidor
-            estados_permitidos = ['en_preparacion', 'listo', 'en_camino', 'entregado']
-            if nuevo_estado not in estados_permitidos:
-                messages.error(request, 'Estado no permitido.')
-                return redirect('repartidor_pedidos')
-            
-            # Actualizar el estado
-            estado_anterior = pedido.estado
-            pedido.estado = nuevo_estado
-            
-            # Actualizar timestamps según el estado
-            if nuevo_estado == 'en_preparacion' and not pedido.fecha_preparacion:
-                pedido.fecha_preparacion = timezone.now()
-            elif nuevo_estado == 'listo' and not pedido.fecha_listo:
-                pedido.fecha_listo = timezone.now()
-            elif nuevo_estado == 'entregado' and not pedido.fecha_entrega:
-                pedido.fecha_entrega = timezone.now()
-            
-            pedido.save()
-            
-            messages.success(request, f'Pedido #{pedido.numero_pedido} actualizado de "{pedido.get_estado_display()}" a "{dict(Pedido.ESTADO_CHOICES)[nuevo_estado]}".')
-            
-        except Pedido.DoesNotExist:
-            messages.error(request, 'Pedido no encontrado o no tienes permisos para modificarlo.')
-        except Exception as e:
-            messages.error(request, f'Error al actualizar el pedido: {str(e)}')
+            movidos = transicionar(Pedido.objects.filter(pk__in=pedido_ids, repartidor=perfil_repartidor), nuevo_estado)
+        except ValueError:
+            messages.error(request, 'Pedido no válido.')
+            return redirect('repartidor_pedidos')
+        
+        etiqueta = dict(Pedido.ESTADO_CHOICES)[nuevo_estado]
+        if len(movidos) == 1:
+            messages.success(request, f'Pedido #{movidos[0].numero_pedido} actualizado a "{etiqueta}".')
+        elif movidos:
+            messages.success(request, f'{len(movidos)} pedidos actualizados a "{etiqueta}".')
+        omitidos = len(set(pedido_ids)) - len(movidos)
+        if omitidos:
+            messages.error(request, f'{omitidos} pedido(s) no se actualizaron: no están asignados a ti o no pueden pasar a "{etiqueta}".')
         
         return redirect('repartidor_pedidos')
     
-    # Obtener pedidos asignados al repartidor (GET)
-    # Estados relevantes: confirmado, en_preparacion, listo, en_camino
-    pedidos_asignados = Pedido.objects.filter(
-        repartidor=perfil_repartidor,
-        estado__in=['confirmado', 'en_preparacion', 'listo', 'en_camino']
-    ).select_related('cliente', 'metodo_pago').prefetch_related('detalles__producto').order_by('estado', 'fecha_creacion')
-    
-    # También mostrar pedidos entregados recientes (últimas 24 horas)
-    hace_24_horas = timezone.now() - timedelta(hours=24)
-    pedidos_entregados_recientes = Pedido.objects.filter(
-        repartidor=perfil_repartidor,
-        estado='entregado',
-        fecha_entrega__gte=hace_24_horas
-    ).select_related('cliente', 'metodo_pago').prefetch_related('detalles__producto').order_by('-fecha_entrega')
-    
-    # Estadísticas para el repartidor
-    total_asignados = pedidos_asignados.count()
-    total_en_camino = pedidos_asignados.filter(estado='en_camino').count()
-    total_entregados_hoy = Pedido.objects.filter(
-        repartidor=perfil_repartidor,
-        estado='entregado',
-        fecha_entrega__date=timezone.now().date()
-    ).count()
-    
+    # Obtener pedidos asignados y entregados recientes (GET), ver _entregas_repartidor
+    entregas = _entregas_repartidor(perfil_repartidor)
     contexto = {
-        'pedidos_asignados': pedidos_asignados,
-        'pedidos_entregados_recientes': pedidos_entregados_recientes,
-        'total_asignados': total_asignados,
-        'total_en_camino': total_en_camino,
-        'total_entregados_hoy': total_entregados_hoy,
+        **entregas,
         'perfil_repartidor': perfil_repartidor,
         'titulo': 'Mis Entregas',
-        'estados_disponibles': Pedido.ESTADO_CHOICES,
+        'estados_disponibles': opciones_estado(request.user),
     }
     
-    return render(request, 'core/repartidor_pedidos.html', contexto)
\ No newline at end of file
+    return render(request, 'core/repartidor_pedidos.html', contexto)
+
+
+def _pedido_repartidor_json(pedido):
+    return {
+        'id': pedido.pk,
+        'numero': pedido.numero_pedido,
+        'estado': pedido.estado,
+        'tipo_orden': pedido.tipo_orden,
+        'direccion_entrega': pedido.direccion_entrega,
+        'referencia_direccion': pedido.referencia_direccion,
+        'cliente': pedido.nombre_referencia_cliente or (pedido.cliente.get_full_name() if pedido.cliente else ''),
+        'telefono': pedido.cliente.telefono if pedido.cliente else None,
+        'metodo_pago': pedido.metodo_pago.nombre,
+        'total': str(pedido.total),
+        'notas_cliente': pedido.notas_cliente,
+        'fecha_creacion': pedido.fecha_creacion.isoformat(),
+        'fecha_entrega': pedido.fecha_entrega.isoformat() if pedido.fecha_entrega else None,
+        'lineas': [
+            {'producto': detalle.producto.nombre, 'cantidad': detalle.cantidad}
+            for detalle in pedido.detalles.all()
+        ],
+    }
+
+
+@login_required
+def repartidor_pedidos_json_view(request):
+    """Lo mismo que repartidor_pedidos_view, en JSON y sin plantilla, para la app móvil de los repartidores."""
+    if request.user.rol != 'repartidor':
+        return JsonResponse({'success': False, 'error': 'No tienes permisos.'}, status=403)
+    try:
+        perfil_repartidor = request.user.perfil_repartidor
+    except Repartidor.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'No tienes un perfil de repartidor asociado.'}, status=404)
+
+    entregas = _entregas_repartidor(perfil_repartidor)
+    return JsonResponse({
+        'success': True,
+        'asignados': [_pedido_repartidor_json(pedido) for pedido in entregas['pedidos_asignados']],
+        'entregados_recientes': [_pedido_repartidor_json(pedido) for pedido in entregas['pedidos_entregados_recientes']],
+        'total_asignados': entregas['total_asignados'],
+        'total_en_camino': entregas['total_en_camino'],
+        'total_entregados_hoy': entregas['total_entregados_hoy'],
+    })
+
+# ========== EVENTOS DE PEDIDOS EN VIVO ==========
+# Las pantallas del repartidor y del personal se suscriben aquí para recibir
+# los cambios de pedidos (ver core/eventos.py) en vez de recargar la página.
+
+ESPERA_EVENTOS = 15  # segundos entre latidos (SSE) o máximo de un long poll
+
+
+def _cursor_eventos(request, broker):
+    """Id desde el que seguir: Last-Event-ID (reconexión SSE), ?desde= o el último publicado."""
+    valor = request.headers.get('Last-Event-ID') or request.GET.get('desde')
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return broker.cursor_actual()
+
+
+def _mensajes_sse(eventos, cursor, cursor_nuevo, perdidos, visible):
+    """Lo que se manda al navegador tras una lectura del broker."""
+    mensajes = []
+    if perdidos:
+        mensajes.append('event: recargar\ndata: {}\n\n')
+    ultimo_enviado = cursor
+    for evento in eventos:
+        if visible(evento):
+            mensajes.append(f'id: {evento["id"]}\nevent: pedido\ndata: {json.dumps(evento)}\n\n')
+            ultimo_enviado = evento['id']
+    if ultimo_enviado != cursor_nuevo:
+        # Avanza el Last-Event-ID del navegador aunque los eventos no fueran para él
+        mensajes.append(f'id: {cursor_nuevo}\n\n')
+    elif not eventos and not perdidos:
+        mensajes.append(': ping\n\n')
+    return mensajes
+
+
+def _stream_eventos(broker, cursor, visible, duracion):
+    """Generador SSE para WSGI: cada lectura bloquea el hilo del worker, con un latido cada ESPERA_EVENTOS."""
+    yield f'retry: 3000\nid: {cursor}\n\n'
+    limite = time.monotonic() + duracion
+    while time.monotonic() < limite:
+        eventos, cursor_nuevo, perdidos = broker.leer(cursor, ESPERA_EVENTOS)
+        yield from _mensajes_sse(eventos, cursor, cursor_nuevo, perdidos, visible)
+        cursor = cursor_nuevo
+
+
+async def _astream_eventos(broker, cursor, visible, duracion):
+    """Generador SSE para ASGI: espera en el event loop, sin ocupar un hilo."""
+    yield f'retry: 3000\nid: {cursor}\n\n'
+    limite = time.monotonic() + duracion
+    while time.monotonic() < limite:
+        eventos, cursor_nuevo, perdidos = await broker.aleer(cursor, ESPERA_EVENTOS)
+        for mensaje in _mensajes_sse(eventos, cursor, cursor_nuevo, perdidos, visible):
+            yield mensaje
+        cursor = cursor_nuevo
+
+
+async def pedidos_eventos_view(request):
+    """
+    Cambios de pedidos en vivo, filtrados según el usuario (el personal ve
+    todos, el repartidor los suyos, el cliente los propios).
+
+    - Por defecto responde un stream de server-sent events (EventSource):
+      eventos `pedido` con el delta y `recargar` si se perdieron eventos. La
+      conexión se cierra cada EVENTOS_PEDIDOS_DURACION segundos y el
+      navegador se reconecta solo con Last-Event-ID.
+    - Con ?formato=json hace long poll: espera hasta ESPERA_EVENTOS segundos
+      y devuelve {'cursor', 'eventos', 'recargar'}; el cliente vuelve a
+      llamar con ?desde=<cursor>.
+
+    Es una vista async: bajo ASGI las esperas son awaits sobre el broker y no
+    ocupan el hilo de las vistas sync. Bajo ASGI Django consume el iterador
+    sync de un StreamingHttpResponse en un hilo y lo junta entero antes de
+    enviarlo, por eso el stream es un generador async bajo ASGI y uno sync
+    bajo WSGI.
+    """
+    usuario = await _usuario_async(request)
+    if not usuario.is_authenticated:
+        return JsonResponse({'success': False, 'error': 'Debes iniciar sesión.'}, status=401)
+    visible = await sync_to_async(eventos_pedidos.filtro_para)(usuario)
+    if visible is None:
+        return JsonResponse({'success': False, 'error': 'No tienes permisos para ver estos eventos.'}, status=403)
+
+    broker = eventos_pedidos.obtener_broker()
+    cursor = await sync_to_async(_cursor_eventos, thread_sensitive=False)(request, broker)
+
+    if request.GET.get('formato') == 'json':
+        limite = time.monotonic() + ESPERA_EVENTOS
+        while True:
+            eventos, cursor, perdidos = await broker.aleer(cursor, max(limite - time.monotonic(), 0))
+            eventos = [evento for evento in eventos if visible(evento)]
+            # Los eventos de otros repartidores o clientes no cortan la espera
+            if eventos or perdidos or time.monotonic() >= limite:
+                break
+        return JsonResponse({'cursor': cursor, 'eventos': eventos, 'recargar': perdidos})
+
+    duracion = getattr(settings, 'EVENTOS_PEDIDOS_DURACION', 300)
+    stream = _astream_eventos if isinstance(request, ASGIRequest) else _stream_eventos
+    response = StreamingHttpResponse(stream(broker, cursor, visible, duracion), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # que nginx no acumule el stream
+    return response
+
+
+# ========== COCINA ==========
+
+@login_required
+def cocina_tablero_json_view(request):
+    """
+    Tablero de la cocina: pedidos confirmados, en preparación y listos con
+    sus líneas, el próximo a cocinar y lo que falta por producto. Sale del
+    tablero en memoria (core/cocina.py), así que un refresco sin cambios no
+    consulta pedidos.
+    """
+    if request.user.rol not in ('cocina', 'administrador'):
+        return JsonResponse({'success': False, 'error': 'No tienes permisos.'}, status=403)
+    return JsonResponse({'success': True, **tablero_cocina.foto()})
+
+
+@login_required
+def pedidos_estado_json_view(request):
+    """
+    Cambia el estado de varios pedidos a la vez (POST con uno o más
+    `pedido_id` y `estado`), con un solo UPDATE (ver core/estados.py). Lo usan
+    la cocina, los repartidores (solo sus pedidos) y el administrador.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
+
+    estado = request.POST.get('estado')
+    if estado not in destinos_permitidos(request.user):
+        return JsonResponse({'success': False, 'error': 'Estado no permitido.'}, status=403)
+
+    try:
+        pedido_ids = {int(pk) for pk in request.POST.getlist('pedido_id')}
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Pedido no válido.'}, status=400)
+
+    pedidos = Pedido.objects.filter(pk__in=pedido_ids)
+    if request.user.rol == 'repartidor':
+        pedidos = pedidos.filter(repartidor__usuario=request.user)
+    movidos = [pedido.pk for pedido in transicionar(pedidos, estado)]
+    return JsonResponse({'success': True, 'movidos': movidos, 'omitidos': sorted(pedido_ids - set(movidos))})
+
+
+# ========== LECTURAS ASÍNCRONAS (ASGI) ==========
+# Endpoints de lectura con mucho tráfico (catálogo, seguimiento de pedidos)
+# escritos como vistas async: bajo ASGI (cosmofood/asgi.py) esperan la base de
+# datos sin ocupar un hilo por request. Bajo WSGI también funcionan, Django
+# las corre en un event loop por request.
+
+async def _usuario_async(request):
+    """request.user ya cargado (la sesión y el usuario se leen en un hilo aparte)."""
+    def cargar():
+        usuario = request.user
+        usuario.is_authenticated  # evalúa el objeto perezoso
+        return usuario
+    return await sync_to_async(cargar)()
+
+
+def _producto_json(producto):
+    return {
+        'id': producto.pk,
+        'nombre': producto.nombre,
+        'descripcion': producto.descripcion or '',
+        'precio': f'{producto.precio:.2f}',
+        'en_promocion': producto.en_promocion,
+        'imagen': producto.imagen.url if producto.imagen else None,
+        'categoria': producto.categoria.nombre if producto.categoria else None,
+    }
+
+
+async def catalogo_json_async_view(request):
+    """Catálogo (HU10) en JSON: productos visibles filtrados por `q` y `categoria`."""
+    busqueda = request.GET.get('q', '')
+    categoria_id = request.GET.get('categoria')
+    if categoria_id and not categoria_id.isdigit():
+        return JsonResponse({'success': False, 'error': 'Categoría no válida.'}, status=400)
+
+    # Misma entrada de caché que el catálogo HTML (ver core/cache_catalogo.py)
+    productos = await aproductos_catalogo(busqueda, categoria_id)
+    return JsonResponse({'success': True, 'productos': [_producto_json(producto) for producto in productos]})
+
+
+async def producto_detalle_async_view(request, pk):
+    """Detalle de un producto activo del catálogo."""
+    try:
+        producto = await Producto.objects.select_related('categoria').aget(pk=pk, activo=True)
+    except Producto.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Producto no encontrado'}, status=404)
+    # Sin caché: el stock se lee al momento
+    return JsonResponse({'success': True, 'producto': {
+        **_producto_json(producto), 'stock': producto.stock, 'disponible': producto.disponible,
+    }})
+
+
+def _puede_ver_pedido(usuario, fila):
+    """El cliente ve sus pedidos, el repartidor los que tiene asignados y el personal todos."""
+    if usuario.rol in eventos_pedidos.ROLES_PERSONAL or usuario.is_superuser:
+        return True
+    return usuario.pk in (fila['cliente_id'], fila['repartidor__usuario_id'])
+
+
+async def pedido_estado_async_view(request, numero_pedido):
+    """Estado y fechas de un pedido por su número, con una sola consulta por índice."""
+    usuario = await _usuario_async(request)
+    if not usuario.is_authenticated:
+        return JsonResponse({'success': False, 'error': 'Debes iniciar sesión.'}, status=401)
+
+    fila = await (Pedido.objects
+                  .filter(numero_pedido=numero_pedido)
+                  .values(*seguimiento.CAMPOS, 'cliente_id', 'repartidor__usuario_id')
+                  .afirst())
+    if fila is None:
+        return JsonResponse({'success': False, 'error': 'Pedido no encontrado'}, status=404)
+    if not _puede_ver_pedido(usuario, fila):
+        return JsonResponse({'success': False, 'error': 'Sin permisos'}, status=403)
+    return JsonResponse({
+        'success': True,
+        'pedido': seguimiento.datos_seguimiento(fila),
+        # Para el enlace público de seguimiento_pedido_view
+        'token_seguimiento': seguimiento.token_seguimiento(fila['numero_pedido']),
+    })
+
+
+async def buscar_pedido_async_view(request):
+    """Versión async de buscar_pedido_view: id de un pedido por número de pedido o ID."""
+    usuario = await _usuario_async(request)
+    if not usuario.is_authenticated:
+        return JsonResponse({'success': False, 'error': 'Debes iniciar sesión.'}, status=401)
+    if usuario.rol != 'administrador':
+        return JsonResponse({'success': False, 'error': 'Sin permisos'}, status=403)
+
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'success': False, 'error': 'Parámetro de búsqueda vacío'})
+
+    pedidos = Pedido.objects.values('pk', 'numero_pedido')
+    # Primero por número de pedido, después por ID
+    pedido = await pedidos.filter(numero_pedido=query).afirst()
+    if pedido is None and query.isdigit():
+        pedido = await pedidos.filter(pk=int(query)).afirst()
+
+    if pedido is None:
+        return JsonResponse({'success': False, 'error': 'Pedido no encontrado'})
+    return JsonResponse({'success': True, 'pedido_id': pedido['pk'], 'numero_pedido': pedido['numero_pedido']})
+
+
+async def seguimiento_pedido_view(request, token):
+    """
+    Seguimiento público de un pedido: estado y fechas, por el token firmado
+    de su número. Responde 304 si el ETag de If-None-Match sigue vigente
+    (ver core/seguimiento.py).
+    """
+    numero_pedido = seguimiento.numero_desde_token(token)
+    datos = await seguimiento.aobtener_seguimiento(numero_pedido) if numero_pedido else None
+    if datos is None:
+        return JsonResponse({'success': False, 'error': 'Pedido no encontrado'}, status=404)
+
+    etag = seguimiento.etag(datos)
+    # Comparación débil: un proxy que comprime puede devolver W/"..."
+    enviados = [valor.removeprefix('W/') for valor in parse_etags(request.headers.get('If-None-Match', ''))]
+    if etag in enviados or '*' in enviados:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({'success': True, 'pedido': datos['datos']})
+    response['ETag'] = etag
+    # El navegador puede guardar la respuesta, pero pregunta siempre si cambió
+    response['Cache-Control'] = 'private, no-cache'
+    return response
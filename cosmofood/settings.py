@@ -1,5 +1,7 @@
 from pathlib import Path
 from decouple import config
+import django
+from decimal import Decimal
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +43,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.InstrumentacionMiddleware',
 ]
 
 ROOT_URLCONF = 'cosmofood.urls'
@@ -56,12 +59,15 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.carrito',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'cosmofood.wsgi.application'
+# Para servir también las vistas async (uvicorn/daphne cosmofood.asgi:application)
+ASGI_APPLICATION = 'cosmofood.asgi.application'
 
 #EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 #EMAIL_HOST = 'smtp.hostinger.com'
@@ -83,9 +89,86 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Esperar el lock de escritura en vez de fallar con "database is locked"
+        'OPTIONS': {'timeout': 20},
     }
 }
 
+# Con SQLite, las transacciones que leen y luego escriben (checkout, POS)
+# deben tomar el lock de escritura al comenzar; si no, con varios checkouts
+# simultáneos fallan de inmediato. Disponible desde Django 5.1.
+if django.VERSION >= (5, 1):
+    DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+
+# Caché
+# En desarrollo y tests se usa LocMemCache; en producción se puede apuntar a
+# FileBasedCache o Memcached con CACHE_BACKEND / CACHE_LOCATION.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='cosmofood'),
+    }
+}
+
+# Segundos que se guardan las páginas y fragmentos del catálogo público
+CATALOGO_CACHE_TIMEOUT = config('CATALOGO_CACHE_TIMEOUT', default=900, cast=int)
+
+# Segundos máximos que se guarda el seguimiento de un pedido (se borra antes si el pedido cambia)
+SEGUIMIENTO_CACHE_TIMEOUT = config('SEGUIMIENTO_CACHE_TIMEOUT', default=60, cast=int)
+
+# Numeración de pedidos (ver core/numeracion.py). Con PostgreSQL se puede usar
+# 'core.numeracion.GeneradorSecuenciaPostgres'.
+GENERADOR_NUMERO_PEDIDO = config('GENERADOR_NUMERO_PEDIDO', default='core.numeracion.GeneradorPorBloques')
+BLOQUE_NUMEROS_PEDIDO = config('BLOQUE_NUMEROS_PEDIDO', default=100, cast=int)
+
+# Cantidad de procesos que atienden requests (gunicorn y uvicorn leen la misma
+# variable para su cantidad de workers).
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=1, cast=int)
+
+# Eventos de pedidos en vivo (ver core/eventos.py). BrokerLocal vive en la
+# memoria de un proceso: con varios workers el default pasa a
+# 'core.eventos.BrokerCache', que además necesita un cache compartido
+# (CACHE_BACKEND de Redis, Memcached o base de datos, no LocMemCache).
+BROKER_EVENTOS_PEDIDOS = config(
+    'BROKER_EVENTOS_PEDIDOS',
+    default='core.eventos.BrokerCache' if WEB_CONCURRENCY > 1 else 'core.eventos.BrokerLocal',
+)
+# Segundos que se mantiene abierta cada conexión SSE antes de que el navegador se reconecte
+EVENTOS_PEDIDOS_DURACION = config('EVENTOS_PEDIDOS_DURACION', default=300, cast=int)
+
+# Despacho automático (ver core/despacho.py): ubicación del local ("lat,lon")
+# y máximo de pedidos activos por repartidor.
+UBICACION_LOCAL = config('UBICACION_LOCAL', default='-33.4489,-70.6693',
+                         cast=lambda valor: tuple(float(parte) for parte in valor.split(',')))
+CAPACIDAD_REPARTIDOR = config('CAPACIDAD_REPARTIDOR', default=3, cast=int)
+
+# Instrumentación de vistas (core/middleware.py): consultas y tiempos por
+# vista en admin_metricas_json_view. Si una vista supera su presupuesto de
+# consultas se registra un warning, o se lanza una excepción en modo estricto.
+INSTRUMENTACION_ACTIVA = config('INSTRUMENTACION_ACTIVA', default=True, cast=bool)
+PRESUPUESTO_CONSULTAS = {
+    'home': 4,
+    'catalogo_productos_view': 3,
+    'ver_carrito_view': 5,
+    'carrito_agregar_json_view': 12,
+    'carrito_cantidad_json_view': 12,
+    'carrito_quitar_json_view': 12,
+    'admin_dashboard_view': 9,
+    'admin_pedidos_lista_view': 6,
+    'admin_pedidos_pagina_json_view': 5,
+    'pedidos_eventos_view': 3,
+    'cocina_tablero_json_view': 5,
+    'repartidor_pedidos_view': 5,
+    'repartidor_pedidos_json_view': 5,
+    'catalogo_json_async_view': 2,
+    'producto_detalle_async_view': 1,
+    'pedido_estado_async_view': 3,
+    'buscar_pedido_async_view': 4,
+    'seguimiento_pedido_view': 1,
+}
+PRESUPUESTO_CONSULTAS_ESTRICTO = config('PRESUPUESTO_CONSULTAS_ESTRICTO', default=False, cast=bool)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -139,6 +222,9 @@ AUTH_USER_MODEL = 'core.Usuario'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Costo de envío que se suma a los pedidos delivery hechos desde el carrito
+COSTO_ENVIO_DELIVERY = config('COSTO_ENVIO_DELIVERY', default='0', cast=Decimal)
+
 # Le dice a Django cuál es la URL de tu página de login
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'